@@ -1,13 +1,71 @@
-from fastapi import APIRouter, Depends
+import json
+import logging
+import threading
+from collections.abc import AsyncIterator
+from typing import Any
 
-from backend.app.models.schemas import ChatRequest, ChatResponse
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from backend.app.core.config import get_settings
+from backend.app.core.metrics import CONTENT_TYPE, collect_trace, render_metrics
+from backend.app.models.schemas import (
+    ChatBatchItem,
+    ChatBatchRequest,
+    ChatBatchResponse,
+    ChatRequest,
+    ChatResponse,
+)
 from backend.app.rag.agent import AgentService
+from backend.app.rag.knowledge_bases import IndexPool, UnknownKnowledgeBaseError
+from backend.app.rag.retriever import RetrievalError
+from backend.app.rag.sessions import shared_session_store
+from backend.app.rag.upstream import UpstreamOverloadedError
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+_agent_lock = threading.Lock()
+
+
+def build_agent() -> AgentService | None:
+    """Cria o agente do processo; retorna None se o vector store ainda não foi ingerido."""
+    try:
+        return AgentService(sessions=shared_session_store())
+    except RetrievalError:
+        return None
+
 
+def get_index_pool(app: FastAPI) -> IndexPool:
+    pool = getattr(app.state, "index_pool", None)
+    if pool is None:
+        with _agent_lock:
+            pool = getattr(app.state, "index_pool", None) or IndexPool.from_settings()
+            app.state.index_pool = pool
+    return pool
 
-def get_agent() -> AgentService:
-    return AgentService()
+
+def get_agent(request: Request, kb: str | None = None) -> AgentService:
+    # ?kb=<id> escolhe uma base registrada em knowledge_bases, carregada sob demanda no pool
+    if kb is not None and kb != get_settings().default_knowledge_base:
+        try:
+            return get_index_pool(request.app).get(kb)
+        except UnknownKnowledgeBaseError as exc:
+            raise HTTPException(status_code=404, detail=str(exc)) from exc
+        except RetrievalError as exc:
+            raise HTTPException(
+                status_code=503, detail=f"Vector store da base {kb} indisponível. Rode a ingestão."
+            ) from exc
+    # Reaproveita o agente aquecido no startup; cria sob demanda se a ingestão ocorreu depois
+    agent = getattr(request.app.state, "agent", None)
+    if agent is None:
+        with _agent_lock:
+            agent = getattr(request.app.state, "agent", None) or build_agent()
+            request.app.state.agent = agent
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Vector store indisponível. Rode a ingestão.")
+    return agent
 
 
 @router.get("/health")
@@ -15,6 +73,90 @@ def healthcheck() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@router.get("/metrics")
+def metrics() -> Response:
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
 @router.post("/chat", response_model=ChatResponse)
-def chat(payload: ChatRequest, agent: AgentService = Depends(get_agent)) -> ChatResponse:
-    return agent.answer(payload.question)
+async def chat(
+    payload: ChatRequest,
+    response: Response,
+    agent: AgentService = Depends(get_agent),
+    debug_timings: str | None = Header(default=None, alias="X-Debug-Timings"),
+) -> ChatResponse:
+    if not debug_timings:
+        return await agent.aanswer(
+            payload.question, categoria=payload.categoria, session_id=payload.session_id
+        )
+    # Detalhamento por etapa só quando pedido, no header padrão Server-Timing
+    with collect_trace() as trace:
+        result = await agent.aanswer(
+            payload.question, categoria=payload.categoria, session_id=payload.session_id
+        )
+    response.headers["Server-Timing"] = trace.server_timing()
+    return result
+
+
+@router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(
+    payload: ChatBatchRequest, agent: AgentService = Depends(get_agent)
+) -> ChatBatchResponse:
+    max_questions = get_settings().batch_max_questions
+    if len(payload.questions) > max_questions:
+        raise HTTPException(
+            status_code=413, detail=f"Máximo de {max_questions} perguntas por lote."
+        )
+    results: list[ChatBatchItem | None] = [None] * len(payload.questions)
+    valid: list[int] = []
+    for idx, question in enumerate(payload.questions):
+        # Validação por item: uma pergunta inválida não derruba o lote inteiro
+        try:
+            ChatRequest(question=question)
+        except ValidationError as exc:
+            results[idx] = ChatBatchItem(index=idx, error=exc.errors()[0]["msg"])
+        else:
+            valid.append(idx)
+
+    outcomes = await agent.aanswer_batch([payload.questions[idx] for idx in valid])
+    for idx, outcome in zip(valid, outcomes, strict=True):
+        if isinstance(outcome, Exception):
+            results[idx] = ChatBatchItem(index=idx, error=f"{type(outcome).__name__}: {outcome}")
+        else:
+            results[idx] = ChatBatchItem(index=idx, response=outcome)
+    return ChatBatchResponse(results=[item for item in results if item is not None])
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    payload: ChatRequest, agent: AgentService = Depends(get_agent)
+) -> StreamingResponse:
+    """Server-Sent Events: ``sources`` após a recuperação, ``token`` por pedaço e ``done``.
+
+    O status 200 já foi enviado quando uma falha acontece no meio do stream: ela vira um evento
+    ``error`` seguido de ``done`` com ``error: true``, para o cliente distinguir falha de fim.
+    """
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event, data in agent.astream(
+                payload.question, categoria=payload.categoria, session_id=payload.session_id
+            ):
+                yield _sse(event, data)
+        except UpstreamOverloadedError as exc:
+            yield _sse("error", {"detail": str(exc), "retry_after": exc.retry_after})
+            yield _sse("done", {"is_fallback": True, "error": True})
+        except Exception as exc:
+            logger.exception("Falha no stream de /chat/stream")
+            yield _sse("error", {"detail": f"{type(exc).__name__}: {exc}"})
+            yield _sse("done", {"is_fallback": True, "error": True})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
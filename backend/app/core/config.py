@@ -2,11 +2,13 @@ from __future__ import annotations
 
 from functools import lru_cache
 from pathlib import Path
-from pydantic import BaseModel, Field, AliasChoices
-from pydantic_settings import SettingsConfigDict
+from typing import Dict, List
 
+from pydantic import AliasChoices, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-class Settings(BaseModel):
+
+class Settings(BaseSettings):
     app_name: str = "ifood-genai-refunds-agent"
     csv_path: Path = Field(default=Path("data/base_conhecimento_ifood_genai-exemplo.csv"))
     vector_store_path: Path = Field(default=Path("data/vector_store"))
@@ -14,11 +16,106 @@ class Settings(BaseModel):
         default=None,
         validation_alias=AliasChoices("AGENT_OPENAI_API_KEY", "OPENAI_API_KEY"),
     )
+    # Endpoint compatível com OpenAI (proxy, gateway ou o servidor fake dos benchmarks)
+    openai_base_url: str | None = None
     embedding_model: str = "text-embedding-3-small"
     llm_model: str = "gpt-4o-mini"
     retrieval_k: int = 4
-    similarity_threshold: float = 0.6
+    # Cosseno mínimo da melhor fonte para responder (abaixo disso, fallback). Sem valor explícito
+    # vale o padrão do embedder em uso: os cossenos do hashed local são bem menores que os da OpenAI
+    similarity_threshold: float | None = None
+    provider_similarity_threshold: float = 0.6
+    hashed_similarity_threshold: float = 0.3
     use_fake_embeddings: bool = False
+    # Embeddings offline (sem chave ou com use_fake_embeddings): "hashed" (n-gramas com TF-IDF,
+    # scores reais) ou "fake" (vetores aleatórios do LangChain, scores zerados)
+    offline_embeddings: str = "hashed"
+    hashed_embedding_dimension: int = 1536
+    # Bases de conhecimento adicionais (id -> diretório do vector store), escolhidas com ?kb=<id>
+    # em /api/chat*. Ficam num pool com despejo LRU quando a memória estimada dos índices passa de
+    # index_pool_memory_mb; index_pool_preload carrega as mais usadas no startup. A base padrão
+    # (vector_store_path, id default_knowledge_base) fica sempre carregada, fora do pool
+    default_knowledge_base: str = "default"
+    knowledge_bases: Dict[str, Path] = Field(default_factory=dict)
+    index_pool_memory_mb: float = 1024.0
+    index_pool_preload: List[str] = Field(default_factory=list)
+    # Intervalo (s) entre verificações de nova geração do vector store; 0 desativa o hot-swap
+    vector_store_reload_interval: float = 5.0
+    # "native": vetores memory-mapped + metadados colunares, sem pickle; "faiss": formato LangChain
+    vector_store_format: str = "native"
+    # Índice do formato nativo: "flat" (exato), "ivf_flat", "hnsw" ou "ivf_pq" (aproximados)
+    index_type: str = "flat"
+    ivf_nlist: int = 1024
+    ivf_nprobe: int = 16
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 64
+    pq_m: int = 64
+    pq_nbits: int = 8
+    # Busca filtrada por categoria com índice aproximado: partições até este tamanho usam busca
+    # exata (matriz contígua montada na carga), maiores o índice com seletor de ids
+    partition_exact_max_rows: int = 10_000
+    # Busca híbrida: funde ranking vetorial e BM25 (índice invertido) por reciprocal rank fusion
+    hybrid_search: bool = True
+    hybrid_fetch_k: int = 20
+    hybrid_rrf_k: int = 60
+    # Roteador de intenção local: saudações e fora do escopo respondem sem embedding nem LLM;
+    # listas vazias usam os termos padrão de backend.app.rag.intent
+    intent_router_enabled: bool = True
+    intent_small_talk_keywords: List[str] = Field(default_factory=list)
+    intent_out_of_scope_keywords: List[str] = Field(default_factory=list)
+    intent_min_confidence: float = 0.35
+    intent_margin: float = 0.1
+    # Clientes do provedor compartilhados por modelo (pool HTTP com keep-alive) e limiter adaptativo:
+    # token bucket (req/s e rajada) + teto de chamadas simultâneas; sem vaga em upstream_max_wait
+    # segundos a API responde 503 com Retry-After
+    upstream_timeout: float = 30.0
+    upstream_connect_timeout: float = 5.0
+    upstream_max_connections: int = 64
+    upstream_keepalive_seconds: float = 30.0
+    upstream_max_retries: int = 2
+    upstream_rate_limit: float = 50.0
+    upstream_burst: int = 50
+    upstream_max_concurrency: int = 32
+    upstream_max_wait: float = 2.0
+    # Single-flight: perguntas idênticas simultâneas compartilham a chamada de embedding/LLM em voo
+    coalesce_upstream_calls: bool = True
+    # Contexto do prompt: orçamento total e por fonte (tokens do llm_model) e limiar de Jaccard
+    # acima do qual uma fonte é considerada redundante com outra já incluída
+    context_max_tokens: int = 1500
+    context_source_max_tokens: int = 400
+    context_dedup_similarity: float = 0.9
+    # Histogramas por etapa e contadores em /api/metrics; desativado, as medições viram no-op
+    metrics_enabled: bool = True
+    # Cache de embeddings de consulta (LRU); path opcional persiste em SQLite entre restarts
+    embedding_cache_size: int = 1024
+    embedding_cache_path: Path | None = None
+    # Cache semântico de respostas: reaproveita respostas de perguntas com cosseno >= similarity
+    response_cache_enabled: bool = True
+    response_cache_size: int = 512
+    response_cache_ttl: float = 300.0
+    response_cache_similarity: float = 0.95
+    # Sessões de conversa (session_id em /api/chat): continuação com cosseno >=
+    # session_reuse_similarity com a pergunta anterior e fontes ainda acima de similarity_threshold
+    # reaproveita as fontes sem nova busca; no máximo session_max sessões por instância (todas as
+    # bases), descartadas após session_ttl segundos sem uso
+    session_max: int = 10_000
+    session_ttl: float = 900.0
+    session_reuse_similarity: float = 0.25
+    # /api/chat/batch: limite de perguntas por chamada e de gerações simultâneas no LLM
+    batch_max_questions: int = 256
+    batch_max_concurrency: int = 8
+    # Ingestão em streaming: linhas por lote de embedding, threads, retry em 429 e checkpoint
+    ingestion_batch_size: int = 256
+    ingestion_workers: int = 4
+    ingestion_max_retries: int = 5
+    ingestion_backoff_seconds: float = 1.0
+    ingestion_checkpoint_every: int = 20
+    # Quase-duplicatas (MinHash/LSH sobre pergunta + resposta, mesma categoria) viram um só
+    # documento com todas as fontes; Jaccard estimado mínimo para agrupar duas linhas. Opt-in: a
+    # passada guarda assinatura e buckets de cada linha canônica em memória (O(N) na base)
+    ingestion_dedup: bool = False
+    ingestion_dedup_similarity: float = 0.85
 
     model_config = SettingsConfigDict(env_prefix="AGENT_", env_file=".env", extra="ignore")
 
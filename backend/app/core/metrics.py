@@ -0,0 +1,290 @@
+"""Métricas do agente no formato texto do Prometheus, sem dependências externas.
+
+``stage("embed")`` mede uma etapa: alimenta o histograma ``agent_stage_seconds`` e, se a requisição
+pediu o detalhamento (``collect_trace``), também o trace devolvido no header ``Server-Timing``.
+Com as métricas desativadas ``stage`` devolve um context manager vazio compartilhado.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from backend.app.core.config import get_settings
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por conjunto de labels: contagem por bucket (não cumulativa), soma e total
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][position] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts, strict=True):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = _labels((*self.labelnames, "le"), (*key, le))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Trace:
+    """Tempos por etapa de uma requisição (somados quando a etapa se repete)."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self._start) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+STAGE_SECONDS = Histogram(
+    "agent_stage_seconds", "Duração de cada etapa do pipeline do agente.", ("stage",)
+)
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds", "Duração de cada etapa da ingestão (por lote).", ("stage",)
+)
+FALLBACKS = Counter("agent_fallbacks_total", "Respostas de fallback por motivo.", ("reason",))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens consumidos no LLM.", ("kind",))
+CONTEXT_TOKENS = Histogram(
+    "llm_context_tokens",
+    "Tokens do contexto montado para o prompt (contagem local, antes da chamada).",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+CONTEXT_SOURCES = Counter(
+    "llm_context_sources_total",
+    "Fontes recuperadas por destino no contexto (packed, truncated, duplicate, dropped).",
+    ("outcome",),
+)
+COALESCED = Counter(
+    "upstream_coalesced_total",
+    "Chamadas ao provedor que aproveitaram uma requisição idêntica já em voo.",
+    ("kind",),
+)
+UPSTREAM_EVENTS = Counter(
+    "upstream_limiter_events_total",
+    "Eventos do limiter do provedor por modelo: throttled (429 recebido) e rejected (503 local).",
+    ("model", "event"),
+)
+INDEX_POOL_EVENTS = Counter(
+    "index_pool_events_total",
+    "Eventos do pool de índices por base de conhecimento: load e evict.",
+    ("kb", "event"),
+)
+SESSION_TURNS = Counter(
+    "agent_session_turns_total",
+    "Perguntas com session_id: reuse (fontes do turno anterior, sem busca) ou retrieve.",
+    ("outcome",),
+)
+REGISTRY: List[Any] = [
+    STAGE_SECONDS,
+    INGESTION_STAGE_SECONDS,
+    FALLBACKS,
+    LLM_TOKENS,
+    CONTEXT_TOKENS,
+    CONTEXT_SOURCES,
+    COALESCED,
+    UPSTREAM_EVENTS,
+    INDEX_POOL_EVENTS,
+    SESSION_TURNS,
+]
+
+_current_trace: ContextVar[Trace | None] = ContextVar("agent_trace", default=None)
+_enabled: List[bool] = []
+_NOOP = contextlib.nullcontext()
+
+
+def metrics_enabled() -> bool:
+    if not _enabled:
+        _enabled.append(get_settings().metrics_enabled)
+    return _enabled[0]
+
+
+def configure_metrics(enabled: bool) -> None:
+    _enabled[:] = [enabled]
+
+
+class _Span:
+    __slots__ = ("histogram", "name", "start")
+
+    def __init__(self, histogram: Histogram, name: str):
+        self.histogram = histogram
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed, stage=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, elapsed)
+
+
+def stage(name: str, histogram: Histogram = STAGE_SECONDS) -> contextlib.AbstractContextManager:
+    if not metrics_enabled():
+        return _NOOP
+    return _Span(histogram, name)
+
+
+def ingestion_stage(name: str) -> contextlib.AbstractContextManager:
+    return stage(name, INGESTION_STAGE_SECONDS)
+
+
+def record_fallback(reason: str) -> None:
+    if metrics_enabled():
+        FALLBACKS.inc(reason=reason)
+
+
+def record_token_usage(usage: Dict[str, Any] | None) -> None:
+    """Soma o ``usage_metadata`` de uma mensagem do LangChain (input/output tokens)."""
+    if not usage or not metrics_enabled():
+        return
+    for kind in ("input", "output"):
+        tokens = usage.get(f"{kind}_tokens")
+        if tokens:
+            LLM_TOKENS.inc(float(tokens), kind=kind)
+
+
+def record_context(tokens: int, packed: int, truncated: int, duplicates: int, dropped: int) -> None:
+    if not metrics_enabled():
+        return
+    CONTEXT_TOKENS.observe(float(tokens))
+    for outcome, amount in (
+        ("packed", packed),
+        ("truncated", truncated),
+        ("duplicate", duplicates),
+        ("dropped", dropped),
+    ):
+        if amount:
+            CONTEXT_SOURCES.inc(float(amount), outcome=outcome)
+
+
+def record_coalesced(kind: str) -> None:
+    if metrics_enabled():
+        COALESCED.inc(kind=kind)
+
+
+def record_upstream_event(model: str, event: str) -> None:
+    if metrics_enabled():
+        UPSTREAM_EVENTS.inc(model=model, event=event)
+
+
+def record_index_pool_event(kb: str, event: str) -> None:
+    if metrics_enabled():
+        INDEX_POOL_EVENTS.inc(kb=kb, event=event)
+
+
+def record_session_turn(outcome: str) -> None:
+    if metrics_enabled():
+        SESSION_TURNS.inc(outcome=outcome)
+
+
+@contextlib.contextmanager
+def collect_trace() -> Iterator[Trace]:
+    """Coleta os tempos por etapa da requisição atual (inclusive das etapas em threads)."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}.0"
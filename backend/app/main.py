@@ -1,12 +1,59 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from backend.app.api.routes import build_agent, get_index_pool
 from backend.app.api.routes import router as api_router
 from backend.app.core.config import get_settings
+from backend.app.rag.upstream import UpstreamOverloadedError, retry_after_header
+
+
+async def watch_vector_store(app: FastAPI, interval: float) -> None:
+    """Verifica periodicamente se há nova geração do índice e faz o hot-swap em background."""
+    while True:
+        await asyncio.sleep(interval)
+        agent = getattr(app.state, "agent", None)
+        try:
+            if agent is None:
+                app.state.agent = await asyncio.to_thread(build_agent)
+            else:
+                await asyncio.to_thread(agent.retriever.reload_if_stale)
+        except Exception:  # pragma: no cover - mantém o índice atual se a recarga falhar
+            pass
+        # Falha na base padrão não atrasa o hot-swap das bases do pool
+        with contextlib.suppress(Exception):
+            await asyncio.to_thread(get_index_pool(app).reload_stale)
+
 
-settings = get_settings()
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Settings resolvidas no startup, não no import do módulo
+    settings = get_settings()
+    app.title = settings.app_name
+    # Um único agente por processo: embeddings, cliente LLM e índice são carregados uma vez
+    app.state.agent = await asyncio.to_thread(build_agent)
+    # Bases adicionais mais acessadas já entram aquecidas no pool
+    if settings.index_pool_preload:
+        await asyncio.to_thread(get_index_pool(app).preload, settings.index_pool_preload)
+    watcher = None
+    if settings.vector_store_reload_interval > 0:
+        watcher = asyncio.create_task(
+            watch_vector_store(app, settings.vector_store_reload_interval)
+        )
+    try:
+        yield
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watcher
 
-app = FastAPI(title=settings.app_name)
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +65,16 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api")
 
 
+@app.exception_handler(UpstreamOverloadedError)
+async def upstream_overloaded(request: Request, exc: UpstreamOverloadedError) -> JSONResponse:
+    # Backpressure: falha rápida com Retry-After em vez de enfileirar sem limite
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": retry_after_header(exc)},
+    )
+
+
 @app.get("/")
 def root() -> dict[str, str]:
     return {"message": "Agente GenAI iFood para reembolso/cancelamento (POC)"}
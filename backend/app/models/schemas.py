@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from typing import List, Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -17,6 +18,10 @@ class KnowledgeDocument:
 
 class ChatRequest(BaseModel):
     question: str = Field(..., min_length=3)
+    # Quando informada, a busca considera apenas documentos dessa categoria (ex.: "reembolso")
+    categoria: Optional[str] = None
+    # Id escolhido pelo cliente para encadear perguntas de continuação na mesma conversa
+    session_id: Optional[str] = Field(default=None, min_length=1, max_length=128)
 
 
 class RetrievedSource(BaseModel):
@@ -38,3 +43,17 @@ class ChatResponse(BaseModel):
     is_fallback: bool
     sources: List[RetrievedSource]
     similarity_scores: List[SimilarityScore] = Field(default_factory=list)
+
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1)
+
+
+class ChatBatchItem(BaseModel):
+    index: int
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
@@ -1,52 +1,94 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+import asyncio
+import functools
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 from langchain_core.documents import Document
 
 from backend.app.core.config import get_settings
+from backend.app.core.metrics import record_fallback, record_session_turn, stage
 from backend.app.models.schemas import ChatResponse, RetrievedSource, SimilarityScore
-from backend.app.rag.llm_client import FALLBACK_MESSAGE, LLMClient
-from backend.app.rag.retriever import VectorStoreRetriever, RetrievalError
+from backend.app.rag.cache import ResponseCache, is_fake_embeddings
+from backend.app.rag.hashed_embeddings import HashedNgramEmbeddings
+from backend.app.rag.intent import (
+    OPERACIONAL,
+    OUT_OF_SCOPE_KEYWORDS,
+    SMALL_TALK,
+    IntentRouter,
+    build_intent_router,
+)
+from backend.app.rag.lexical import lexical_text, tokenize
+from backend.app.rag.llm_client import (
+    FALLBACK_MESSAGE,
+    SMALL_TALK_MESSAGE,
+    AnswerGenerator,
+    LLMClient,
+)
+from backend.app.rag.retriever import RankedRows, RetrievalError, VectorStoreRetriever
+from backend.app.rag.sessions import SessionStore, SessionTurn
+from backend.app.rag.vector_store import normalize_category
 
+__all__ = ["AgentService", "OUT_OF_SCOPE_KEYWORDS", "classify_scope"]
 
-OUT_OF_SCOPE_KEYWORDS = ["previsão do tempo", "clima", "tempo amanhã", "meteorologia"]
+
+_default_router: IntentRouter | None = None
 
 
 def classify_scope(question: str) -> str:
-    normalized = question.lower()
-    for keyword in OUT_OF_SCOPE_KEYWORDS:
-        if keyword in normalized:
-            return "FORA_DO_ESCOPO"
-    return "OPERACIONAL"
+    global _default_router
+    if _default_router is None:
+        _default_router = build_intent_router(get_settings())
+    return _default_router.route(question)
 
 
 class AgentService:
     def __init__(
         self,
         retriever: VectorStoreRetriever | None = None,
-        llm_client: LLMClient | None = None,
+        llm_client: AnswerGenerator | None = None,
         use_fake_override: bool | None = None,
+        intent_router: IntentRouter | None = None,
+        sessions: SessionStore | None = None,
     ):
         self.settings = get_settings()
         self.retriever = retriever or VectorStoreRetriever()
-        try:
-            from langchain_community.embeddings import FakeEmbeddings
-        except Exception:  # pragma: no cover - fallback sem dependência
-            FakeEmbeddings = None  # type: ignore
-        has_fake_embeddings = (
-            FakeEmbeddings is not None
-            and hasattr(self.retriever, "embeddings")
-            and isinstance(self.retriever.embeddings, FakeEmbeddings)
-        )
+        has_fake_embeddings = is_fake_embeddings(getattr(self.retriever, "embeddings", None))
         self.use_fake = (
             use_fake_override
             if use_fake_override is not None
-            else (self.settings.use_fake_embeddings or has_fake_embeddings)
+            else has_fake_embeddings
+            or (self.settings.use_fake_embeddings and self.settings.offline_embeddings == "fake")
+        )
+        self.llm_client: AnswerGenerator = llm_client or LLMClient()
+        self.response_cache = (
+            ResponseCache(
+                max_size=self.settings.response_cache_size,
+                ttl=self.settings.response_cache_ttl,
+                similarity=self.settings.response_cache_similarity,
+            )
+            if self.settings.response_cache_enabled
+            else None
         )
-        self.llm_client = llm_client or LLMClient()
+        # Pode ser compartilhado entre agentes (pool de bases): session_max vale para o processo
+        self.sessions = sessions if sessions is not None else SessionStore()
+        if intent_router is None and self.settings.intent_router_enabled:
+            intent_router = build_intent_router(self.settings)
+        self.intent_router = intent_router
+
+    def _to_sources(
+        self, found: RankedRows | List[Tuple[Document, float]]
+    ) -> List[RetrievedSource]:
+        # Linhas do índice são lidas direto da tabela de documentos; Documents vêm de retrievers
+        # simplificados (ex.: testes)
+        with stage("to_sources"):
+            if isinstance(found, RankedRows):
+                return found.sources()
+            return self._build_sources(found)
 
-    def _to_sources(self, docs_with_scores: List[Tuple[Document, float]]) -> List[RetrievedSource]:
+    def _build_sources(
+        self, docs_with_scores: List[Tuple[Document, float]]
+    ) -> List[RetrievedSource]:
         sources: List[RetrievedSource] = []
         for doc, score in docs_with_scores:
             metadata = doc.metadata
@@ -62,82 +104,537 @@ class AgentService:
             )
         return sources
 
-    def answer(self, question: str) -> ChatResponse:
-        intent = classify_scope(question)
-        if intent == "FORA_DO_ESCOPO":
-            return ChatResponse(
-                answer=FALLBACK_MESSAGE, is_fallback=True, sources=[], similarity_scores=[]
+    def _pinned(self) -> Dict[str, Any]:
+        """Snapshot do índice para embedding e busca da mesma pergunta (se o retriever expõe um).
+
+        Sem ele, uma geração nova carregada entre os dois passos buscaria o vetor de um embedder
+        no índice de outro.
+        """
+        snapshot = getattr(self.retriever, "snapshot", None)
+        return {"snapshot": snapshot} if snapshot is not None else {}
+
+    def _embed_question(
+        self, question: str, pinned: Dict[str, Any] | None = None
+    ) -> List[float] | None:
+        # Retrievers simplificados (ex.: testes) podem não expor embeddings; nesse caso não há cache
+        embed = getattr(self.retriever, "embed_query", None)
+        if embed is None:
+            return None
+        with stage("embed"):
+            return embed(question, **(pinned or {}))
+
+    def _retrieve(
+        self,
+        question: str,
+        vector: List[float] | None,
+        categoria: str | None = None,
+        pinned: Dict[str, Any] | None = None,
+    ) -> List[RetrievedSource]:
+        # Retrievers simplificados só recebem o filtro quando há categoria
+        filters: Dict[str, Any] = {"categoria": categoria} if categoria is not None else {}
+        found: RankedRows | List[Tuple[Document, float]]
+        with stage("search"):
+            if vector is not None and hasattr(self.retriever, "search_rows_by_vectors"):
+                found = self.retriever.search_rows_by_vectors(
+                    [vector], self.settings.retrieval_k, [question], **filters, **(pinned or {})
+                )[0]
+            elif vector is not None:
+                found = self.retriever.search_by_vector(
+                    vector,
+                    k=self.settings.retrieval_k,
+                    query=question,
+                    **filters,
+                    **(pinned or {}),
+                )
+            else:
+                found = self.retriever.search(question, k=self.settings.retrieval_k, **filters)
+        return self._to_sources(found)
+
+    async def _aembed_question(
+        self, question: str, pinned: Dict[str, Any] | None = None
+    ) -> List[float] | None:
+        aembed = getattr(self.retriever, "aembed_query", None)
+        if aembed is None:
+            return await asyncio.to_thread(self._embed_question, question, pinned)
+        with stage("embed"):
+            return await aembed(question, **(pinned or {}))
+
+    async def _aretrieve(
+        self,
+        question: str,
+        vector: List[float] | None,
+        categoria: str | None = None,
+        pinned: Dict[str, Any] | None = None,
+    ) -> List[RetrievedSource]:
+        filters: Dict[str, Any] = {"categoria": categoria} if categoria is not None else {}
+        found: RankedRows | List[Tuple[Document, float]]
+        if vector is not None and hasattr(self.retriever, "asearch_rows_by_vector"):
+            with stage("search"):
+                found = await self.retriever.asearch_rows_by_vector(
+                    vector,
+                    k=self.settings.retrieval_k,
+                    query=question,
+                    **filters,
+                    **(pinned or {}),
+                )
+        elif vector is not None and hasattr(self.retriever, "asearch_by_vector"):
+            with stage("search"):
+                found = await self.retriever.asearch_by_vector(
+                    vector,
+                    k=self.settings.retrieval_k,
+                    query=question,
+                    **filters,
+                    **(pinned or {}),
+                )
+        elif vector is None and hasattr(self.retriever, "asearch"):
+            with stage("search"):
+                found = await self.retriever.asearch(
+                    question, k=self.settings.retrieval_k, **filters
+                )
+        else:
+            return await asyncio.to_thread(self._retrieve, question, vector, categoria, pinned)
+        return self._to_sources(found)
+
+    async def _agenerate(self, question: str, sources: List[RetrievedSource]) -> str:
+        agenerate = getattr(self.llm_client, "agenerate", None)
+        with stage("generate"):
+            if agenerate is not None:
+                return await agenerate(question=question, sources=sources)
+            return await asyncio.to_thread(
+                self.llm_client.generate, question=question, sources=sources
             )
 
-        try:
-            docs_with_scores = self.retriever.search(question, k=self.settings.retrieval_k)
-        except RetrievalError:
-            return ChatResponse(
-                answer=FALLBACK_MESSAGE, is_fallback=True, sources=[], similarity_scores=[]
+    async def _astream_tokens(
+        self, question: str, sources: List[RetrievedSource]
+    ) -> AsyncIterator[str]:
+        astream = getattr(self.llm_client, "astream", None)
+        if astream is None:
+            yield await self._agenerate(question, sources)
+            return
+        with stage("generate"):
+            async for token in astream(question=question, sources=sources):
+                yield token
+
+    def _route(self, question: str) -> ChatResponse | None:
+        """Resposta imediata para saudações e perguntas fora do escopo (sem embedding nem LLM)."""
+        if self.intent_router is None:
+            return None
+        with stage("route"):
+            intent = self.intent_router.route(question)
+        if intent == SMALL_TALK:
+            record_fallback("small_talk")
+            return ChatResponse(answer=SMALL_TALK_MESSAGE, is_fallback=True, sources=[])
+        if intent != OPERACIONAL:
+            return _fallback_response(reason="out_of_scope")
+        return None
+
+    def _cached_response(
+        self, vector: List[float] | None, categoria: str | None = None
+    ) -> ChatResponse | None:
+        if vector is None or self.response_cache is None:
+            return None
+        with stage("cache_lookup"):
+            return self.response_cache.lookup(
+                vector, getattr(self.retriever, "generation", 0), _cache_scope(categoria)
             )
-        sources = self._to_sources(docs_with_scores)
-        if not sources:
-            return ChatResponse(
-                answer=FALLBACK_MESSAGE, is_fallback=True, sources=[], similarity_scores=[]
+
+    def _cache_response(
+        self, vector: List[float] | None, response: ChatResponse, categoria: str | None = None
+    ) -> None:
+        if vector is not None and self.response_cache is not None:
+            self.response_cache.store(
+                vector, response, getattr(self.retriever, "generation", 0), _cache_scope(categoria)
             )
 
-        top_score = sources[0].score or 0.0
+    def _session_key(self, session_id: str) -> str:
+        # Store compartilhado entre bases: o mesmo session_id em outra base é outra conversa
+        return f"{getattr(self.retriever, 'vector_store_path', '')}:{session_id}"
+
+    def _followup(
+        self,
+        session_id: str | None,
+        question: str,
+        vector: List[float] | None,
+        categoria: str | None,
+    ) -> SessionTurn | None:
+        if session_id is None or vector is None:
+            return None
+        with stage("session_lookup"):
+            turn = self.sessions.followup(
+                self._session_key(session_id),
+                question,
+                vector,
+                _cache_scope(categoria),
+                getattr(self.retriever, "generation", 0),
+                rescore=lambda sources: self._rescore(vector, sources),
+            )
+        record_session_turn("reuse" if turn is not None else "retrieve")
+        return turn
+
+    def _rescore(
+        self, vector: List[float], sources: List[RetrievedSource]
+    ) -> List[RetrievedSource] | None:
+        """Fontes da sessão com a distância para a nova pergunta; ``None`` quando nenhuma passa
+        no limiar de similaridade (a continuação mudou de assunto e precisa de busca nova)."""
+        source_distances = getattr(self.retriever, "source_distances", None)
+        if source_distances is None:
+            return sources
+        distances = source_distances(vector, [src.id for src in sources])
+        rescored = [
+            src.model_copy(update={"score": distance})
+            for src, distance in zip(sources, distances, strict=True)
+            if distance is not None
+        ]
+        best = min((src.score for src in rescored if src.score is not None), default=None)
+        if best is None or _similarity(best) < self.similarity_threshold:
+            return None
+        return rescored
+
+    def _remember(
+        self,
+        session_id: str | None,
+        question: str,
+        vector: List[float] | None,
+        response: ChatResponse,
+        categoria: str | None,
+    ) -> None:
+        # Só turnos respondidos com fontes servem de âncora para continuações
+        if session_id is None or vector is None or response.is_fallback or not response.sources:
+            return
+        self.sessions.remember(
+            self._session_key(session_id),
+            question,
+            vector,
+            response.sources,
+            _cache_scope(categoria),
+            getattr(self.retriever, "generation", 0),
+        )
+
+    def _has_overlap(self, question: str, sources: List[RetrievedSource]) -> bool:
+        # Com índice invertido a checagem é uma consulta às postings; sem ele, tokeniza as fontes
+        lexical_overlap = getattr(self.retriever, "has_lexical_overlap", None)
+        if lexical_overlap is not None:
+            return lexical_overlap(question, [src.id for src in sources])
+        return any(_has_question_overlap(question, src) for src in sources)
+
+    @property
+    def similarity_threshold(self) -> float:
+        """Limiar configurado ou, sem ele, o padrão do embedder atual do retriever (que pode
+        mudar num reload)."""
+        if self.settings.similarity_threshold is not None:
+            return self.settings.similarity_threshold
+        if isinstance(getattr(self.retriever, "embeddings", None), HashedNgramEmbeddings):
+            return self.settings.hashed_similarity_threshold
+        return self.settings.provider_similarity_threshold
+
+    def _evaluate(
+        self, question: str, sources: List[RetrievedSource]
+    ) -> Tuple[ChatResponse | None, List[RetrievedSource], List[SimilarityScore]]:
+        """Aplica as regras de fallback; devolve a resposta pronta quando não há o que gerar."""
+        if not sources:
+            return _fallback_response(reason="no_sources"), sources, []
+
+        # O score é a distância L2 ao quadrado; o limiar compara similaridade (cosseno). Na busca
+        # híbrida a ordem vem do RRF, então a melhor distância pode não ser a da primeira fonte
+        top_score = _similarity(
+            min((src.score for src in sources if src.score is not None), default=0.0)
+        )
         similarity_scores = [
-            SimilarityScore(source_id=src.id, score=src.score or 0.0)
+            SimilarityScore.model_construct(source_id=src.id, score=src.score or 0.0)
             for src in sources
             if src.score is not None
         ]
 
-        overlaps = [_has_question_overlap(question, src) for src in sources]
-        overlap_ok = any(overlaps)
-
         # Heurística para modo fake: se threshold for baixo (modo demo), prioriza responder com as fontes;
         # se threshold alto, mantém fallback salvo quando não há sobreposição.
-        if self.use_fake and self.settings.similarity_threshold <= 0.1:
-            answer = self.llm_client.generate(question=question, sources=sources)
-            return ChatResponse(
+        if self.use_fake and self.similarity_threshold <= 0.1:
+            return None, sources, similarity_scores
+
+        if self.use_fake:
+            if not self._has_overlap(question, sources):
+                response = _fallback_response(sources, similarity_scores, reason="no_overlap")
+                return response, sources, similarity_scores
+            top_score = max(top_score, 1.0)
+
+        if top_score < self.similarity_threshold:
+            response = _fallback_response(sources, similarity_scores, reason="low_score")
+            return response, sources, similarity_scores
+        return None, sources, similarity_scores
+
+    def answer(
+        self, question: str, categoria: str | None = None, session_id: str | None = None
+    ) -> ChatResponse:
+        routed = self._route(question)
+        if routed is not None:
+            return routed
+
+        pinned = self._pinned()
+        vector = self._embed_question(question, pinned)
+        turn = self._followup(session_id, question, vector, categoria)
+        if turn is None:
+            cached = self._cached_response(vector, categoria)
+            if cached is not None:
+                self._remember(session_id, question, vector, cached, categoria)
+                return cached
+            try:
+                sources = self._retrieve(question, vector, categoria, pinned)
+            except RetrievalError:
+                return _fallback_response(reason="retrieval_error")
+            prompt_question = question
+        else:
+            sources, prompt_question = turn.sources, _in_context(question, turn)
+        response, sources, similarity_scores = self._evaluate(prompt_question, sources)
+        if response is None:
+            with stage("generate"):
+                answer = self.llm_client.generate(question=prompt_question, sources=sources)
+            response = ChatResponse(
                 answer=answer,
                 is_fallback=False,
                 sources=sources,
                 similarity_scores=similarity_scores,
             )
 
-        if self.use_fake:
-            if not overlap_ok:
-                return ChatResponse(
-                    answer=FALLBACK_MESSAGE,
-                    is_fallback=True,
-                    sources=sources,
-                    similarity_scores=similarity_scores,
-                )
-            top_score = max(top_score, 1.0)
+        # Respostas de continuação dependem da conversa: ficam fora do cache semântico
+        if turn is None:
+            self._cache_response(vector, response, categoria)
+            self._remember(session_id, question, vector, response, categoria)
+        return response
+
+    async def aanswer(
+        self, question: str, categoria: str | None = None, session_id: str | None = None
+    ) -> ChatResponse:
+        """Versão assíncrona de ``answer``: embedding, busca e LLM não ocupam threads do pool."""
+        routed = self._route(question)
+        if routed is not None:
+            return routed
 
-        if top_score < self.settings.similarity_threshold:
-            return ChatResponse(
-                answer=FALLBACK_MESSAGE,
-                is_fallback=True,
+        pinned = self._pinned()
+        vector = await self._aembed_question(question, pinned)
+        turn = self._followup(session_id, question, vector, categoria)
+        if turn is None:
+            cached = self._cached_response(vector, categoria)
+            if cached is not None:
+                self._remember(session_id, question, vector, cached, categoria)
+                return cached
+            try:
+                sources = await self._aretrieve(question, vector, categoria, pinned)
+            except RetrievalError:
+                return _fallback_response(reason="retrieval_error")
+            prompt_question = question
+        else:
+            sources, prompt_question = turn.sources, _in_context(question, turn)
+        response, sources, similarity_scores = self._evaluate(prompt_question, sources)
+        if response is None:
+            answer = await self._agenerate(prompt_question, sources)
+            response = ChatResponse(
+                answer=answer,
+                is_fallback=False,
                 sources=sources,
                 similarity_scores=similarity_scores,
             )
 
-        answer = self.llm_client.generate(question=question, sources=sources)
-        return ChatResponse(
-            answer=answer, is_fallback=False, sources=sources, similarity_scores=similarity_scores
-        )
+        if turn is None:
+            self._cache_response(vector, response, categoria)
+            self._remember(session_id, question, vector, response, categoria)
+        return response
 
+    async def astream(
+        self, question: str, categoria: str | None = None, session_id: str | None = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Versão em streaming de ``aanswer``.
 
-def _has_question_overlap(question: str, source: RetrievedSource) -> bool:
-    """Heurística simples de sobreposição para evitar respostas irrelevantes no modo fake."""
-    import re
+        Emite ``("sources", ...)`` logo após a recuperação, ``("token", ...)`` para cada pedaço da
+        resposta e ``("done", ...)`` com ``is_fallback`` ao final.
+        """
+        sources: List[RetrievedSource] = []
+        similarity_scores: List[SimilarityScore] = []
+        vector: List[float] | None = None
+        turn: SessionTurn | None = None
+        prompt_question = question
+
+        response = self._route(question)
+        if response is None:
+            pinned = self._pinned()
+            vector = await self._aembed_question(question, pinned)
+            turn = self._followup(session_id, question, vector, categoria)
+            if turn is not None:
+                prompt_question = _in_context(question, turn)
+                response, sources, similarity_scores = self._evaluate(prompt_question, turn.sources)
+            else:
+                response = self._cached_response(vector, categoria)
+            if response is None and turn is None:
+                try:
+                    sources = await self._aretrieve(question, vector, categoria, pinned)
+                except RetrievalError:
+                    response = _fallback_response(reason="retrieval_error")
+                else:
+                    response, sources, similarity_scores = self._evaluate(question, sources)
 
-    def _tokens(text: str) -> set[str]:
+        if response is not None:
+            yield "sources", _sources_event(response.sources, response.similarity_scores)
+            yield "token", {"text": response.answer}
+            yield "done", {"is_fallback": response.is_fallback}
+            if vector is not None and turn is None:
+                self._cache_response(vector, response, categoria)
+                self._remember(session_id, question, vector, response, categoria)
+            return
+
+        yield "sources", _sources_event(sources, similarity_scores)
+        chunks: List[str] = []
+        async for token in self._astream_tokens(prompt_question, sources):
+            chunks.append(token)
+            yield "token", {"text": token}
+        yield "done", {"is_fallback": False}
+        if turn is None:
+            response = ChatResponse(
+                answer="".join(chunks),
+                is_fallback=False,
+                sources=sources,
+                similarity_scores=similarity_scores,
+            )
+            self._cache_response(vector, response, categoria)
+            self._remember(session_id, question, vector, response, categoria)
+
+    async def aanswer_batch(
+        self, questions: List[str], max_concurrency: int | None = None
+    ) -> List[ChatResponse | Exception]:
+        """Responde várias perguntas: um embedding em lote, uma busca vetorizada e geração
+        concorrente limitada. O resultado mantém a ordem; falhas viram a exceção da posição."""
+        results: List[ChatResponse | Exception | None] = [None] * len(questions)
+        pending: List[int] = []
+        for idx, question in enumerate(questions):
+            routed = self._route(question)
+            if routed is not None:
+                results[idx] = routed
+            else:
+                pending.append(idx)
+
+        vectors: Dict[int, List[float] | None] = {idx: None for idx in pending}
+        pinned = self._pinned()
+        if pending and hasattr(self.retriever, "aembed_queries"):
+            try:
+                with stage("embed"):
+                    embedded = await self.retriever.aembed_queries(
+                        [questions[i] for i in pending], **pinned
+                    )
+            except Exception as exc:
+                for idx in pending:
+                    results[idx] = exc
+                return results  # type: ignore[return-value]
+            vectors.update(zip(pending, embedded, strict=True))
+
+        to_search: List[int] = []
+        for idx in pending:
+            cached = self._cached_response(vectors[idx])
+            if cached is not None:
+                results[idx] = cached
+            else:
+                to_search.append(idx)
+
+        retrieved = await self._aretrieve_batch(questions, vectors, to_search, pinned)
+        semaphore = asyncio.Semaphore(max_concurrency or self.settings.batch_max_concurrency)
+
+        async def _complete(idx: int) -> ChatResponse:
+            found = retrieved[idx]
+            if isinstance(found, RetrievalError):
+                return _fallback_response(reason="retrieval_error")
+            if isinstance(found, Exception):
+                raise found
+            response, sources, similarity_scores = self._evaluate(questions[idx], found)
+            if response is None:
+                async with semaphore:
+                    answer = await self._agenerate(questions[idx], sources)
+                response = ChatResponse(
+                    answer=answer,
+                    is_fallback=False,
+                    sources=sources,
+                    similarity_scores=similarity_scores,
+                )
+            self._cache_response(vectors[idx], response)
+            return response
+
+        completed = await asyncio.gather(
+            *(_complete(idx) for idx in to_search), return_exceptions=True
+        )
+        for idx, outcome in zip(to_search, completed, strict=True):
+            results[idx] = outcome if isinstance(outcome, (ChatResponse, Exception)) else None
+        return results  # type: ignore[return-value]
+
+    async def _aretrieve_batch(
+        self,
+        questions: List[str],
+        vectors: Dict[int, List[float] | None],
+        indexes: List[int],
+        pinned: Dict[str, Any] | None = None,
+    ) -> Dict[int, List[RetrievedSource] | Exception]:
+        if not indexes:
+            return {}
+        batch_vectors = [vectors[idx] for idx in indexes]
+        search = getattr(self.retriever, "search_rows_by_vectors", None) or getattr(
+            self.retriever, "search_batch_by_vectors", None
+        )
+        if search is not None and all(vector is not None for vector in batch_vectors):
+            try:
+                with stage("search"):
+                    found = await asyncio.to_thread(
+                        functools.partial(search, **(pinned or {})),
+                        batch_vectors,
+                        self.settings.retrieval_k,
+                        [questions[idx] for idx in indexes],
+                    )
+                sources = [self._to_sources(item) for item in found]
+            except Exception as exc:
+                return {idx: exc for idx in indexes}
+            return dict(zip(indexes, sources, strict=True))
+
+        outcomes = await asyncio.gather(
+            *(self._aretrieve(questions[idx], vectors[idx], pinned=pinned) for idx in indexes),
+            return_exceptions=True,
+        )
         return {
-            re.sub(r"[^a-z0-9áàâãçéêíóôõúü]", "", raw)
-            for raw in text.lower().split()
-            if len(raw) > 2
+            idx: outcome if isinstance(outcome, (list, Exception)) else RetrievalError(str(outcome))
+            for idx, outcome in zip(indexes, outcomes, strict=True)
         }
 
-    q_tokens = _tokens(question)
-    doc_blob = " ".join([source.pergunta, source.resposta, source.categoria, source.fonte]).lower()
-    d_tokens = _tokens(doc_blob)
-    return len(q_tokens.intersection(d_tokens)) > 0
+
+def _fallback_response(
+    sources: List[RetrievedSource] | None = None,
+    similarity_scores: List[SimilarityScore] | None = None,
+    reason: str = "unknown",
+) -> ChatResponse:
+    record_fallback(reason)
+    return ChatResponse(
+        answer=FALLBACK_MESSAGE,
+        is_fallback=True,
+        sources=sources or [],
+        similarity_scores=similarity_scores or [],
+    )
+
+
+def _has_question_overlap(question: str, source: RetrievedSource) -> bool:
+    """Heurística simples de sobreposição para retrievers sem índice invertido (modo fake)."""
+    doc_blob = lexical_text(source.pergunta, source.resposta, source.categoria, source.fonte)
+    return bool(set(tokenize(question)).intersection(tokenize(doc_blob)))
+
+
+def _similarity(distance: float) -> float:
+    """Cosseno a partir da distância L2 ao quadrado entre vetores unitários (``2 - 2·cos``)."""
+    return 1.0 - distance / 2.0
+
+
+def _in_context(question: str, turn: SessionTurn) -> str:
+    """Pergunta de continuação com a pergunta âncora da sessão, para o prompt e o fallback."""
+    return f"{question} (continuação de: {turn.question})"
+
+
+def _cache_scope(categoria: str | None) -> str | None:
+    return normalize_category(categoria) if categoria is not None else None
+
+
+def _sources_event(
+    sources: List[RetrievedSource], similarity_scores: List[SimilarityScore]
+) -> Dict[str, Any]:
+    return {
+        "sources": [src.model_dump() for src in sources],
+        "similarity_scores": [score.model_dump() for score in similarity_scores],
+    }
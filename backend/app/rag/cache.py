@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import atexit
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from backend.app.models.schemas import ChatResponse, RetrievedSource
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza a pergunta para chave de cache (caixa e espaços não mudam o significado)."""
+    return " ".join(text.lower().split())
+
+
+def embedding_model_id(embeddings: Embeddings) -> str:
+    model = getattr(embeddings, "model", None)
+    if model:
+        return str(model)
+    size = getattr(embeddings, "size", None)
+    name = type(embeddings).__name__
+    return f"{name}-{size}" if size else name
+
+
+def is_fake_embeddings(embeddings: object) -> bool:
+    """``isinstance(embeddings, FakeEmbeddings)`` sem importar o LangChain Community: se o módulo
+    ainda não foi carregado, não existe nenhuma instância dele no processo."""
+    module = sys.modules.get("langchain_community.embeddings.fake")
+    return module is not None and isinstance(embeddings, module.FakeEmbeddings)
+
+
+class EmbeddingCache:
+    """Cache LRU de embeddings de consulta com persistência opcional em SQLite.
+
+    A chave é ``(modelo, texto normalizado)``; o vetor é guardado como ``array("f")`` (float32,
+    ~4x menor que uma lista de floats Python). Quando ``persist_path`` é informado, misses em
+    memória consultam o disco antes de chamar o provedor e cada vetor novo é gravado, de modo que
+    o cache sobrevive a restarts. A gravação é feita por uma thread própria: ``put`` só enfileira
+    (não bloqueia o event loop nem segura o lock) e os vetores acumulados na fila entram no SQLite
+    numa transação só, até ``write_batch`` por commit. ``flush`` espera a fila esvaziar.
+    """
+
+    def __init__(
+        self, max_size: int = 1024, persist_path: Path | None = None, write_batch: int = 256
+    ):
+        self.max_size = max_size
+        self.write_batch = write_batch
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries: OrderedDict[Tuple[str, str], array] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        # Conexão compartilhada entre a thread de gravação e as leituras de quem chama get
+        self._db_lock = threading.Lock()
+        self._writes: queue.Queue[Tuple[str, str, bytes] | None] = queue.Queue()
+        self._writer: threading.Thread | None = None
+        if persist_path is not None:
+            persist_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(persist_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            self._db.commit()
+            self._writer = threading.Thread(
+                target=self._write_loop, name="embedding-cache-writer", daemon=True
+            )
+            self._writer.start()
+            # A thread é daemon: o que ainda estiver na fila é gravado na saída do processo
+            atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, model: str, query: str) -> List[float] | None:
+        key = (model, normalize_query(query))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            vector = self._read_disk(key)
+            if vector is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._store(key, vector)
+                return vector.tolist()
+            self.misses += 1
+            return None
+
+    def put(self, model: str, query: str, vector: List[float]) -> None:
+        key = (model, normalize_query(query))
+        packed = array("f", vector)
+        with self._lock:
+            self._store(key, packed)
+        if self._writer is not None:
+            self._writes.put((*key, packed.tobytes()))
+
+    def get_or_compute(
+        self, model: str, query: str, compute: Callable[[str], List[float]]
+    ) -> List[float]:
+        vector = self.get(model, query)
+        if vector is None:
+            vector = list(compute(query))
+            self.put(model, query, vector)
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def flush(self) -> None:
+        """Bloqueia até os vetores enfileirados estarem gravados no SQLite."""
+        if self._writer is not None and self._writer.is_alive():
+            self._writes.join()
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self._writes.put(None)
+        self._writer.join()
+        self._writer = None
+        atexit.unregister(self.flush)
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _store(self, key: Tuple[str, str], vector: array) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: Tuple[str, str]) -> array | None:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?", key
+            ).fetchone()
+        if row is None:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._writes.get()]
+            # Junta o que já estiver na fila numa única transação
+            while len(batch) < self.write_batch:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            if rows:
+                with self._db_lock:
+                    if self._db is not None:
+                        self._db.executemany(
+                            "INSERT OR REPLACE INTO query_embeddings (model, query, vector) "
+                            "VALUES (?, ?, ?)",
+                            rows,
+                        )
+                        self._db.commit()
+            for _ in batch:
+                self._writes.task_done()
+            if len(rows) != len(batch):
+                return
+
+
+class ResponseCache:
+    """Cache semântico de respostas do agente.
+
+    Reaproveita um ``ChatResponse`` quando o embedding da nova pergunta tem similaridade de cosseno
+    maior ou igual a ``similarity`` com uma pergunta já respondida. As entradas expiram após
+    ``ttl`` segundos, o tamanho é limitado por LRU e todo o cache é descartado quando a geração do
+    vector store muda (as fontes podem ter mudado). ``scope`` separa respostas dadas com filtros
+    diferentes (ex.: busca restrita a uma categoria): só entradas do mesmo escopo são comparadas.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300.0, similarity: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.generation: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, Tuple[np.ndarray, ChatResponse, float, str | None]] = (
+            OrderedDict()
+        )
+        self._matrix: np.ndarray | None = None
+        self._keys: List[int] = []
+        self._scopes: np.ndarray | None = None
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self, vector: Sequence[float], generation: int, scope: str | None = None
+    ) -> ChatResponse | None:
+        query = _unit_vector(vector)
+        with self._lock:
+            self._sync_generation(generation)
+            self._purge_expired()
+            if not self._entries:
+                self.misses += 1
+                return None
+            matrix = self._stacked()
+            scores = matrix @ query
+            scores[self._scopes != scope] = -np.inf  # type: ignore[operator]
+            best = int(np.argmax(scores))
+            if float(scores[best]) < self.similarity:
+                self.misses += 1
+                return None
+            key = self._keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][1]
+
+    def store(
+        self,
+        vector: Sequence[float],
+        response: ChatResponse,
+        generation: int,
+        scope: str | None = None,
+    ) -> None:
+        with self._lock:
+            self._sync_generation(generation)
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (
+                _unit_vector(vector),
+                response,
+                time.monotonic() + self.ttl,
+                scope,
+            )
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimativa do que está em cache: vetores das perguntas e textos das respostas."""
+        with self._lock:
+            return sum(
+                vector.nbytes + len(response.answer) + sources_bytes(response.sources)
+                for vector, response, _, _ in self._entries.values()
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _sync_generation(self, generation: int) -> None:
+        if generation != self.generation:
+            self._entries.clear()
+            self._matrix = None
+            self.generation = generation
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[2] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _stacked(self) -> np.ndarray:
+        # Matriz das perguntas em cache reconstruída só quando o conjunto de entradas muda
+        if self._matrix is None:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[key][0] for key in self._keys])
+            self._scopes = np.asarray([self._entries[key][3] for key in self._keys], dtype=object)
+        return self._matrix
+
+
+def sources_bytes(sources: Sequence[RetrievedSource]) -> int:
+    """Tamanho aproximado dos textos das fontes (um byte por caractere)."""
+    return sum(
+        len(source.id) + len(source.fonte) + len(source.pergunta) + len(source.resposta)
+        for source in sources
+    )
+
+
+def _unit_vector(vector: Sequence[float]) -> np.ndarray:
+    array_vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array_vector))
+    return array_vector / norm if norm else array_vector
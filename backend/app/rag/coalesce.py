@@ -0,0 +1,85 @@
+"""Single-flight: chamadas idênticas simultâneas ao provedor compartilham uma única requisição.
+
+Em picos (ex.: restaurante fora do ar) vários atendentes fazem a mesma pergunta no mesmo segundo.
+A primeira chamada com uma chave vira a "líder" e executa; as que chegam enquanto ela está em
+voo esperam e recebem o mesmo resultado ou a mesma exceção. Nada é guardado depois que a
+chamada termina — reaproveitar resultados prontos é papel dos caches.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from backend.app.core.metrics import record_coalesced
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self, kind: str = "call"):
+        # ``kind`` só rotula a métrica de chamadas coalescidas (ex.: "embedding", "generation")
+        self.kind = kind
+        self.coalesced = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls) + len(self._tasks)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            running = self._calls.get(key)
+            if running is None:
+                call = self._calls[key] = _Call()
+            else:
+                self._count()
+        if running is not None:
+            running.done.wait()
+            if running.error is not None:
+                raise running.error
+            return running.result
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        # Futures pertencem a um event loop; a chave inclui o loop atual
+        task_key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[task_key] = task
+            task.add_done_callback(lambda done: self._finish(task_key, done))
+        else:
+            self._count()
+        # shield: se quem pediu primeiro for cancelado (cliente desconectou), os demais seguem
+        return await asyncio.shield(task)
+
+    def _finish(self, task_key: Tuple[int, Hashable], task: asyncio.Future) -> None:
+        self._tasks.pop(task_key, None)
+        # Marca a exceção como lida mesmo se todos os interessados foram cancelados
+        if not task.cancelled():
+            task.exception()
+
+    def _count(self) -> None:
+        self.coalesced += 1
+        record_coalesced(self.kind)
@@ -0,0 +1,176 @@
+"""Montagem do contexto do prompt dentro de um orçamento de tokens.
+
+As fontes entram na ordem de relevância do retriever (a mesma do ranking vetorial/híbrido),
+sem duplicatas nem passagens redundantes, cada uma cortada em ``source_max_tokens`` e o total
+limitado a ``max_tokens``. Tokens são contados com o tokenizer do modelo (tiktoken); sem o
+arquivo de encoding disponível (ambiente offline) usa uma estimativa conservadora.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, FrozenSet, Iterable, List, Tuple
+
+from backend.app.core.config import Settings
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.lexical import tokenize
+
+SEPARATOR = "\n\n"
+TRUNCATION_MARK = " […]"
+# Abaixo disso não vale cortar uma fonte só para caber no que sobrou do orçamento
+MIN_PARTIAL_TOKENS = 32
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@dataclass
+class PackedContext:
+    text: str
+    sources: List[RetrievedSource]
+    tokens: int
+    duplicates: int = 0
+    truncated: int = 0
+    # Fontes que não couberam no orçamento
+    dropped: List[RetrievedSource] = field(default_factory=list)
+
+
+class TokenCounter:
+    """Conta e corta texto em tokens do modelo; ``encode``/``decode`` ``None`` = estimativa."""
+
+    def __init__(
+        self,
+        encode: Callable[[str], List[int]] | None = None,
+        decode: Callable[[List[int]], str] | None = None,
+    ):
+        self._encode = encode
+        self._decode = decode
+
+    @property
+    def exact(self) -> bool:
+        return self._encode is not None
+
+    def count(self, text: str) -> int:
+        if self._encode is not None:
+            return len(self._encode(text))
+        return _estimate(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._encode is not None and self._decode is not None:
+            tokens = self._encode(text)
+            return text if len(tokens) <= max_tokens else self._decode(tokens[:max_tokens])
+        if _estimate(text) <= max_tokens:
+            return text
+        # Busca binária pelo maior prefixo (em palavras) cuja estimativa cabe no limite
+        words = text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if _estimate(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
+
+
+@lru_cache(maxsize=8)
+def token_counter_for_model(model: str) -> TokenCounter:
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception:  # noqa: BLE001 - sem tiktoken ou sem acesso ao arquivo de encoding
+        return TokenCounter()
+    return TokenCounter(encode=encoding.encode_ordinary, decode=encoding.decode)
+
+
+def render_source(src: RetrievedSource) -> str:
+    return (
+        f"[FONTE: {src.fonte}] [CATEGORIA: {src.categoria}]\n"
+        f"CENÁRIO: {src.pergunta}\nAÇÃO RECOMENDADA: {src.resposta}"
+    )
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        counter: TokenCounter,
+        max_tokens: int = 1500,
+        source_max_tokens: int = 400,
+        dedup_similarity: float = 0.9,
+    ):
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.source_max_tokens = source_max_tokens
+        self.dedup_similarity = dedup_similarity
+        self._separator_tokens = counter.count(SEPARATOR)
+        self._mark_tokens = counter.count(TRUNCATION_MARK)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ContextPacker":
+        return cls(
+            token_counter_for_model(settings.llm_model),
+            max_tokens=settings.context_max_tokens,
+            source_max_tokens=settings.context_source_max_tokens,
+            dedup_similarity=settings.context_dedup_similarity,
+        )
+
+    def pack(self, sources: Iterable[RetrievedSource]) -> PackedContext:
+        packed = PackedContext(text="", sources=[], tokens=0)
+        blocks: List[str] = []
+        seen: List[FrozenSet[str]] = []
+        for src in sources:
+            terms = frozenset(tokenize(f"{src.pergunta} {src.resposta}"))
+            if self._is_redundant(terms, seen):
+                packed.duplicates += 1
+                continue
+            remaining = self.max_tokens - packed.tokens
+            if blocks:
+                remaining -= self._separator_tokens
+            block = render_source(src)
+            tokens = self.counter.count(block)
+            limit = min(self.source_max_tokens, remaining)
+            if tokens > limit:
+                if limit < MIN_PARTIAL_TOKENS:
+                    packed.dropped.append(src)
+                    continue
+                block, tokens = self._truncate(block, limit)
+                packed.truncated += 1
+            if blocks:
+                packed.tokens += self._separator_tokens
+            blocks.append(block)
+            seen.append(terms)
+            packed.sources.append(src)
+            packed.tokens += tokens
+        packed.text = SEPARATOR.join(blocks)
+        return packed
+
+    def _truncate(self, block: str, limit: int) -> Tuple[str, int]:
+        # A contagem da concatenação pode passar do limite por um token na emenda; recorta de novo
+        budget = limit - self._mark_tokens
+        while True:
+            truncated = self.counter.truncate(block, budget) + TRUNCATION_MARK
+            tokens = self.counter.count(truncated)
+            if tokens <= limit or budget <= 0:
+                return truncated, tokens
+            budget -= tokens - limit
+
+    def _is_redundant(self, terms: FrozenSet[str], seen: List[FrozenSet[str]]) -> bool:
+        """Mesma passagem (ou quase) de uma fonte já incluída: Jaccard dos termos >= limiar."""
+        for other in seen:
+            union = len(terms | other)
+            if not union or len(terms & other) / union >= self.dedup_similarity:
+                return True
+        return False
+
+
+def _estimate(text: str) -> int:
+    # BPE em português fica perto de 4 caracteres por token; palavras curtas e pontuação contam 1
+    return max(len(_WORD_RE.findall(text)), math.ceil(len(text) / 4))
@@ -0,0 +1,121 @@
+"""Detecção de quase-duplicatas na ingestão: MinHash com LSH sobre pergunta + resposta.
+
+Cada linha vira um conjunto de shingles (n-gramas de caracteres do texto normalizado: minúsculas,
+sem acentos nem pontuação, mantendo números e palavras curtas) e uma assinatura MinHash de
+``num_perm`` valores; a fração de valores iguais entre duas assinaturas estima o Jaccard dos
+conjuntos. O LSH divide a assinatura em ``bands`` faixas e só compara linhas que coincidem em
+alguma faixa, na mesma categoria e com a mesma resposta normalizada: paráfrases da pergunta são
+agrupadas, mas respostas diferentes (ex.: "7 dias" x "30 dias") nunca. O custo fica próximo de
+linear no tamanho da base. Guarda assinatura só das linhas canônicas (a primeira de cada grupo).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from backend.app.rag.lexical import fold_accents
+
+# Primo de Mersenne 2^31 - 1: a * x + b cabe em int64 para x < 2^32
+_PRIME = (1 << 31) - 1
+FONTE_SEPARATOR = "; "
+SHINGLE_SIZE = 5
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação; números e palavras curtas são mantidos."""
+    return " ".join(_WORD_RE.findall(fold_accents(text)))
+
+
+@dataclass
+class DedupPlan:
+    """Resultado da detecção, por posição da linha no CSV."""
+
+    # Linha duplicada -> linha canônica que a representa
+    duplicates: Dict[int, int] = field(default_factory=dict)
+    # Linha canônica -> fontes de todo o grupo (ordem de leitura, sem repetição)
+    fontes: Dict[int, List[str]] = field(default_factory=dict)
+
+    @property
+    def merged(self) -> int:
+        return len(self.duplicates)
+
+    def fonte(self, position: int, original: str) -> str:
+        fontes = self.fontes.get(position)
+        return FONTE_SEPARATOR.join(fontes) if fontes else original
+
+
+class NearDuplicateDetector:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"bands={bands} precisa dividir num_perm={num_perm}.")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.int64)
+        self._buckets: Dict[Tuple[str, bytes, int, bytes], List[int]] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._fontes: Dict[int, str] = {}
+        self.plan = DedupPlan()
+
+    def shingles(self, text: str) -> np.ndarray:
+        normalized = normalize_text(text)
+        features = {
+            normalized[start : start + SHINGLE_SIZE]
+            for start in range(max(len(normalized) - SHINGLE_SIZE + 1, 1))
+        }
+        return np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features),
+            dtype=np.int64,
+            count=len(features),
+        )
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        if not len(shingles):
+            return np.full(len(self._a), _PRIME, dtype=np.uint32)
+        hashed = (self._a * shingles[None, :] + self._b) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def add(
+        self, position: int, categoria: str, fonte: str, pergunta: str, resposta: str
+    ) -> int | None:
+        """Registra a linha; devolve a posição da canônica quando ela é quase-duplicata."""
+        signature = self.signature(self.shingles(f"{pergunta} {resposta}"))
+        # Só linhas com a mesma resposta normalizada caem nos mesmos buckets
+        answer = hashlib.blake2b(normalize_text(resposta).encode("utf-8"), digest_size=8).digest()
+        keys = [
+            (
+                categoria,
+                answer,
+                band,
+                signature[band * self.rows_per_band : (band + 1) * self.rows_per_band].tobytes(),
+            )
+            for band in range(self.bands)
+        ]
+        candidates = sorted({row for key in keys for row in self._buckets.get(key, ())})
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                best, best_similarity = candidate, similarity
+        if best is None:
+            self._signatures[position] = signature
+            self._fontes[position] = sys.intern(fonte)
+            for key in keys:
+                self._buckets.setdefault(key, []).append(position)
+            return None
+        self.plan.duplicates[position] = best
+        fontes = self.plan.fontes.setdefault(best, [self._fontes[best]])
+        if fonte not in fontes:
+            fontes.append(fonte)
+        return best
@@ -0,0 +1,155 @@
+"""Embeddings locais por feature hashing de n-gramas de palavras e de caracteres, com TF-IDF.
+
+Não usa rede nem GPU: cada texto vira contagens de n-gramas espalhadas em ``dimension`` posições
+por um hash estável (CRC32, igual entre processos e máquinas), com sinal para compensar colisões.
+O TF é sublinear e o IDF por posição é ajustado uma vez na ingestão sobre a base e gravado em
+``hashed_idf.npy`` junto com a geração publicada; consultas e documentos usam o mesmo IDF. Os vetores saem
+normalizados (norma 1), então a distância L2 ao quadrado do índice equivale a ``2 - 2·cosseno``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import os
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.app.rag.lexical import tokenize
+
+HASHED_IDF_FILE = "hashed_idf.npy"
+
+# Textos por matriz densa (linhas x dimensão) montada de uma vez
+_BATCH_SIZE = 512
+
+
+@lru_cache(maxsize=65536)
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class HashedNgramEmbeddings(Embeddings):
+    def __init__(
+        self,
+        dimension: int = 1536,
+        word_ngrams: Tuple[int, int] = (1, 2),
+        char_ngrams: Tuple[int, int] = (3, 5),
+        idf: np.ndarray | None = None,
+    ):
+        self.dimension = dimension
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float32)
+
+    @classmethod
+    def load_or_create(cls, path: Path, dimension: int = 1536) -> "HashedNgramEmbeddings":
+        """IDF gravado em ``path`` quando existe; senão um embedder ainda não ajustado (só TF)."""
+        idf = np.load(path) if path.exists() else None
+        if idf is not None and len(idf) != dimension:
+            raise ValueError(f"IDF em {path} tem dimensão {len(idf)}, esperado {dimension}.")
+        return cls(dimension, idf=idf)
+
+    @property
+    def fitted(self) -> bool:
+        return self.idf is not None
+
+    @property
+    def model(self) -> str:
+        # O IDF faz parte do modelo: outro ajuste gera vetores incompatíveis (rebuild e cache novos)
+        fingerprint = (
+            hashlib.sha1(self.idf.tobytes()).hexdigest()[:8] if self.idf is not None else "tf"
+        )
+        return f"hashed-ngram-{self.dimension}-{fingerprint}"
+
+    def features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        features: List[str] = []
+        low, high = self.word_ngrams
+        for n in range(low, high + 1):
+            features.extend(
+                "w:" + " ".join(tokens[idx : idx + n]) for idx in range(len(tokens) - n + 1)
+            )
+        low, high = self.char_ngrams
+        for token in tokens:
+            padded = f"<{token}>"
+            for n in range(low, high + 1):
+                features.extend("c:" + padded[idx : idx + n] for idx in range(len(padded) - n + 1))
+        return features
+
+    def _hashed(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Posição achatada (linha * dimensão + bucket) e sinal de cada feature do lote."""
+        rows: List[int] = []
+        hashes: List[int] = []
+        for row, text in enumerate(texts):
+            features = self.features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(map(_hash, features))
+        hashed = np.asarray(hashes, dtype=np.uint32)
+        row_ids = np.asarray(rows, dtype=np.int64)
+        buckets = (hashed % self.dimension).astype(np.int64)
+        signs = np.where(hashed >> 31, -1.0, 1.0)
+        return row_ids * self.dimension + buckets, signs
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        positions, signs = self._hashed(texts)
+        size = len(texts) * self.dimension
+        counts = np.bincount(positions, weights=signs, minlength=size).reshape(len(texts), -1)
+        # TF sublinear preservando o sinal do hashing
+        matrix = np.sign(counts) * np.log1p(np.abs(counts))
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix.astype(np.float32)
+
+    def embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate(
+            [
+                self._embed_batch(texts[start : start + _BATCH_SIZE])
+                for start in range(0, len(texts), _BATCH_SIZE)
+            ]
+        )
+
+    def fit(self, texts: Iterable[str]) -> "HashedNgramEmbeddings":
+        """Ajusta o IDF suavizado (``log((1 + N) / (1 + df)) + 1``) por posição do hash."""
+        document_frequency = np.zeros(self.dimension, dtype=np.int64)
+        total = 0
+        iterator = iter(texts)
+        while batch := list(itertools.islice(iterator, _BATCH_SIZE)):
+            positions, _ = self._hashed(batch)
+            # Posições únicas por (linha, bucket): cada documento conta uma vez por bucket
+            document_frequency += np.bincount(
+                np.unique(positions) % self.dimension, minlength=self.dimension
+            )
+            total += len(batch)
+        self.idf = (np.log((1.0 + total) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        return self
+
+    def save(self, path: Path) -> None:
+        if self.idf is None:
+            raise ValueError("Embedder sem IDF ajustado; chame fit antes de salvar.")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(f".{path.name}.tmp")
+        with tmp_file.open("wb") as f:
+            np.save(f, self.idf)
+        os.replace(tmp_file, path)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    # Microssegundos de CPU: roda direto no event loop, sem passar por thread
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
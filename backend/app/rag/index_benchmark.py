@@ -0,0 +1,143 @@
+"""Benchmark dos tipos de índice: recall@k contra a busca exata, QPS e memória.
+
+Uso::
+
+    python -m backend.app.rag.index_benchmark --vector-store data/vector_store
+    python -m backend.app.rag.index_benchmark --synthetic 100000 --dim 1536 --nprobe 8,16,32
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import faiss
+import numpy as np
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.rag.vector_store import (
+    INDEX_TYPES,
+    NativeVectorStore,
+    build_ann_index,
+    configure_search_params,
+)
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Vetores agrupados em clusters, mais próximos de embeddings reais do que ruído uniforme."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def sample_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, vectors.shape[0], size=count)]
+    queries = np.ascontiguousarray(picked + 0.05 * rng.normal(size=picked.shape), dtype=np.float32)
+    return queries
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth, strict=True))
+    return hits / float(truth.size)
+
+
+def _measure(index: faiss.Index, queries: np.ndarray, k: int, truth: np.ndarray) -> Dict[str, Any]:
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    return {
+        "recall_at_k": round(recall_at_k(found, truth), 4),
+        "qps": round(queries.shape[0] / elapsed, 1) if elapsed else None,
+    }
+
+
+def run_benchmark(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 4,
+    index_types: Sequence[str] = INDEX_TYPES,
+    settings: Settings | None = None,
+    nprobes: Sequence[int] = (),
+    ef_searches: Sequence[int] = (),
+) -> List[Dict[str, Any]]:
+    settings = settings or get_settings()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    exact = faiss.IndexFlatL2(int(vectors.shape[1]))
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    results: List[Dict[str, Any]] = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = exact if index_type == "flat" else build_ann_index(vectors, index_type, settings)
+        build_seconds = 0.0 if index_type == "flat" else time.perf_counter() - start
+        if index is None:
+            results.append({"index_type": index_type, "skipped": "dados insuficientes para treino"})
+            continue
+        base = {
+            "index_type": index_type,
+            "build_seconds": round(build_seconds, 3),
+            "memory_bytes": int(faiss.serialize_index(index).nbytes),
+        }
+        if faiss.try_extract_index_ivf(index) is not None:
+            sweep = [{"nprobe": value} for value in (nprobes or [settings.ivf_nprobe])]
+        elif hasattr(index, "hnsw"):
+            sweep = [{"ef_search": value} for value in (ef_searches or [settings.hnsw_ef_search])]
+        else:
+            sweep = [{}]
+        for params in sweep:
+            configure_search_params(index, settings, **params)
+            results.append({**base, **params, **_measure(index, queries, k, truth)})
+    return results
+
+
+def _int_list(raw: str) -> List[int]:
+    return [int(value) for value in raw.split(",") if value]
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vector-store", type=Path, help="diretório do vector store nativo")
+    parser.add_argument("--synthetic", type=int, help="gera N vetores sintéticos em vez de ler")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=get_settings().retrieval_k)
+    parser.add_argument("--index-types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--nprobe", type=_int_list, default=[])
+    parser.add_argument("--ef-search", type=_int_list, default=[])
+    parser.add_argument("--output", type=Path, help="grava o resultado em JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        store_dir = args.vector_store or get_settings().vector_store_path
+        vectors = np.asarray(NativeVectorStore.load(store_dir).vectors)
+    results = run_benchmark(
+        vectors,
+        sample_queries(vectors, args.queries),
+        k=args.k,
+        index_types=[name for name in args.index_types.split(",") if name],
+        nprobes=args.nprobe,
+        ef_searches=args.ef_search,
+    )
+    report = json.dumps(
+        {"count": int(vectors.shape[0]), "dim": int(vectors.shape[1]), "results": results},
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report, encoding="utf-8")
+    print(report, file=sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
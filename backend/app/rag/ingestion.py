@@ -1,53 +1,250 @@
 from __future__ import annotations
 
+import argparse
 import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Iterable, List
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Tuple
 
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
-from langchain_community.embeddings import FakeEmbeddings
-from langchain_openai import OpenAIEmbeddings
 
 from backend.app.core.config import get_settings
+from backend.app.core.metrics import ingestion_stage
 from backend.app.models.schemas import KnowledgeDocument
+from backend.app.rag.cache import embedding_model_id
+from backend.app.rag.dedup import DedupPlan, NearDuplicateDetector
+from backend.app.rag.hashed_embeddings import HASHED_IDF_FILE, HashedNgramEmbeddings
+from backend.app.rag.upstream import shared_embeddings
+from backend.app.rag.vector_store import (
+    GENERATION_FILE,
+    GENERATIONS_DIR,
+    NATIVE_FILES,
+    format_content,
+    generation_dir,
+    read_generation,
+    store_dir,
+    write_native_store,
+)
 
+if TYPE_CHECKING:
+    # LangChain Community/OpenAI só carregam no caminho que os usa (boot rápido da API e da CLI)
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import Embeddings
 
-def build_embeddings(settings) -> Embeddings:
-    # Usa embeddings fake quando solicitado ou quando não há chave OpenAI definida
+MANIFEST_FILE = "manifest.json"
+INDEX_FILES = ("index.faiss", "index.pkl")
+CHECKPOINT_DIR = ".checkpoint"
+CHECKPOINT_FILE = "checkpoint.json"
+# Segmentos do checkpoint: só recebem append; o estado guarda até onde cada um é válido
+CHECKPOINT_VECTORS = "vectors.f32"
+CHECKPOINT_DOCUMENTS = "documents.jsonl"
+
+
+@dataclass
+class IngestionStats:
+    added: int
+    removed: int
+    unchanged: int
+    generation: int
+    full_rebuild: bool
+    # Linhas quase-duplicadas agrupadas no documento canônico (não embedadas)
+    merged: int = 0
+
+
+def _write_generation(vector_dir: Path, generation: int) -> None:
+    tmp_file = vector_dir / f".{GENERATION_FILE}.tmp"
+    tmp_file.write_text(str(generation), encoding="utf-8")
+    os.replace(tmp_file, vector_dir / GENERATION_FILE)
+
+
+def publish_vector_store(
+    vector_store: FAISS,
+    vector_dir: Path,
+    manifest: Dict[str, Any] | None = None,
+    embeddings: Embeddings | None = None,
+) -> int:
+    """Grava a nova geração num diretório próprio e troca o ponteiro ``GENERATION``.
+
+    A geração é montada inteira em staging e renomeada de uma vez para ``generations/<N>/``; só
+    depois o arquivo ``GENERATION`` (temporário + ``os.replace``) passa a apontar para ela. Leitores
+    abrem sempre o diretório de uma geração completa e imutável, nunca uma mistura de arquivos de
+    gerações diferentes. Além do formato do LangChain (usado pela ingestão incremental) grava o
+    formato nativo memory-mapped, que é o carregado pelos workers da API. Com o embedder local
+    ajustado, o IDF vai junto na geração: índice e consultas sempre usam o mesmo ajuste.
+    """
+    vector_dir.mkdir(parents=True, exist_ok=True)
+    generation = read_generation(vector_dir) + 1
+    target_dir = generation_dir(vector_dir, generation)
+    staging_dir = target_dir.with_name(f".staging-{generation}")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    # Sobra de uma publicação interrompida: nenhum leitor a enxerga, pois o ponteiro não mudou
+    shutil.rmtree(target_dir, ignore_errors=True)
+    staging_dir.mkdir(parents=True)
+    with ingestion_stage("save_faiss"):
+        vector_store.save_local(str(staging_dir))
+    with ingestion_stage("write_native"):
+        write_native_store(
+            vector_store,
+            staging_dir,
+            generation,
+            embedding_model=(manifest or {}).get("embedding_model"),
+        )
+    if isinstance(embeddings, HashedNgramEmbeddings) and embeddings.fitted:
+        embeddings.save(staging_dir / HASHED_IDF_FILE)
+    if manifest is not None:
+        (staging_dir / MANIFEST_FILE).write_text(
+            json.dumps({**manifest, "generation": generation}), encoding="utf-8"
+        )
+    os.replace(staging_dir, target_dir)
+    _write_generation(vector_dir, generation)
+    _prune_generations(vector_dir, generation)
+    return generation
+
+
+def _prune_generations(vector_dir: Path, generation: int) -> None:
+    """Mantém a geração anterior para leitores que ainda a estão carregando; apaga as mais
+    antigas e os arquivos do layout antigo (gravados direto na raiz)."""
+    for path in (vector_dir / GENERATIONS_DIR).iterdir():
+        if path.name.isdigit() and int(path.name) < generation - 1:
+            shutil.rmtree(path, ignore_errors=True)
+    for name in (*INDEX_FILES, *NATIVE_FILES, MANIFEST_FILE, HASHED_IDF_FILE):
+        (vector_dir / name).unlink(missing_ok=True)
+
+
+def build_embeddings(
+    settings, vector_dir: Path | None = None, generation: int | None = None
+) -> Embeddings:
+    # Usa embeddings offline quando solicitado ou quando não há chave OpenAI definida
     if settings.use_fake_embeddings or not settings.openai_api_key:
-        return FakeEmbeddings(size=1536)
-    return OpenAIEmbeddings(model=settings.embedding_model, api_key=settings.openai_api_key)
+        if settings.offline_embeddings == "fake":
+            from langchain_community.embeddings import FakeEmbeddings
 
+            return FakeEmbeddings(size=1536)
+        # IDF ajustado na ingestão fica no diretório da geração (padrão: a atual)
+        return HashedNgramEmbeddings.load_or_create(
+            store_dir(vector_dir or settings.vector_store_path, generation) / HASHED_IDF_FILE,
+            settings.hashed_embedding_dimension,
+        )
+    # Uma instância por modelo no processo, sobre o pool HTTP compartilhado
+    return shared_embeddings(
+        settings.embedding_model, settings.openai_api_key, settings.openai_base_url
+    )
 
-def csv_to_documents(csv_path: Path) -> List[KnowledgeDocument]:
-    documents: List[KnowledgeDocument] = []
+
+def read_manifest(vector_dir: Path) -> Dict[str, Any] | None:
+    try:
+        return json.loads((store_dir(vector_dir) / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def content_hash_id(categoria: str, pergunta: str, resposta: str, fonte: str) -> str:
+    """Id estável derivado do conteúdo: inserir/remover linhas não muda o id das demais."""
+    digest = hashlib.sha1(
+        "\x1f".join([categoria, pergunta, resposta, fonte]).encode("utf-8")
+    ).hexdigest()
+    return f"doc-{digest[:16]}"
+
+
+class SeenIds:
+    """Filtro de Bloom dos ids já lidos: memória fixa, seja qual for o tamanho do CSV.
+
+    Um falso positivo só faz uma linha única ganhar sufixo no id (que continua único e
+    determinístico para o mesmo CSV); com o tamanho padrão a taxa fica em ~0,2% a 1M de linhas.
+    """
+
+    def __init__(self, bits: int = 1 << 24, hashes: int = 4):
+        self._bits = bytearray(bits // 8)
+        self._mask = bits - 1
+        self._hashes = hashes
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def add(self, key: str) -> bool:
+        """Marca ``key``; devolve ``True`` se ela (provavelmente) já tinha sido vista."""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self._hashes).digest()
+        seen = True
+        for idx in range(self._hashes):
+            position = int.from_bytes(digest[4 * idx : 4 * idx + 4], "little") & self._mask
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self._bits[byte] & bit:
+                seen = False
+                self._bits[byte] |= bit
+        return seen
+
+
+def iter_csv_documents(csv_path: Path) -> Iterator[KnowledgeDocument]:
+    """Lê o CSV linha a linha, sem materializar a base inteira em memória."""
+    seen = SeenIds()
+    # Contador só para os ids que se repetem (e falsos positivos do filtro), não para todos
+    repeats: Dict[str, int] = {}
     with csv_path.open("r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
-        for idx, row in enumerate(reader):
+        for row in reader:
             categoria = row.get("categoria", "").strip()
             pergunta = row.get("pergunta", "").strip()
             resposta = row.get("resposta", "").strip()
             fonte = row.get("fonte", "").strip()
-            content = (
-                f"[FONTE: {fonte}]\n"
-                f"[CATEGORIA: {categoria}]\n"
-                f"CENÁRIO: {pergunta}\n"
-                f"AÇÃO RECOMENDADA: {resposta}"
+            content = format_content(fonte, categoria, pergunta, resposta)
+            doc_id = content_hash_id(categoria, pergunta, resposta, fonte)
+            # Linhas idênticas recebem sufixo para manter ids únicos no docstore
+            if seen.add(doc_id):
+                repeats[doc_id] = repeats.get(doc_id, 1) + 1
+                doc_id = f"{doc_id}-{repeats[doc_id]}"
+            yield KnowledgeDocument(
+                id=doc_id,
+                content=content,
+                categoria=categoria,
+                fonte=fonte,
+                pergunta=pergunta,
+                resposta=resposta,
             )
-            doc_id = f"doc-{idx+1}"
-            documents.append(
-                KnowledgeDocument(
-                    id=doc_id,
-                    content=content,
-                    categoria=categoria,
-                    fonte=fonte,
-                    pergunta=pergunta,
-                    resposta=resposta,
-                )
-            )
-    return documents
+
+
+def plan_near_duplicates(csv_path: Path, similarity: float) -> DedupPlan:
+    """Passada pelo CSV só com assinaturas MinHash: decide quais linhas viram uma canônica."""
+    detector = NearDuplicateDetector(threshold=similarity)
+    for position, doc in enumerate(iter_csv_documents(csv_path)):
+        detector.add(position, doc.categoria, doc.fonte, doc.pergunta, doc.resposta)
+    return detector.plan
+
+
+def collapse_near_duplicates(
+    docs: Iterable[KnowledgeDocument], plan: DedupPlan
+) -> Iterator[KnowledgeDocument]:
+    """Pula as quase-duplicatas; a canônica do grupo leva todas as fontes (id recalculado)."""
+    for position, doc in enumerate(docs):
+        if position in plan.duplicates:
+            continue
+        if position not in plan.fontes:
+            yield doc
+            continue
+        fonte = plan.fonte(position, doc.fonte)
+        yield KnowledgeDocument(
+            id=content_hash_id(doc.categoria, doc.pergunta, doc.resposta, fonte),
+            content=format_content(fonte, doc.categoria, doc.pergunta, doc.resposta),
+            categoria=doc.categoria,
+            fonte=fonte,
+            pergunta=doc.pergunta,
+            resposta=doc.resposta,
+        )
+
+
+def csv_to_documents(csv_path: Path) -> List[KnowledgeDocument]:
+    return list(iter_csv_documents(csv_path))
 
 
 def knowledge_documents_to_langchain_docs(docs: Iterable[KnowledgeDocument]) -> List[Document]:
@@ -64,21 +261,346 @@ def knowledge_documents_to_langchain_docs(docs: Iterable[KnowledgeDocument]) ->
     return langchain_docs
 
 
-def ingest_csv_to_vector_store(
-    csv_path: Path | None = None, persist_dir: Path | None = None
+def _build_manifest(embeddings: Embeddings, doc_ids: Iterable[str]) -> Dict[str, Any]:
+    return {"embedding_model": embedding_model_id(embeddings), "ids": sorted(doc_ids)}
+
+
+def _is_rate_limit_error(exc: Exception) -> bool:
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def embed_with_retry(
+    embeddings: Embeddings, texts: List[str], max_retries: int, backoff_seconds: float
+) -> List[List[float]]:
+    """Embeda um lote repetindo com backoff exponencial (e jitter) quando o provedor devolve 429."""
+    attempt = 0
+    while True:
+        try:
+            with ingestion_stage("embed"):
+                return embeddings.embed_documents(texts)
+        except Exception as exc:
+            if not _is_rate_limit_error(exc) or attempt >= max_retries:
+                raise
+            time.sleep(backoff_seconds * (2**attempt) + random.uniform(0, backoff_seconds))
+            attempt += 1
+
+
+def _chunked(items: Iterable[KnowledgeDocument], size: int) -> Iterator[List[KnowledgeDocument]]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def iter_embedded_batches(
+    embeddings: Embeddings,
+    documents: Iterable[KnowledgeDocument],
+    batch_size: int,
+    workers: int,
+    max_retries: int = 5,
+    backoff_seconds: float = 1.0,
+) -> Iterator[Tuple[List[KnowledgeDocument], List[List[float]]]]:
+    """Embeda lotes em paralelo mantendo no máximo ``workers`` lotes em voo.
+
+    Os lotes saem na ordem de leitura do CSV, o que permite checkpoint por número de linhas.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: Deque[Tuple[List[KnowledgeDocument], Future]] = deque()
+        for batch in _chunked(documents, batch_size):
+            future = executor.submit(
+                embed_with_retry,
+                embeddings,
+                [doc.content for doc in batch],
+                max_retries,
+                backoff_seconds,
+            )
+            in_flight.append((batch, future))
+            if len(in_flight) >= workers:
+                done_batch, done_future = in_flight.popleft()
+                yield done_batch, done_future.result()
+        while in_flight:
+            done_batch, done_future = in_flight.popleft()
+            yield done_batch, done_future.result()
+
+
+def _add_batch(
+    vector_store: FAISS | None,
+    embeddings: Embeddings,
+    batch: List[KnowledgeDocument],
+    vectors: List[List[float]],
 ) -> FAISS:
+    langchain_docs = knowledge_documents_to_langchain_docs(batch)
+    text_embeddings = list(zip([doc.page_content for doc in langchain_docs], vectors, strict=True))
+    metadatas = [doc.metadata for doc in langchain_docs]
+    ids = [doc.id for doc in batch]
+    with ingestion_stage("index_add"):
+        if vector_store is None:
+            from langchain_community.vectorstores import FAISS
+
+            return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return vector_store
+
+
+def _csv_fingerprint(csv_path: Path) -> str:
+    stat = csv_path.stat()
+    return f"{csv_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _load_checkpoint(
+    checkpoint_dir: Path, fingerprint: str, embeddings: Embeddings
+) -> Tuple[FAISS | None, Dict[str, Any]]:
+    """Reconstrói o índice a partir dos segmentos gravados, sem reembedar nada.
+
+    Devolve o estado do checkpoint (``rows_done`` e bytes válidos de cada segmento); o que
+    passar desses limites é sobra de uma gravação interrompida e é truncado.
+    """
+    empty: Dict[str, Any] = {"rows_done": 0, "vectors_bytes": 0, "documents_bytes": 0}
+    try:
+        state = json.loads((checkpoint_dir / CHECKPOINT_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None, empty
+    if state.get("fingerprint") != fingerprint or state.get(
+        "embedding_model"
+    ) != embedding_model_id(embeddings):
+        return None, empty
+    rows_done = int(state["rows_done"])
+    vectors_path = checkpoint_dir / CHECKPOINT_VECTORS
+    documents_path = checkpoint_dir / CHECKPOINT_DOCUMENTS
+    try:
+        vectors = np.fromfile(vectors_path, dtype=np.float32, count=state["vectors_bytes"] // 4)
+        with documents_path.open("rb") as fh:
+            lines = fh.read(state["documents_bytes"]).splitlines()
+    except (FileNotFoundError, KeyError):
+        return None, empty
+    if not rows_done or len(lines) != rows_done or vectors.size % rows_done:
+        return None, empty
+    for path, size in (
+        (vectors_path, state["vectors_bytes"]),
+        (documents_path, state["documents_bytes"]),
+    ):
+        with path.open("r+b") as fh:
+            fh.truncate(size)
+    docs = [KnowledgeDocument(**json.loads(line)) for line in lines]
+    vector_store = _add_batch(None, embeddings, docs, vectors.reshape(rows_done, -1).tolist())
+    return vector_store, state
+
+
+def _save_checkpoint(
+    checkpoint_dir: Path,
+    state: Dict[str, Any],
+    pending: List[Tuple[List[KnowledgeDocument], List[List[float]]]],
+) -> None:
+    """Anexa aos segmentos só os lotes feitos desde o último checkpoint (I/O linear no total)."""
+    with ingestion_stage("checkpoint"):
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        with (
+            (checkpoint_dir / CHECKPOINT_VECTORS).open("ab") as vectors_fh,
+            (checkpoint_dir / CHECKPOINT_DOCUMENTS).open("ab") as documents_fh,
+        ):
+            for batch, vectors in pending:
+                vectors_fh.write(np.asarray(vectors, dtype=np.float32).tobytes())
+                documents_fh.writelines(
+                    json.dumps(asdict(doc), ensure_ascii=False).encode("utf-8") + b"\n"
+                    for doc in batch
+                )
+                state["rows_done"] += len(batch)
+            vectors_fh.flush()
+            documents_fh.flush()
+            os.fsync(vectors_fh.fileno())
+            os.fsync(documents_fh.fileno())
+            state["vectors_bytes"] = vectors_fh.tell()
+            state["documents_bytes"] = documents_fh.tell()
+        tmp_file = checkpoint_dir / f".{CHECKPOINT_FILE}.tmp"
+        tmp_file.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp_file, checkpoint_dir / CHECKPOINT_FILE)
+    pending.clear()
+
+
+def run_ingestion(
+    csv_path: Path | None = None,
+    persist_dir: Path | None = None,
+    incremental: bool = False,
+    embeddings: Embeddings | None = None,
+    batch_size: int | None = None,
+    workers: int | None = None,
+    checkpoint_every: int | None = None,
+    progress: Callable[[int], None] | None = None,
+    dedup: bool | None = None,
+) -> Tuple[FAISS, IngestionStats]:
+    """Ingere o CSV no vector store em streaming.
+
+    O CSV é lido em lotes de ``batch_size`` linhas, embedado por ``workers`` threads (com retry em
+    rate limit) e adicionado ao índice lote a lote, então a memória de trabalho não cresce com o
+    tamanho do arquivo. O rebuild completo grava checkpoints periódicos em ``.checkpoint/`` e uma
+    execução interrompida retoma do último lote salvo.
+
+    No modo incremental o manifesto da última ingestão é comparado com os ids atuais (hash do
+    conteúdo): só linhas novas/editadas são embedadas e linhas removidas saem do índice. Sem
+    manifesto compatível (primeira execução ou troca de modelo) faz rebuild completo.
+
+    Com ``dedup`` (padrão: ``ingestion_dedup``) uma passada prévia por MinHash/LSH agrupa linhas
+    quase-duplicadas da mesma categoria: só a primeira de cada grupo é embedada, com as fontes de
+    todas, e ``IngestionStats.merged`` conta as que foram absorvidas.
+    """
     settings = get_settings()
     csv_file = csv_path or settings.csv_path
     vector_dir = persist_dir or settings.vector_store_path
-    docs = csv_to_documents(csv_file)
-    langchain_docs = knowledge_documents_to_langchain_docs(docs)
-    embeddings = build_embeddings(settings)
-    vector_store = FAISS.from_documents(langchain_docs, embeddings)
-    vector_dir.mkdir(parents=True, exist_ok=True)
-    vector_store.save_local(str(vector_dir))
+    embeddings = embeddings or build_embeddings(settings, vector_dir)
+    plan = DedupPlan()
+    if settings.ingestion_dedup if dedup is None else dedup:
+        with ingestion_stage("dedup"):
+            plan = plan_near_duplicates(csv_file, settings.ingestion_dedup_similarity)
+
+    def _documents() -> Iterator[KnowledgeDocument]:
+        return collapse_near_duplicates(iter_csv_documents(csv_file), plan)
+
+    if isinstance(embeddings, HashedNgramEmbeddings) and not embeddings.fitted:
+        # Primeira ingestão com o embedder local: uma passada pelo CSV só para o IDF
+        # O IDF só é gravado com a geração publicada, nunca direto no diretório servido
+        with ingestion_stage("fit_idf"):
+            embeddings.fit(doc.content for doc in _documents())
+    batch_size = batch_size or settings.ingestion_batch_size
+    workers = workers or settings.ingestion_workers
+    checkpoint_every = checkpoint_every or settings.ingestion_checkpoint_every
+    manifest = read_manifest(vector_dir) if incremental else None
+
+    def _embedded(documents: Iterable[KnowledgeDocument]):
+        return iter_embedded_batches(
+            embeddings,
+            documents,
+            batch_size=batch_size,
+            workers=workers,
+            max_retries=settings.ingestion_max_retries,
+            backoff_seconds=settings.ingestion_backoff_seconds,
+        )
+
+    if manifest is None or manifest.get("embedding_model") != embedding_model_id(embeddings):
+        checkpoint_dir = vector_dir / CHECKPOINT_DIR
+        fingerprint = _csv_fingerprint(csv_file)
+        vector_store, state = _load_checkpoint(checkpoint_dir, fingerprint, embeddings)
+        if vector_store is None:
+            # Checkpoint ausente ou de outra execução: recomeça com segmentos vazios
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+            state["fingerprint"] = fingerprint
+            state["embedding_model"] = embedding_model_id(embeddings)
+        resumed_rows = rows_done = state["rows_done"]
+        pending: List[Tuple[List[KnowledgeDocument], List[List[float]]]] = []
+
+        for batch, vectors in _embedded(itertools.islice(_documents(), resumed_rows, None)):
+            vector_store = _add_batch(vector_store, embeddings, batch, vectors)
+            rows_done += len(batch)
+            if progress is not None:
+                progress(rows_done)
+            pending.append((batch, vectors))
+            if len(pending) >= checkpoint_every:
+                _save_checkpoint(checkpoint_dir, state, pending)
+        if vector_store is None:
+            raise ValueError(f"CSV {csv_file} não tem linhas para ingerir.")
+        # Os ids já estão no docstore do índice: não precisa de uma segunda lista em memória
+        generation = publish_vector_store(
+            vector_store,
+            vector_dir,
+            _build_manifest(embeddings, vector_store.index_to_docstore_id.values()),
+            embeddings,
+        )
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        return vector_store, IngestionStats(
+            added=rows_done - resumed_rows,
+            removed=0,
+            unchanged=0,
+            generation=generation,
+            full_rebuild=True,
+            merged=plan.merged,
+        )
+
+    indexed_ids = set(manifest.get("ids", []))
+    from langchain_community.vectorstores import FAISS
+
+    vector_store = FAISS.load_local(
+        str(store_dir(vector_dir)), embeddings, allow_dangerous_deserialization=True
+    )
+
+    # Ids indexados que ainda não apareceram no CSV; o que sobrar no fim foi removido
+    stale = set(indexed_ids)
+    total_rows = 0
+
+    def _new_rows() -> Iterator[KnowledgeDocument]:
+        nonlocal total_rows
+        for doc in _documents():
+            total_rows += 1
+            stale.discard(doc.id)
+            if doc.id not in indexed_ids:
+                yield doc
+
+    added = 0
+    for batch, vectors in _embedded(_new_rows()):
+        _add_batch(vector_store, embeddings, batch, vectors)
+        added += len(batch)
+        if progress is not None:
+            progress(added)
+    removed = sorted(stale)
+    if removed:
+        vector_store.delete(removed)
+    generation = read_generation(vector_dir)
+    if removed or added:
+        generation = publish_vector_store(
+            vector_store,
+            vector_dir,
+            _build_manifest(embeddings, vector_store.index_to_docstore_id.values()),
+            embeddings,
+        )
+    return vector_store, IngestionStats(
+        added=added,
+        removed=len(removed),
+        unchanged=total_rows - added,
+        generation=generation,
+        full_rebuild=False,
+        merged=plan.merged,
+    )
+
+
+def ingest_csv_to_vector_store(
+    csv_path: Path | None = None, persist_dir: Path | None = None, incremental: bool = False
+) -> FAISS:
+    vector_store, _ = run_ingestion(csv_path, persist_dir, incremental=incremental)
     return vector_store
 
 
 if __name__ == "__main__":
-    ingest_csv_to_vector_store()
-    print("Ingestão concluída com sucesso.")
+    parser = argparse.ArgumentParser(description="Ingestão do CSV no vector store FAISS.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="embeda apenas linhas novas/editadas e remove as apagadas do índice",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        default=None,
+        help="agrupa quase-duplicatas antes de embedar (padrão: AGENT_INGESTION_DEDUP)",
+    )
+    parser.add_argument("--csv", type=Path, help="CSV da base (padrão: AGENT_CSV_PATH)")
+    parser.add_argument(
+        "--kb",
+        help="id de uma base registrada em AGENT_KNOWLEDGE_BASES; grava no diretório dela",
+    )
+    args = parser.parse_args()
+    persist_dir = None
+    if args.kb is not None:
+        knowledge_bases = get_settings().knowledge_bases
+        if args.kb not in knowledge_bases:
+            parser.error(f"base de conhecimento desconhecida: {args.kb}")
+        persist_dir = knowledge_bases[args.kb]
+    _, stats = run_ingestion(
+        csv_path=args.csv,
+        persist_dir=persist_dir,
+        incremental=args.incremental,
+        dedup=args.dedup,
+        progress=lambda rows: print(f"\r{rows} linhas embedadas", end="", file=sys.stderr),
+    )
+    print(file=sys.stderr)
+    print(
+        f"Ingestão concluída com sucesso (geração {stats.generation}: "
+        f"{stats.added} adicionados, {stats.removed} removidos, {stats.unchanged} inalterados, "
+        f"{stats.merged} quase-duplicatas agrupadas)."
+    )
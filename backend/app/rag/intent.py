@@ -0,0 +1,226 @@
+"""Roteamento local de intenção, executado antes de qualquer chamada de embedding ou LLM.
+
+Saudações, agradecimentos e perguntas claramente fora do escopo terminariam em resposta padrão de
+qualquer forma; decidir isso localmente (em microssegundos) evita o round-trip ao provedor.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from backend.app.core.config import Settings
+from backend.app.rag.lexical import fold_accents
+
+OPERACIONAL = "OPERACIONAL"
+FORA_DO_ESCOPO = "FORA_DO_ESCOPO"
+SMALL_TALK = "SMALL_TALK"
+
+# Frases curtas que, sozinhas, formam a mensagem inteira ("oi", "obrigado!", "bom dia, tudo bem?")
+SMALL_TALK_KEYWORDS = [
+    "oi",
+    "ola",
+    "opa",
+    "eai",
+    "e ai",
+    "bom dia",
+    "boa tarde",
+    "boa noite",
+    "tudo bem",
+    "tudo bom",
+    "como vai",
+    "obrigado",
+    "obrigada",
+    "muito obrigado",
+    "muito obrigada",
+    "valeu",
+    "vlw",
+    "brigado",
+    "ok",
+    "beleza",
+    "blz",
+    "tchau",
+    "ate mais",
+    "ate logo",
+]
+
+# Termos que, em qualquer posição da pergunta, indicam assunto fora do escopo do agente
+OUT_OF_SCOPE_KEYWORDS = [
+    "previsao do tempo",
+    "clima",
+    "tempo amanha",
+    "meteorologia",
+    "horoscopo",
+    "resultado do jogo",
+    "cotacao do dolar",
+    "receita de bolo",
+]
+
+# Exemplos rotulados para o classificador de n-gramas; poucos e curtos, cobrindo o jeito de falar
+# dos atendentes
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    OPERACIONAL: [
+        "cliente quer reembolso do pedido",
+        "pedido saiu para entrega e cliente pediu cancelamento",
+        "cliente foi cobrado apos cancelamento",
+        "cobranca duplicada no cartao",
+        "estorno nao caiu na fatura",
+        "restaurante cancelou por falta de ingrediente",
+        "entregador nao entregou o pedido",
+        "pedido chegou errado ou incompleto",
+        "cliente quer cancelar o pedido",
+        "reembolso e automatico",
+        "tentativa de fraude com multiplos reembolsos",
+        "cupom nao foi aplicado na compra",
+    ],
+    SMALL_TALK: [
+        "oi tudo bem",
+        "ola bom dia",
+        "boa tarde",
+        "obrigado pela ajuda",
+        "valeu demais",
+        "tchau ate mais",
+        "como voce esta",
+        "quem e voce",
+    ],
+    FORA_DO_ESCOPO: [
+        "como esta a previsao do tempo amanha",
+        "vai chover hoje",
+        "qual a cotacao do dolar",
+        "quem ganhou o jogo ontem",
+        "me conta uma piada",
+        "me passa uma receita de bolo",
+        "qual a capital da franca",
+        "escreva um poema",
+    ],
+}
+
+
+class KeywordMatcher:
+    """Várias listas de termos compiladas num único regex com grupos nomeados por rótulo.
+
+    Os termos são comparados sem acentos e em fronteira de palavra; com ``whole_message`` a
+    mensagem inteira precisa ser composta só por termos da lista (útil para saudações, que não
+    devem capturar "obrigado, mas o cliente quer reembolso").
+    """
+
+    def __init__(self, keywords: Mapping[str, Iterable[str]], whole_message: bool = False):
+        self.labels: List[str] = []
+        groups: List[str] = []
+        for idx, (label, terms) in enumerate(keywords.items()):
+            alternatives = sorted({_normalize(term) for term in terms if term.strip()}, key=len)
+            if not alternatives:
+                continue
+            body = "|".join(re.escape(term) for term in reversed(alternatives))
+            if whole_message:
+                body = rf"(?:{body})(?:\W+(?:{body}))*"
+            self.labels.append(label)
+            groups.append(rf"(?P<g{idx}>{body})")
+        self._groups = {f"g{idx}": label for idx, label in enumerate(keywords)}
+        if not groups:
+            self._pattern = None
+        elif whole_message:
+            self._pattern = re.compile(rf"^\W*(?:{'|'.join(groups)})\W*$")
+        else:
+            self._pattern = re.compile(rf"\b(?:{'|'.join(groups)})\b")
+
+    def match(self, text: str) -> str | None:
+        if self._pattern is None:
+            return None
+        found = self._pattern.search(_normalize(text))
+        if found is None:
+            return None
+        return self._groups[found.lastgroup] if found.lastgroup else None
+
+
+class CentroidClassifier:
+    """Classificador por centróides de n-gramas de caracteres (cosseno sobre vetores esparsos).
+
+    Cada rótulo vira um centróide normalizado na construção; classificar é somar os pesos dos
+    n-gramas da pergunta em cada centróide, sem dependências nem modelo externo.
+    """
+
+    def __init__(self, examples: Mapping[str, Sequence[str]], n: int = 3):
+        self.n = n
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        for label, texts in examples.items():
+            centroid: Dict[str, float] = {}
+            for text in texts:
+                for gram, weight in self._vector(text).items():
+                    centroid[gram] = centroid.get(gram, 0.0) + weight
+            norm = math.sqrt(sum(value * value for value in centroid.values())) or 1.0
+            self.centroids[label] = {gram: value / norm for gram, value in centroid.items()}
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        padded = f" {_normalize(text)} "
+        counts: Dict[str, float] = {}
+        for start in range(max(len(padded) - self.n + 1, 0)):
+            gram = padded[start : start + self.n]
+            counts[gram] = counts.get(gram, 0.0) + 1.0
+        norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+        return {gram: value / norm for gram, value in counts.items()}
+
+    def scores(self, text: str) -> Dict[str, float]:
+        vector = self._vector(text)
+        return {
+            label: sum(weight * centroid.get(gram, 0.0) for gram, weight in vector.items())
+            for label, centroid in self.centroids.items()
+        }
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        scores = self.scores(text)
+        label = max(scores, key=lambda name: scores[name])
+        return label, scores[label]
+
+
+class IntentRouter:
+    """Decide ``OPERACIONAL``, ``SMALL_TALK`` ou ``FORA_DO_ESCOPO`` para uma pergunta.
+
+    Ordem: saudações que ocupam a mensagem inteira, termos de fora do escopo e, por último, o
+    classificador. Na dúvida a pergunta segue para o RAG: o classificador só desvia quando o rótulo
+    vencedor passa de ``min_confidence`` e supera o operacional por ``margin``.
+    """
+
+    def __init__(
+        self,
+        small_talk_keywords: Iterable[str] = SMALL_TALK_KEYWORDS,
+        out_of_scope_keywords: Iterable[str] = OUT_OF_SCOPE_KEYWORDS,
+        examples: Mapping[str, Sequence[str]] = INTENT_EXAMPLES,
+        min_confidence: float = 0.35,
+        margin: float = 0.1,
+    ):
+        self.small_talk = KeywordMatcher({SMALL_TALK: small_talk_keywords}, whole_message=True)
+        self.out_of_scope = KeywordMatcher({FORA_DO_ESCOPO: out_of_scope_keywords})
+        self.classifier = CentroidClassifier(examples) if examples else None
+        self.min_confidence = min_confidence
+        self.margin = margin
+
+    def route(self, question: str) -> str:
+        intent = self.small_talk.match(question) or self.out_of_scope.match(question)
+        if intent is not None:
+            return intent
+        if self.classifier is None:
+            return OPERACIONAL
+        scores = self.classifier.scores(question)
+        label = max(scores, key=lambda name: scores[name])
+        if (
+            label != OPERACIONAL
+            and scores[label] >= self.min_confidence
+            and scores[label] - scores.get(OPERACIONAL, 0.0) >= self.margin
+        ):
+            return label
+        return OPERACIONAL
+
+
+def build_intent_router(settings: Settings) -> IntentRouter:
+    return IntentRouter(
+        small_talk_keywords=settings.intent_small_talk_keywords or SMALL_TALK_KEYWORDS,
+        out_of_scope_keywords=settings.intent_out_of_scope_keywords or OUT_OF_SCOPE_KEYWORDS,
+        min_confidence=settings.intent_min_confidence,
+        margin=settings.intent_margin,
+    )
+
+
+def _normalize(text: str) -> str:
+    return " ".join(fold_accents(text).split())
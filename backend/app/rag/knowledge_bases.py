@@ -0,0 +1,170 @@
+"""Várias bases de conhecimento no mesmo processo, num pool de índices com orçamento de memória.
+
+Cada base registrada em ``knowledge_bases`` (id -> diretório do vector store) ganha um
+``AgentService`` próprio — índice, cache de respostas e IDF do embedder local são por base — criado
+na primeira consulta. Quando a soma estimada das bases carregadas passa do orçamento, as usadas
+há mais tempo saem do pool; requisições em andamento continuam com a referência que já têm.
+Cliente LLM, cache de embeddings de consulta e sessões de conversa são compartilhados entre as
+bases.
+
+A estimativa de cada base soma o índice e o cache de respostas dela; é refeita a cada
+``reload_stale``, pois o cache cresce com o uso. Cache de embeddings e sessões ficam de fora: são
+um só para o processo, limitados por ``embedding_cache_size`` e ``session_max``, e não são
+liberados quando uma base sai.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.core.metrics import record_index_pool_event
+from backend.app.rag.agent import AgentService
+from backend.app.rag.cache import EmbeddingCache
+from backend.app.rag.llm_client import LLMClient
+from backend.app.rag.retriever import RetrievalError, VectorStoreRetriever
+from backend.app.rag.sessions import shared_session_store
+
+
+class UnknownKnowledgeBaseError(KeyError):
+    def __init__(self, kb_id: str):
+        super().__init__(kb_id)
+        self.kb_id = kb_id
+
+    def __str__(self) -> str:
+        return f"Base de conhecimento desconhecida: {self.kb_id}."
+
+
+def agent_memory_bytes(agent: AgentService) -> int:
+    vector_store = getattr(agent.retriever, "vector_store", None)
+    return sum(
+        int(getattr(component, "memory_bytes", 0))
+        for component in (vector_store, getattr(agent, "response_cache", None))
+    )
+
+
+class IndexPool:
+    def __init__(
+        self,
+        paths: Dict[str, Path],
+        memory_budget_bytes: int,
+        factory: Callable[[str, Path], AgentService] | None = None,
+    ):
+        self.paths = dict(paths)
+        self.memory_budget_bytes = memory_budget_bytes
+        self._factory = factory or self._build_agent
+        self._entries: OrderedDict[str, Tuple[AgentService, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Um lock de carga por base: a mesma base carrega uma vez, bases diferentes em paralelo
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._llm_client: LLMClient | None = None
+        self._embedding_cache: EmbeddingCache | None = None
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings | None = None) -> "IndexPool":
+        settings = settings or get_settings()
+        return cls(settings.knowledge_bases, int(settings.index_pool_memory_mb * 1024 * 1024))
+
+    def _build_agent(self, kb_id: str, path: Path) -> AgentService:
+        settings = get_settings()
+        with self._lock:
+            if self._llm_client is None:
+                self._llm_client = LLMClient()
+                self._embedding_cache = EmbeddingCache(
+                    max_size=settings.embedding_cache_size,
+                    persist_path=settings.embedding_cache_path,
+                )
+        retriever = VectorStoreRetriever(
+            vector_store_path=path, embedding_cache=self._embedding_cache
+        )
+        return AgentService(
+            retriever=retriever, llm_client=self._llm_client, sessions=shared_session_store()
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def loaded(self) -> List[str]:
+        """Bases em memória, da usada há mais tempo para a mais recente."""
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, kb_id: str) -> AgentService:
+        """Agente da base, carregando o índice sob demanda (``RetrievalError`` se não ingerida)."""
+        if kb_id not in self.paths:
+            raise UnknownKnowledgeBaseError(kb_id)
+        agent = self._touch(kb_id)
+        if agent is not None:
+            return agent
+        with self._lock:
+            load_lock = self._load_locks.setdefault(kb_id, threading.Lock())
+        with load_lock:
+            agent = self._touch(kb_id)
+            if agent is not None:
+                return agent
+            agent = self._factory(kb_id, self.paths[kb_id])
+            size = agent_memory_bytes(agent)
+            with self._lock:
+                self._entries[kb_id] = (agent, size)
+                self.loads += 1
+                self._evict(keep=kb_id)
+            record_index_pool_event(kb_id, "load")
+            return agent
+
+    def _touch(self, kb_id: str) -> AgentService | None:
+        with self._lock:
+            entry = self._entries.get(kb_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(kb_id)
+            return entry[0]
+
+    def _evict(self, keep: str) -> None:
+        # Chamado com o lock; a base recém-usada fica mesmo se sozinha passar do orçamento
+        total = sum(size for _, size in self._entries.values())
+        for kb_id in list(self._entries):
+            if total <= self.memory_budget_bytes:
+                break
+            if kb_id == keep:
+                continue
+            _, size = self._entries.pop(kb_id)
+            total -= size
+            self.evictions += 1
+            record_index_pool_event(kb_id, "evict")
+
+    def preload(self, kb_ids: Iterable[str]) -> List[str]:
+        """Carrega as bases indicadas (ex.: as mais acessadas) no startup; ignora as que ainda
+        não foram ingeridas ou não estão registradas. Devolve as que ficaram carregadas."""
+        loaded: List[str] = []
+        for kb_id in kb_ids:
+            try:
+                self.get(kb_id)
+            except (UnknownKnowledgeBaseError, RetrievalError):
+                continue
+            loaded.append(kb_id)
+        return loaded
+
+    def reload_stale(self) -> None:
+        """Hot-swap das bases carregadas que ganharam geração nova; reavalia o orçamento.
+
+        Uma base cuja recarga falha segue com o índice atual e não impede a recarga das outras.
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        for kb_id, (agent, _) in entries:
+            try:
+                agent.retriever.reload_if_stale()
+            except RetrievalError:
+                pass
+            size = agent_memory_bytes(agent)
+            with self._lock:
+                if kb_id in self._entries:
+                    self._entries[kb_id] = (agent, size)
+                    self._evict(keep=kb_id)
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+LEXICAL_TERMS = "lexical.json"
+LEXICAL_POSTINGS = "lexical.npz"
+LEXICAL_FILES = (LEXICAL_TERMS, LEXICAL_POSTINGS)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Palavras muito frequentes em português que não ajudam a distinguir cenários
+STOPWORDS = frozenset("""
+    para por pelo pela pelos pelas com sem que uma umas uns dos das nos nas aos como mais mas
+    isso esse essa este esta isto ele ela eles elas seu sua seus suas ser foi sao ter tem quer
+    quando onde qual quais muito pode deve apos ate entre sobre tambem
+    """.split())
+
+
+def fold_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenização para português: minúsculas, sem acentos ("cobrança" == "cobranca"),
+    descartando termos com até 2 caracteres e stopwords."""
+    return [
+        token
+        for token in _TOKEN_RE.findall(fold_accents(text))
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+
+
+def lexical_text(pergunta: str, resposta: str, categoria: str, fonte: str) -> str:
+    return " ".join([pergunta, resposta, categoria, fonte])
+
+
+class LexicalIndex:
+    """Índice invertido BM25 construído na ingestão.
+
+    As listas de postings ficam concatenadas em arrays NumPy (linhas em ordem crescente, com a
+    frequência do termo), então a consulta só tokeniza a pergunta e soma contribuições vetorizadas;
+    os documentos nunca são re-tokenizados por requisição.
+    """
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.term_ids: Dict[str, int] = {term: idx for idx, term in enumerate(terms)}
+        self.terms = list(terms)
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        """Estimativa da memória do índice (arrays + vocabulário, ~100 bytes por termo)."""
+        arrays = (self.offsets, self.rows, self.tfs, self.doc_lengths)
+        return sum(int(array.nbytes) for array in arrays) + 100 * len(self.terms)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths: List[int] = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((row, count))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for idx, term in enumerate(terms):
+            offsets[idx + 1] = offsets[idx] + len(postings[term])
+        rows = np.fromiter(
+            (row for term in terms for row, _ in postings[term]), dtype=np.int32, count=offsets[-1]
+        )
+        tfs = np.fromiter(
+            (tf for term in terms for _, tf in postings[term]), dtype=np.uint16, count=offsets[-1]
+        )
+        return cls(terms, offsets, rows, tfs, np.asarray(lengths, dtype=np.uint32))
+
+    @property
+    def size(self) -> int:
+        return int(len(self.doc_lengths))
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray] | None:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return None
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.rows[start:end], self.tfs[start:end]
+
+    def search(
+        self, query: str, k: int, subset: np.ndarray | None = None
+    ) -> List[Tuple[int, float]]:
+        """Top-k linhas por BM25 (apenas linhas com ao menos um termo da consulta e, com
+        ``subset``, apenas essas linhas)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            rows, tfs = postings
+            matched = True
+            idf = math.log(1.0 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (
+                1.0 - self.b + self.b * self.doc_lengths[rows] / max(self.avg_length, 1e-9)
+            )
+            scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+        if not matched:
+            return []
+        if subset is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[subset] = True
+            scores[~allowed] = 0.0
+        candidates = np.flatnonzero(scores)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def overlapping_rows(self, query: str, rows: Iterable[int]) -> set[int]:
+        """Quais das ``rows`` contêm algum termo da consulta (busca binária nas postings)."""
+        targets = np.asarray(sorted(set(rows)), dtype=np.int32)
+        found: set[int] = set()
+        if not len(targets):
+            return found
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            term_rows = postings[0]
+            positions = np.searchsorted(term_rows, targets)
+            present = positions < len(term_rows)
+            present[present] = term_rows[positions[present]] == targets[present]
+            found.update(int(row) for row in targets[present])
+        return found
+
+    def save(self, target_dir: Path) -> None:
+        (target_dir / LEXICAL_TERMS).write_text(
+            json.dumps({"terms": self.terms, "k1": self.k1, "b": self.b}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        with (target_dir / LEXICAL_POSTINGS).open("wb") as f:
+            np.savez(
+                f,
+                offsets=self.offsets,
+                rows=self.rows,
+                tfs=self.tfs,
+                doc_lengths=self.doc_lengths,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        header = json.loads((path / LEXICAL_TERMS).read_text(encoding="utf-8"))
+        with np.load(path / LEXICAL_POSTINGS, allow_pickle=False) as arrays:
+            return cls(
+                header["terms"],
+                arrays["offsets"],
+                arrays["rows"],
+                arrays["tfs"],
+                arrays["doc_lengths"],
+                k1=header.get("k1", 1.5),
+                b=header.get("b", 0.75),
+            )
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = 60) -> List[int]:
+    """Combina rankings pela soma de ``1 / (k + posição)``; robusto a escalas diferentes."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for position, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + position)
+    return sorted(scores, key=lambda row: scores[row], reverse=True)
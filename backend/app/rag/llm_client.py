@@ -1,12 +1,22 @@
 from __future__ import annotations
 
-from typing import Iterable, List
+from typing import Any, AsyncIterator, Iterable, List, Protocol
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 
 from backend.app.core.config import get_settings
+from backend.app.core.metrics import record_context, record_token_usage, stage
 from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.cache import normalize_query
+from backend.app.rag.coalesce import SingleFlight
+from backend.app.rag.context import ContextPacker, PackedContext
+from backend.app.rag.upstream import (
+    AdaptiveRateLimiter,
+    alimited,
+    get_limiter,
+    limited,
+    shared_chat_model,
+)
 
 SYSTEM_PROMPT = (
     "Você é um agente interno do iFood que auxilia colaboradores (Foodlovers) em dúvidas "
@@ -27,6 +37,30 @@ FALLBACK_MESSAGE = (
     "ou consultar a política oficial."
 )
 
+SMALL_TALK_MESSAGE = (
+    "Olá! Posso ajudar com dúvidas sobre reembolsos, cancelamentos e cobranças de pedidos. "
+    "Descreva o caso do cliente."
+)
+
+
+class AnswerGenerator(Protocol):
+    """Gerador aceito pelo AgentService: LLMClient ou qualquer objeto com ``generate``.
+
+    ``agenerate`` e ``astream`` são opcionais; sem eles o agente roda ``generate`` numa thread.
+    """
+
+    def generate(self, question: str, sources: Iterable[RetrievedSource]) -> str: ...
+
+
+class ChatModel(Protocol):
+    """O que o LLMClient usa do modelo de chat (``ChatOpenAI`` ou dublês de teste)."""
+
+    def invoke(self, messages: List[BaseMessage], /) -> Any: ...
+
+    async def ainvoke(self, messages: List[BaseMessage], /) -> Any: ...
+
+    def astream(self, messages: List[BaseMessage], /) -> AsyncIterator[Any]: ...
+
 
 class OfflineLLM:
     """LLM simplificado para uso offline.
@@ -39,32 +73,63 @@ class OfflineLLM:
         # Em modo offline a formatação é tratada diretamente no LLMClient.generate
         return AIMessage(content="offline-response")
 
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+    async def astream(self, messages):
+        yield self.invoke(messages)
+
 
 class LLMClient:
-    def __init__(self, llm: ChatOpenAI | None = None):
+    def __init__(
+        self,
+        llm: ChatModel | None = None,
+        packer: ContextPacker | None = None,
+        limiter: AdaptiveRateLimiter | None = None,
+    ):
         settings = get_settings()
-        if settings.openai_api_key:
-            self.llm = llm or ChatOpenAI(model=settings.llm_model, api_key=settings.openai_api_key)
+        self.packer = packer or ContextPacker.from_settings(settings)
+        self.flights = SingleFlight("generation") if settings.coalesce_upstream_calls else None
+        # Um LLM injetado só passa pelo limiter se ele também for informado
+        self.limiter = limiter
+        self.llm: ChatModel
+        if llm is not None:
+            self.llm = llm
+            self.offline_mode = False
+        elif settings.openai_api_key:
+            self.llm = shared_chat_model(
+                settings.llm_model, settings.openai_api_key, settings.openai_base_url
+            )
+            self.limiter = limiter or get_limiter(settings.llm_model)
             self.offline_mode = False
         else:
             # Modo offline: não chama provedor externo
             self.llm = OfflineLLM()
             self.offline_mode = True
 
+    def pack_context(self, sources: Iterable[RetrievedSource]) -> PackedContext:
+        """Fontes na ordem do retriever, sem redundâncias e dentro do orçamento de tokens."""
+        with stage("pack_context"):
+            packed = self.packer.pack(sources)
+        record_context(
+            packed.tokens,
+            len(packed.sources),
+            packed.truncated,
+            packed.duplicates,
+            len(packed.dropped),
+        )
+        return packed
+
     def render_context(self, sources: Iterable[RetrievedSource]) -> str:
-        blocks: List[str] = []
-        for src in sources:
-            blocks.append(
-                f"[FONTE: {src.fonte}] [CATEGORIA: {src.categoria}]\nCENÁRIO: {src.pergunta}\nAÇÃO RECOMENDADA: {src.resposta}"
-            )
-        return "\n\n".join(blocks)
+        return self.pack_context(sources).text
 
-    def generate(self, question: str, sources: Iterable[RetrievedSource]) -> str:
-        if self.offline_mode:
-            return self._generate_offline_response(question, list(sources))
+    def build_messages(
+        self, question: str, sources: Iterable[RetrievedSource]
+    ) -> List[BaseMessage]:
+        return self._messages(question, self.render_context(sources))
 
-        context_block = self.render_context(sources)
-        messages = [
+    def _messages(self, question: str, context_block: str) -> List[BaseMessage]:
+        return [
             SystemMessage(content=SYSTEM_PROMPT),
             HumanMessage(
                 content=(
@@ -75,17 +140,63 @@ class LLMClient:
                 )
             ),
         ]
-        response = self.llm.invoke(messages)
-        if isinstance(response, AIMessage):
-            return response.content
-        return str(response)
+
+    def generate(self, question: str, sources: Iterable[RetrievedSource]) -> str:
+        if self.offline_mode:
+            return self._generate_offline_response(question, list(sources))
+        context_block = self.render_context(sources)
+        messages = self._messages(question, context_block)
+        if self.flights is None:
+            return self._invoke(messages)
+        # Mesma pergunta (normalizada) com o mesmo contexto: uma só chamada ao LLM em voo
+        return self.flights.do(
+            (normalize_query(question), context_block), lambda: self._invoke(messages)
+        )
+
+    async def agenerate(self, question: str, sources: Iterable[RetrievedSource]) -> str:
+        if self.offline_mode:
+            return self._generate_offline_response(question, list(sources))
+        context_block = self.render_context(sources)
+        messages = self._messages(question, context_block)
+        if self.flights is None:
+            return await self._ainvoke(messages)
+        return await self.flights.ado(
+            (normalize_query(question), context_block), lambda: self._ainvoke(messages)
+        )
+
+    async def astream(
+        self, question: str, sources: Iterable[RetrievedSource]
+    ) -> AsyncIterator[str]:
+        """Emite a resposta em pedaços conforme o modelo produz os tokens."""
+        if self.offline_mode:
+            # Offline a resposta já está pronta; emite linha a linha para manter o mesmo protocolo
+            text = self._generate_offline_response(question, list(sources))
+            for line in text.splitlines(keepends=True):
+                yield line
+            return
+        messages = self.build_messages(question, sources)
+        # A vaga no limiter fica ocupada enquanto o stream estiver aberto
+        async with alimited(self.limiter):
+            async for chunk in self.llm.astream(messages):
+                # Só o último pedaço traz usage_metadata (quando o provedor informa uso no stream)
+                record_token_usage(getattr(chunk, "usage_metadata", None))
+                if chunk.content:
+                    yield str(chunk.content)
+
+    def _invoke(self, messages: List[BaseMessage]) -> str:
+        with limited(self.limiter):
+            return _message_text(self.llm.invoke(messages))
+
+    async def _ainvoke(self, messages: List[BaseMessage]) -> str:
+        async with alimited(self.limiter):
+            return _message_text(await self.llm.ainvoke(messages))
 
     def _generate_offline_response(
         self, question: str, sources: List[RetrievedSource], max_sources: int = 3
     ) -> str:
         if not sources:
             return FALLBACK_MESSAGE
-        top_sources = sources[:max_sources]
+        top_sources = self.pack_context(sources).sources[:max_sources]
         bullets: List[str] = []
         for src in top_sources:
             bullets.append(
@@ -97,3 +208,11 @@ class LLMClient:
             + "\n".join(bullets)
             + "\n\nSe o contexto não cobrir totalmente, acione o fallback seguro."
         )
+
+
+def _message_text(response) -> str:
+    record_token_usage(getattr(response, "usage_metadata", None))
+    if isinstance(response, AIMessage):
+        # Conteúdo pode vir em blocos (lista) em alguns provedores
+        return response.content if isinstance(response.content, str) else str(response.content)
+    return str(response)
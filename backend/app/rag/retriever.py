@@ -1,41 +1,504 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Sequence, Tuple
 
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
 
 from backend.app.core.config import get_settings
-from backend.app.rag.ingestion import build_embeddings
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.cache import (
+    EmbeddingCache,
+    embedding_model_id,
+    is_fake_embeddings,
+    normalize_query,
+)
+from backend.app.rag.coalesce import SingleFlight
+from backend.app.rag.ingestion import INDEX_FILES, build_embeddings
+from backend.app.rag.lexical import reciprocal_rank_fusion
+from backend.app.rag.upstream import AdaptiveRateLimiter, alimited, get_limiter, limited
+from backend.app.rag.vector_store import (
+    NATIVE_HEADER,
+    FaissVectorStore,
+    NativeVectorStore,
+    SearchableStore,
+    read_generation,
+    store_dir,
+)
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import Embeddings
 
 
 class RetrievalError(RuntimeError):
     pass
 
 
+@dataclass(frozen=True)
+class RankedRows:
+    """Linhas ranqueadas de uma consulta e o vector store a que pertencem.
+
+    Guardar o store evita materializar linhas de uma geração com documentos de outra quando o
+    índice é recarregado entre a busca e a montagem da resposta.
+    """
+
+    store: SearchableStore
+    rows: List[Tuple[int, float]]
+
+    def sources(self) -> List[RetrievedSource]:
+        try:
+            return [self.store.source(row, score) for row, score in self.rows]
+        except (KeyError, IndexError) as exc:
+            raise RetrievalError(str(exc)) from exc
+
+    def documents(self) -> List[Tuple[Document, float]]:
+        try:
+            return [(self.store.document(row), score) for row, score in self.rows]
+        except (KeyError, IndexError) as exc:
+            raise RetrievalError(str(exc)) from exc
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Geração em uso: índice e o embedder com que ela foi indexada.
+
+    Trocada inteira, numa única atribuição, quando uma geração nova é carregada: quem lê o
+    snapshot uma vez nunca combina o embedder (ex.: IDF) de uma geração com o índice de outra.
+    """
+
+    generation: int
+    vector_store: SearchableStore
+    embeddings: Embeddings
+    embedding_model: str
+    zero_scores: bool
+
+    @classmethod
+    def build(
+        cls, generation: int, vector_store: SearchableStore, embeddings: Embeddings
+    ) -> IndexSnapshot:
+        # Com embeddings aleatórios (FakeEmbeddings) os scores não representam similaridade real;
+        # decidido uma vez por snapshot, não a cada busca
+        return cls(
+            generation,
+            vector_store,
+            embeddings,
+            embedding_model_id(embeddings),
+            is_fake_embeddings(embeddings),
+        )
+
+
 class VectorStoreRetriever:
-    def __init__(self, vector_store: FAISS | None = None, embeddings: Embeddings | None = None):
+    def __init__(
+        self,
+        vector_store: FAISS | None = None,
+        embeddings: Embeddings | None = None,
+        vector_store_path: Path | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        limiter: AdaptiveRateLimiter | None = None,
+    ):
         self.settings = get_settings()
-        self.embeddings = embeddings or build_embeddings(self.settings)
-        self.vector_store = vector_store or self._load_vector_store(self.settings.vector_store_path)
+        self.vector_store_path = vector_store_path or self.settings.vector_store_path
+        # Embedder criado aqui acompanha as gerações (ex.: novo IDF do hashed); injetado, não
+        self._owns_embeddings = embeddings is None
+        # Embeddings do provedor criados aqui passam pelo limiter do modelo; injetados, só se
+        # o limiter também for informado
+        provider = bool(self.settings.openai_api_key) and not self.settings.use_fake_embeddings
+        if limiter is None and embeddings is None and provider:
+            limiter = get_limiter(self.settings.embedding_model)
+        self.limiter = limiter
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            max_size=self.settings.embedding_cache_size,
+            persist_path=self.settings.embedding_cache_path,
+        )
+        self.embedding_flights = (
+            SingleFlight("embedding") if self.settings.coalesce_upstream_calls else None
+        )
+        # Só recarrega automaticamente quando o índice foi carregado do disco por esta instância
+        self._managed = vector_store is None
+        self._reload_lock = threading.Lock()
+        embeddings = embeddings or build_embeddings(self.settings, self.vector_store_path)
+        if vector_store is None:
+            generation, store = self._load_generation(self.vector_store_path, embeddings)
+            embeddings = self._embeddings_for(generation, embeddings)
+            self._snapshot = IndexSnapshot.build(generation, store, embeddings)
+        else:
+            self._snapshot = IndexSnapshot.build(
+                read_generation(self.vector_store_path), FaissVectorStore(vector_store), embeddings
+            )
+
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+
+    @property
+    def vector_store(self) -> SearchableStore:
+        return self._snapshot.vector_store
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._snapshot.embeddings
+
+    @embeddings.setter
+    def embeddings(self, embeddings: Embeddings) -> None:
+        snapshot = self._snapshot
+        self._snapshot = IndexSnapshot.build(snapshot.generation, snapshot.vector_store, embeddings)
 
-    def _load_vector_store(self, path: Path) -> FAISS:
-        if not path.exists():
+    @property
+    def embedding_model(self) -> str:
+        return self._snapshot.embedding_model
+
+    def _load_vector_store(
+        self, path: Path, generation: int, embeddings: Embeddings
+    ) -> SearchableStore:
+        directory = store_dir(path, generation)
+        # Sem geração publicada e sem arquivos do layout antigo: a base ainda não foi ingerida (ou
+        # a primeira publicação está em staging, invisível até a troca do ponteiro)
+        if generation == 0 and not any(
+            (directory / name).exists() for name in (INDEX_FILES[0], NATIVE_HEADER)
+        ):
             raise RetrievalError(
                 f"Vector store não encontrado em {path}. Rode a ingestão antes de fazer queries."
             )
-        return FAISS.load_local(str(path), self.embeddings, allow_dangerous_deserialization=True)
+        if self.settings.vector_store_format == "native" and (directory / NATIVE_HEADER).exists():
+            # Formato nativo: sem unpickle e com vetores mapeados em memória (carga quase imediata)
+            return NativeVectorStore.load(path, self.settings, generation)
+        from langchain_community.vectorstores import FAISS
+
+        return FaissVectorStore(
+            FAISS.load_local(str(directory), embeddings, allow_dangerous_deserialization=True)
+        )
+
+    def _load_generation(
+        self, path: Path, embeddings: Embeddings, attempts: int = 3
+    ) -> Tuple[int, SearchableStore]:
+        # Cada geração fica num diretório imutável; a releitura do ponteiro cobre a geração que
+        # foi podada (ou trocada, no layout antigo) enquanto era carregada
+        error: Exception | None = None
+        for _ in range(attempts):
+            generation = read_generation(path)
+            try:
+                vector_store = self._load_vector_store(path, generation, embeddings)
+            except RetrievalError:
+                raise
+            except (OSError, RuntimeError, ValueError) as exc:
+                error = exc
+                continue
+            if read_generation(path) == generation:
+                return generation, vector_store
+        raise RetrievalError(
+            f"Vector store em {path} mudou ou está inconsistente durante o carregamento."
+        ) from error
+
+    def reload_if_stale(self) -> bool:
+        """Troca o índice em memória quando a ingestão publicou uma nova geração.
+
+        A carga acontece fora do caminho das requisições; buscas em andamento continuam usando a
+        snapshot antigo até a troca, que é uma única atribuição de atributo.
+        """
+        if not self._managed or read_generation(self.vector_store_path) == self.generation:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            current = self._snapshot
+            generation, vector_store = self._load_generation(
+                self.vector_store_path, current.embeddings
+            )
+            if generation == current.generation:
+                return False
+            embeddings = self._embeddings_for(generation, current.embeddings)
+            # Índice, embedder e geração trocam juntos, numa única atribuição
+            self._snapshot = IndexSnapshot.build(generation, vector_store, embeddings)
+            return True
+        finally:
+            self._reload_lock.release()
 
-    def search(self, query: str, k: int | None = None) -> List[Tuple[Document, float]]:
+    def _embeddings_for(self, generation: int, current: Embeddings) -> Embeddings:
+        """Embedder da geração: outro quando ela foi indexada com outro modelo (ou outro IDF).
+
+        O id do modelo é também o namespace do cache de embeddings: vetores de consulta do
+        modelo anterior deixam de ser encontrados e não se misturam com o índice novo.
+        """
+        if not self._owns_embeddings:
+            return current
+        embeddings = build_embeddings(self.settings, self.vector_store_path, generation)
+        if embedding_model_id(embeddings) == embedding_model_id(current):
+            return current
+        return embeddings
+
+    def embed_query(self, query: str, snapshot: IndexSnapshot | None = None) -> List[float]:
+        """Embedding da consulta, reaproveitando o cache quando a pergunta já foi vista."""
+        snapshot = snapshot or self._snapshot
+        return self.embedding_cache.get_or_compute(
+            snapshot.embedding_model, query, lambda text: self._embed_upstream(snapshot, text)
+        )
+
+    async def aembed_query(self, query: str, snapshot: IndexSnapshot | None = None) -> List[float]:
+        snapshot = snapshot or self._snapshot
+        vector = self.embedding_cache.get(snapshot.embedding_model, query)
+        if vector is None:
+            if self.embedding_flights is None:
+                vector = list(await self._aembed_upstream(snapshot, query))
+            else:
+                vector = list(
+                    await self.embedding_flights.ado(
+                        self._flight_key(snapshot, query),
+                        lambda: self._aembed_upstream(snapshot, query),
+                    )
+                )
+            self.embedding_cache.put(snapshot.embedding_model, query, vector)
+        return vector
+
+    def _embed_upstream(self, snapshot: IndexSnapshot, query: str) -> List[float]:
+        # Misses simultâneos da mesma pergunta (normalizada) compartilham uma chamada ao provedor
+        if self.embedding_flights is None:
+            with limited(self.limiter):
+                return snapshot.embeddings.embed_query(query)
+
+        def embed() -> List[float]:
+            with limited(self.limiter):
+                return snapshot.embeddings.embed_query(query)
+
+        return self.embedding_flights.do(self._flight_key(snapshot, query), embed)
+
+    async def _aembed_upstream(self, snapshot: IndexSnapshot, query: str) -> List[float]:
+        async with alimited(self.limiter):
+            return await snapshot.embeddings.aembed_query(query)
+
+    @staticmethod
+    def _flight_key(snapshot: IndexSnapshot, query: str) -> Tuple[str, str]:
+        return snapshot.embedding_model, normalize_query(query)
+
+    def search(
+        self, query: str, k: int | None = None, categoria: str | None = None
+    ) -> List[Tuple[Document, float]]:
+        # Embedding e busca no mesmo snapshot, mesmo que uma geração nova entre no meio
+        snapshot = self._snapshot
+        return self.search_by_vector(
+            self.embed_query(query, snapshot),
+            k=k,
+            query=query,
+            categoria=categoria,
+            snapshot=snapshot,
+        )
+
+    async def asearch(
+        self, query: str, k: int | None = None, categoria: str | None = None
+    ) -> List[Tuple[Document, float]]:
+        snapshot = self._snapshot
+        return await self.asearch_by_vector(
+            await self.aembed_query(query, snapshot),
+            k=k,
+            query=query,
+            categoria=categoria,
+            snapshot=snapshot,
+        )
+
+    async def asearch_by_vector(
+        self,
+        vector: List[float],
+        k: int | None = None,
+        query: str | None = None,
+        categoria: str | None = None,
+        snapshot: IndexSnapshot | None = None,
+    ) -> List[Tuple[Document, float]]:
+        # A busca no FAISS é CPU-bound (e libera o GIL); roda em thread para não travar o event loop
+        return await asyncio.to_thread(self.search_by_vector, vector, k, query, categoria, snapshot)
+
+    def search_by_vector(
+        self,
+        vector: List[float],
+        k: int | None = None,
+        query: str | None = None,
+        categoria: str | None = None,
+        snapshot: IndexSnapshot | None = None,
+    ) -> List[Tuple[Document, float]]:
+        return self.search_batch_by_vectors(
+            [vector],
+            k=k,
+            queries=[query] if query is not None else None,
+            categoria=categoria,
+            snapshot=snapshot,
+        )[0]
+
+    def embed_queries(
+        self, queries: Sequence[str], snapshot: IndexSnapshot | None = None
+    ) -> List[List[float]]:
+        """Embeddings de várias consultas; só as ausentes no cache vão ao provedor, numa chamada."""
+        snapshot = snapshot or self._snapshot
+        vectors = [self.embedding_cache.get(snapshot.embedding_model, query) for query in queries]
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with limited(self.limiter):
+                computed = snapshot.embeddings.embed_documents([queries[idx] for idx in missing])
+            self._fill_missing(snapshot, queries, vectors, missing, computed)
+        return vectors  # type: ignore[return-value]
+
+    async def aembed_queries(
+        self, queries: Sequence[str], snapshot: IndexSnapshot | None = None
+    ) -> List[List[float]]:
+        snapshot = snapshot or self._snapshot
+        vectors = [self.embedding_cache.get(snapshot.embedding_model, query) for query in queries]
+        missing = [idx for idx, vector in enumerate(vectors) if vector is None]
+        if missing:
+            async with alimited(self.limiter):
+                computed = await snapshot.embeddings.aembed_documents(
+                    [queries[idx] for idx in missing]
+                )
+            self._fill_missing(snapshot, queries, vectors, missing, computed)
+        return vectors  # type: ignore[return-value]
+
+    def _fill_missing(
+        self,
+        snapshot: IndexSnapshot,
+        queries: Sequence[str],
+        vectors: List[List[float] | None],
+        missing: List[int],
+        computed: List[List[float]],
+    ) -> None:
+        for idx, vector in zip(missing, computed, strict=True):
+            filled = list(vector)
+            vectors[idx] = filled
+            self.embedding_cache.put(snapshot.embedding_model, queries[idx], filled)
+
+    def search_batch(
+        self, queries: Sequence[str], k: int | None = None, categoria: str | None = None
+    ) -> List[List[Tuple[Document, float]]]:
+        snapshot = self._snapshot
+        return self.search_batch_by_vectors(
+            self.embed_queries(queries, snapshot),
+            k=k,
+            queries=queries,
+            categoria=categoria,
+            snapshot=snapshot,
+        )
+
+    def search_batch_by_vectors(
+        self,
+        vectors: Sequence[List[float]],
+        k: int | None = None,
+        queries: Sequence[str] | None = None,
+        categoria: str | None = None,
+        snapshot: IndexSnapshot | None = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        return [
+            ranked.documents()
+            for ranked in self.search_rows_by_vectors(vectors, k, queries, categoria, snapshot)
+        ]
+
+    async def asearch_rows_by_vector(
+        self,
+        vector: List[float],
+        k: int | None = None,
+        query: str | None = None,
+        categoria: str | None = None,
+        snapshot: IndexSnapshot | None = None,
+    ) -> RankedRows:
+        queries = [query] if query is not None else None
+        found = await asyncio.to_thread(
+            self.search_rows_by_vectors, [vector], k, queries, categoria, snapshot
+        )
+        return found[0]
+
+    def search_rows_by_vectors(
+        self,
+        vectors: Sequence[List[float]],
+        k: int | None = None,
+        queries: Sequence[str] | None = None,
+        categoria: str | None = None,
+        snapshot: IndexSnapshot | None = None,
+    ) -> List[RankedRows]:
+        """Busca vetorizada: uma única chamada ``index.search`` para todas as consultas.
+
+        Devolve linhas do índice e scores, sem montar documentos; ``RankedRows.sources`` lê só as
+        fontes escolhidas da tabela de documentos. Com ``queries`` e busca híbrida ativa, o
+        ranking vetorial é combinado com o BM25 do índice invertido por reciprocal rank fusion; o
+        score devolvido continua sendo a distância vetorial. Com ``categoria``, vetorial e BM25
+        consideram apenas as linhas da partição dessa categoria. ``snapshot`` fixa a geração
+        usada para gerar os vetores; sem ele, vale a geração corrente.
+        """
+        if not vectors:
+            return []
         top_k = k or self.settings.retrieval_k
-        docs_and_scores = self.vector_store.similarity_search_with_score(query, k=top_k)
-        # Quando em modo fake ou embeddings de teste, os scores não representam similaridade real; normaliza para 0.0
-        from langchain_community.embeddings import (
-            FakeEmbeddings,
-        )  # local import para evitar dependência dura
-
-        if self.settings.use_fake_embeddings or isinstance(self.embeddings, FakeEmbeddings):
-            docs_and_scores = [(doc, 0.0) for doc, _ in docs_and_scores]
-        return docs_and_scores
+        snapshot = snapshot or self._snapshot
+        vector_store = snapshot.vector_store
+        hybrid = self.settings.hybrid_search and queries is not None
+        fetch_k = max(top_k, self.settings.hybrid_fetch_k) if hybrid else top_k
+        matrix = np.asarray(vectors, dtype=np.float32)
+        scores, indices = vector_store.search(matrix, fetch_k, categoria)
+        subset = vector_store.partition(categoria) if categoria is not None else None
+        zero_scores = snapshot.zero_scores
+        results: List[RankedRows] = []
+        for query_idx, (row_scores, row_indices) in enumerate(zip(scores, indices, strict=True)):
+            ranked = [
+                (int(position), float(score))
+                for score, position in zip(row_scores.tolist(), row_indices.tolist(), strict=True)
+                if position != -1
+            ]
+            if hybrid:
+                ranked = self._fuse_lexical(
+                    vector_store,
+                    matrix[query_idx],
+                    queries[query_idx],  # type: ignore[index]
+                    ranked,
+                    fetch_k,
+                    top_k,
+                    subset,
+                )
+            rows = [(row, 0.0 if zero_scores else score) for row, score in ranked[:top_k]]
+            results.append(RankedRows(vector_store, rows))
+        return results
+
+    def _fuse_lexical(
+        self,
+        vector_store: SearchableStore,
+        vector: np.ndarray,
+        query: str,
+        ranked: List[Tuple[int, float]],
+        fetch_k: int,
+        top_k: int,
+        subset: np.ndarray | None = None,
+    ) -> List[Tuple[int, float]]:
+        lexical_rows = [row for row, _ in vector_store.lexical.search(query, fetch_k, subset)]
+        if not lexical_rows:
+            return ranked
+        fused = reciprocal_rank_fusion(
+            [[row for row, _ in ranked], lexical_rows], k=self.settings.hybrid_rrf_k
+        )[:top_k]
+        vector_scores = dict(ranked)
+        missing = [row for row in fused if row not in vector_scores]
+        if missing:
+            vector_scores.update(
+                zip(missing, vector_store.distances(vector, missing).tolist(), strict=True)
+            )
+        return [(row, vector_scores[row]) for row in fused]
+
+    def source_distances(self, vector: List[float], doc_ids: Sequence[str]) -> List[float | None]:
+        """Distância da consulta a documentos já recuperados (``None`` se saíram do índice)."""
+        snapshot = self._snapshot
+        vector_store = snapshot.vector_store
+        rows = [vector_store.row_of(doc_id) for doc_id in doc_ids]
+        present = [row for row in rows if row is not None]
+        if not present:
+            return [None] * len(rows)
+        if snapshot.zero_scores:
+            distances = iter([0.0] * len(present))
+        else:
+            query = np.asarray(vector, dtype=np.float32)
+            distances = iter(vector_store.distances(query, present).tolist())
+        return [None if row is None else next(distances) for row in rows]
+
+    def has_lexical_overlap(self, question: str, doc_ids: Sequence[str]) -> bool:
+        """Algum dos documentos contém termo da pergunta? Consulta direta ao índice invertido."""
+        vector_store = self._snapshot.vector_store
+        rows = [row for row in map(vector_store.row_of, doc_ids) if row is not None]
+        return bool(vector_store.lexical.overlapping_rows(question, rows))
@@ -0,0 +1,144 @@
+"""Sessões de conversa em memória para perguntas de continuação ("e se o pedido já saiu?").
+
+Cada sessão guarda só o último turno respondido: a pergunta âncora, o embedding dela (float32
+normalizado) e as fontes recuperadas. Uma continuação cujo embedding tem cosseno >= ``similarity``
+com a âncora, no mesmo escopo de categoria e na mesma geração do índice, é candidata a reaproveitar
+essas fontes sem nova busca; quem chama ainda pode recusar (ex.: fontes distantes da pergunta nova).
+Aceita, a continuação vira a âncora da sessão. O store é limitado por quantidade de sessões (LRU) e
+por ``ttl`` de inatividade; um único store pode atender vários agentes (chaves distintas por base).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cache
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from backend.app.core.config import get_settings
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.cache import sources_bytes
+
+
+@dataclass
+class SessionTurn:
+    question: str
+    vector: np.ndarray
+    sources: List[RetrievedSource]
+    scope: str | None
+    generation: int
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_sessions: int | None = None,
+        ttl: float | None = None,
+        similarity: float | None = None,
+    ):
+        # Padrões vêm das settings (session_max, session_ttl, session_reuse_similarity)
+        settings = get_settings()
+        self.max_sessions = settings.session_max if max_sessions is None else max_sessions
+        self.ttl = settings.session_ttl if ttl is None else ttl
+        self.similarity = settings.session_reuse_similarity if similarity is None else similarity
+        self._entries: OrderedDict[str, tuple[SessionTurn, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimativa das sessões guardadas: embedding da âncora, pergunta e fontes."""
+        with self._lock:
+            return sum(
+                turn.vector.nbytes + len(turn.question) + sources_bytes(turn.sources)
+                for turn, _ in self._entries.values()
+            )
+
+    def remember(
+        self,
+        session_id: str,
+        question: str,
+        vector: Sequence[float],
+        sources: List[RetrievedSource],
+        scope: str | None,
+        generation: int,
+    ) -> None:
+        turn = SessionTurn(question, _unit(vector), sources, scope, generation)
+        with self._lock:
+            self._put(session_id, turn, time.monotonic())
+
+    def followup(
+        self,
+        session_id: str,
+        question: str,
+        vector: Sequence[float],
+        scope: str | None,
+        generation: int,
+        rescore: Callable[[List[RetrievedSource]], List[RetrievedSource] | None] | None = None,
+    ) -> SessionTurn | None:
+        """Turno anterior da sessão quando a nova pergunta ainda trata do mesmo assunto.
+
+        ``rescore`` reavalia as fontes guardadas para a nova pergunta e devolve ``None`` quando
+        elas não a atendem mais. Aceita, a nova pergunta (com as fontes reavaliadas) passa a ser
+        a âncora da sessão; o turno devolvido traz a pergunta anterior, que vai para o prompt.
+        """
+        query = _unit(vector)
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            turn = entry[0]
+            if turn.scope != scope or turn.generation != generation:
+                return None
+            if float(turn.vector @ query) < self.similarity:
+                return None
+        # Fora do lock: a reavaliação consulta o índice
+        sources = turn.sources if rescore is None else rescore(turn.sources)
+        if sources is None:
+            return None
+        with self._lock:
+            self._put(
+                session_id,
+                SessionTurn(question, query, sources, scope, generation),
+                time.monotonic(),
+            )
+            self.reused += 1
+        return SessionTurn(turn.question, turn.vector, sources, scope, generation)
+
+    def _put(self, session_id: str, turn: SessionTurn, now: float) -> None:
+        # Chamado com o lock
+        self._entries[session_id] = (turn, now + self.ttl)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _purge_expired(self, now: float) -> None:
+        # Entradas em ordem de uso: as expiradas ficam no início
+        while self._entries:
+            session_id, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[session_id]
+
+
+@cache
+def shared_session_store() -> SessionStore:
+    """Store único do processo, usado pelo agente padrão e pelas bases do pool: ``session_max``
+    limita as sessões da instância, não de cada base."""
+    return SessionStore()
@@ -0,0 +1,256 @@
+"""Clientes compartilhados do provedor (OpenAI) e controle de vazão das chamadas.
+
+Um único ``ChatOpenAI``/``OpenAIEmbeddings`` por modelo no processo, sobre um pool HTTP com
+keep-alive e timeouts configuráveis. Cada modelo tem um ``AdaptiveRateLimiter``: token bucket
+mais teto de chamadas simultâneas, que se ajusta pelos headers de rate limit das respostas
+(``x-ratelimit-*``) e recua em 429. Quando não há vaga dentro de ``upstream_max_wait`` a
+chamada falha na hora com ``UpstreamOverloadedError`` — a API responde 503 com ``Retry-After``
+em vez de enfileirar sem limite.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import math
+import re
+import threading
+import time
+from functools import cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Mapping, Tuple
+
+from backend.app.core.config import get_settings
+from backend.app.core.metrics import record_upstream_event
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+# Espera entre tentativas quando o limite é de chamadas simultâneas (não há prazo conhecido)
+_POLL_SECONDS = 0.01
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class UpstreamOverloadedError(RuntimeError):
+    """Sem capacidade no provedor dentro do prazo; ``retry_after`` em segundos."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Provedor sobrecarregado para {model}; tente em {retry_after:.1f}s.")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        model: str,
+        rate: float,
+        burst: int,
+        max_in_flight: int,
+        max_wait: float,
+        min_rate: float = 0.5,
+    ):
+        self.model = model
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.min_rate = min(min_rate, rate)
+        self.in_flight = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> float:
+        """Reserva uma vaga e devolve 0.0, ou devolve quantos segundos esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.in_flight >= self.max_in_flight:
+                return _POLL_SECONDS
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self.rate
+            self._tokens -= 1.0
+            self.in_flight += 1
+            return 0.0
+
+    def _reject(self, wait: float) -> UpstreamOverloadedError:
+        record_upstream_event(self.model, "rejected")
+        return UpstreamOverloadedError(self.model, max(wait, 1.0))
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + self.max_wait
+        while (wait := self._try_acquire()) > 0.0:
+            if time.monotonic() + wait > deadline:
+                raise self._reject(wait)
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        deadline = time.monotonic() + self.max_wait
+        while (wait := self._try_acquire()) > 0.0:
+            if time.monotonic() + wait > deadline:
+                raise self._reject(wait)
+            await asyncio.sleep(wait)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Ajusta a vazão pela resposta: 429 reduz à metade e pausa; sucesso recupera aos poucos,
+        limitado pelo que ``x-ratelimit-remaining-requests``/``reset-requests`` permitem."""
+        with self._lock:
+            now = time.monotonic()
+            if status_code == 429:
+                self.rate = max(self.min_rate, self.rate / 2.0)
+                self._tokens = 0.0
+                pause = _retry_after(headers) or _parse_duration(
+                    headers.get("x-ratelimit-reset-requests")
+                )
+                self._paused_until = max(self._paused_until, now + (pause or 1.0))
+                record_upstream_event(self.model, "throttled")
+                return
+            if status_code >= 400:
+                return
+            rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            reset = _parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if remaining is not None and reset:
+                with contextlib.suppress(ValueError):
+                    rate = min(rate, max(self.min_rate, float(remaining) / reset))
+            self.rate = rate
+
+
+@cache
+def get_limiter(model: str) -> AdaptiveRateLimiter:
+    settings = get_settings()
+    return AdaptiveRateLimiter(
+        model,
+        rate=settings.upstream_rate_limit,
+        burst=settings.upstream_burst,
+        max_in_flight=settings.upstream_max_concurrency,
+        max_wait=settings.upstream_max_wait,
+    )
+
+
+def limited(limiter: AdaptiveRateLimiter | None) -> contextlib.AbstractContextManager:
+    return limiter.slot() if limiter is not None else contextlib.nullcontext()
+
+
+def alimited(limiter: AdaptiveRateLimiter | None) -> contextlib.AbstractAsyncContextManager:
+    return limiter.aslot() if limiter is not None else contextlib.nullcontext()
+
+
+@cache
+def http_clients(model: str, base_url: str | None) -> Tuple[Any, Any]:
+    """Par (sync, async) de clientes HTTP do SDK da OpenAI com pool, keep-alive e hooks que
+    alimentam o limiter do modelo. O cliente async fica preso ao event loop que o usar primeiro
+    (o da API)."""
+    import openai  # ~0,5s de import: só quando há chamada real ao provedor
+
+    settings = get_settings()
+    limiter = get_limiter(model)
+    # Limits/Timeout da mesma biblioteca HTTP que o SDK instalado usa
+    limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=settings.upstream_max_connections,
+        max_keepalive_connections=settings.upstream_max_connections,
+        keepalive_expiry=settings.upstream_keepalive_seconds,
+    )
+    timeout = type(openai.DEFAULT_TIMEOUT)(
+        settings.upstream_timeout, connect=settings.upstream_connect_timeout
+    )
+
+    def observe(response: Any) -> None:
+        limiter.observe(response.status_code, response.headers)
+
+    async def aobserve(response: Any) -> None:
+        observe(response)
+
+    sync_client = openai.DefaultHttpxClient(
+        limits=limits, timeout=timeout, event_hooks={"response": [observe]}
+    )
+    async_client = openai.DefaultAsyncHttpxClient(
+        limits=limits, timeout=timeout, event_hooks={"response": [aobserve]}
+    )
+    return sync_client, async_client
+
+
+@cache
+def shared_chat_model(model: str, api_key: str, base_url: str | None = None) -> ChatOpenAI:
+    from langchain_openai import ChatOpenAI
+
+    settings = get_settings()
+    sync_client, async_client = http_clients(model, base_url)
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,  # type: ignore[arg-type]
+        base_url=base_url,
+        stream_usage=True,
+        timeout=settings.upstream_timeout,
+        max_retries=settings.upstream_max_retries,
+        http_client=sync_client,
+        http_async_client=async_client,
+    )
+
+
+@cache
+def shared_embeddings(model: str, api_key: str, base_url: str | None = None) -> OpenAIEmbeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    settings = get_settings()
+    sync_client, async_client = http_clients(model, base_url)
+    return OpenAIEmbeddings(
+        model=model,
+        api_key=api_key,  # type: ignore[arg-type]
+        base_url=base_url,
+        timeout=settings.upstream_timeout,
+        max_retries=settings.upstream_max_retries,
+        http_client=sync_client,
+        http_async_client=async_client,
+    )
+
+
+def _retry_after(headers: Mapping[str, str]) -> float | None:
+    for header, divisor in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is not None:
+            with contextlib.suppress(ValueError):
+                return max(float(value) / divisor, 0.0)
+    return None
+
+
+def _parse_duration(value: str | None) -> float | None:
+    """Durações no formato dos headers da OpenAI: ``"1s"``, ``"6m0s"``, ``"20ms"``."""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        with contextlib.suppress(ValueError):
+            return float(value)
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_header(exc: UpstreamOverloadedError) -> str:
+    return str(math.ceil(exc.retry_after))
@@ -0,0 +1,771 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.lexical import (
+    LEXICAL_FILES,
+    LEXICAL_TERMS,
+    LexicalIndex,
+    fold_accents,
+    lexical_text,
+)
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+GENERATION_FILE = "GENERATION"
+GENERATIONS_DIR = "generations"
+NATIVE_HEADER = "store.json"
+NATIVE_VECTORS = "vectors.npy"
+NATIVE_NORMS = "norms.npy"
+NATIVE_METADATA = "metadata.json"
+NATIVE_ANN_INDEX = "ann.faiss"
+NATIVE_PARTITIONS = "partitions.npz"
+NATIVE_FILES = (
+    NATIVE_HEADER,
+    NATIVE_VECTORS,
+    NATIVE_NORMS,
+    NATIVE_METADATA,
+    NATIVE_ANN_INDEX,
+    NATIVE_PARTITIONS,
+    *LEXICAL_FILES,
+)
+NATIVE_FORMAT_VERSION = 1
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+METADATA_FIELDS = ("id", "categoria", "fonte", "pergunta", "resposta")
+# Colunas com poucos valores distintos são gravadas como dicionário + códigos
+DICTIONARY_FIELDS = ("categoria", "fonte")
+
+_NO_ROWS = np.zeros(0, dtype=np.int64)
+# Estimativa por linha do docstore do LangChain (Document + dicionário de metadados)
+_DOCSTORE_ROW_BYTES = 1024
+
+
+def read_generation(vector_dir: Path) -> int:
+    """Lê a geração atual do vector store (0 quando ainda não houve ingestão versionada)."""
+    try:
+        return int((vector_dir / GENERATION_FILE).read_text(encoding="utf-8").strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def generation_dir(vector_dir: Path, generation: int) -> Path:
+    return vector_dir / GENERATIONS_DIR / str(generation)
+
+
+def store_dir(vector_dir: Path, generation: int | None = None) -> Path:
+    """Diretório com os arquivos de uma geração (a apontada por ``GENERATION`` por padrão).
+
+    Cada geração publicada fica, completa e imutável, em ``generations/<N>/``; bases gravadas
+    antes desse layout têm os arquivos na raiz do diretório.
+    """
+    if generation is None:
+        generation = read_generation(vector_dir)
+    directory = generation_dir(vector_dir, generation)
+    return directory if directory.is_dir() else vector_dir
+
+
+def format_content(fonte: str, categoria: str, pergunta: str, resposta: str) -> str:
+    return (
+        f"[FONTE: {fonte}]\n"
+        f"[CATEGORIA: {categoria}]\n"
+        f"CENÁRIO: {pergunta}\n"
+        f"AÇÃO RECOMENDADA: {resposta}"
+    )
+
+
+class TextColumn:
+    """Coluna de texto num único buffer UTF-8 com offsets, sem um objeto ``str`` por linha."""
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data: bytes, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values: Iterable[str]) -> "TextColumn":
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        if not 0 <= row < len(self):
+            raise IndexError(f"Linha {row} fora da tabela de documentos.")
+        start, end = self.offsets[row : row + 2].tolist()
+        return self.data[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds, bounds[1:], strict=False):
+            yield self.data[start:end].decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + int(self.offsets.nbytes)
+
+
+class CategoricalColumn:
+    """Coluna com poucos valores distintos: dicionário de strings internadas + códigos por linha."""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values: Sequence[str], codes: Sequence[int]):
+        self.values = tuple(sys.intern(str(value)) for value in values)
+        dtype = np.uint16 if len(self.values) <= 2**16 else np.uint32
+        self.codes = np.asarray(codes, dtype=dtype)
+
+    @classmethod
+    def from_values(cls, values: Iterable[str]) -> "CategoricalColumn":
+        values = list(values)
+        dictionary = sorted(set(values))
+        positions = {value: code for code, value in enumerate(dictionary)}
+        return cls(dictionary, [positions[value] for value in values])
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> str:
+        return self.values[self.codes[row]]
+
+    def __iter__(self) -> Iterator[str]:
+        values = self.values
+        return (values[code] for code in self.codes.tolist())
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+
+Column = Union[TextColumn, CategoricalColumn]
+
+
+class DocumentTable:
+    """Documentos da base em colunas, endereçados pela linha do índice vetorial.
+
+    Textos ficam em buffers UTF-8 e categoria/fonte como códigos sobre strings internadas; não há
+    ``Document`` nem dicionário de metadados por linha. A busca devolve linhas e ``source``
+    materializa só as fontes da resposta.
+    """
+
+    __slots__ = ("id", "categoria", "fonte", "pergunta", "resposta", "_id_hashes", "_id_rows")
+
+    def __init__(
+        self,
+        ids: TextColumn,
+        categoria: CategoricalColumn,
+        fonte: CategoricalColumn,
+        pergunta: TextColumn,
+        resposta: TextColumn,
+    ):
+        self.id = ids
+        self.categoria = categoria
+        self.fonte = fonte
+        self.pergunta = pergunta
+        self.resposta = resposta
+        # Lookup por id (hash ordenado + linhas), montado na primeira consulta
+        self._id_hashes: np.ndarray | None = None
+        self._id_rows: np.ndarray | None = None
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[str]]) -> "DocumentTable":
+        return cls(
+            TextColumn.from_values(columns["id"]),
+            CategoricalColumn.from_values(columns["categoria"]),
+            CategoricalColumn.from_values(columns["fonte"]),
+            TextColumn.from_values(columns["pergunta"]),
+            TextColumn.from_values(columns["resposta"]),
+        )
+
+    @classmethod
+    def from_encoded(cls, raw_columns: Dict[str, Any]) -> "DocumentTable":
+        """A partir do ``metadata.json``, reaproveitando o dicionário de categoria/fonte gravado."""
+
+        def categorical(raw: Any) -> CategoricalColumn:
+            if isinstance(raw, dict):
+                return CategoricalColumn(raw["values"], raw["codes"])
+            return CategoricalColumn.from_values(raw)
+
+        return cls(
+            TextColumn.from_values(raw_columns["id"]),
+            categorical(raw_columns["categoria"]),
+            categorical(raw_columns["fonte"]),
+            TextColumn.from_values(raw_columns["pergunta"]),
+            TextColumn.from_values(raw_columns["resposta"]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def __getitem__(self, field: str) -> Column:
+        if field not in METADATA_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def row_of(self, doc_id: str) -> int | None:
+        if self._id_hashes is None:
+            hashes = np.fromiter((hash(value) for value in self.id), np.int64, len(self))
+            self._id_rows = np.argsort(hashes, kind="stable")
+            self._id_hashes = hashes[self._id_rows]
+        key = hash(doc_id)
+        start = int(np.searchsorted(self._id_hashes, key, side="left"))
+        end = int(np.searchsorted(self._id_hashes, key, side="right"))
+        for row in self._id_rows[start:end].tolist():  # type: ignore[index]
+            if self.id[row] == doc_id:
+                return row
+        return None
+
+    def metadata(self, row: int) -> Dict[str, str]:
+        return {field: self[field][row] for field in METADATA_FIELDS}
+
+    def document(self, row: int) -> Document:
+        metadata = self.metadata(row)
+        content = format_content(
+            metadata["fonte"], metadata["categoria"], metadata["pergunta"], metadata["resposta"]
+        )
+        return Document(id=metadata["id"], page_content=content, metadata=metadata)
+
+    def source(self, row: int, score: float | None) -> RetrievedSource:
+        # Campos já são strings: dispensa a validação do pydantic
+        return RetrievedSource.model_construct(
+            id=self.id[row],
+            fonte=self.fonte[row],
+            categoria=self.categoria[row],
+            pergunta=self.pergunta[row],
+            resposta=self.resposta[row],
+            score=score,
+        )
+
+    def lexical_texts(self) -> Iterator[str]:
+        return (
+            lexical_text(*values)
+            for values in zip(self.pergunta, self.resposta, self.categoria, self.fonte, strict=True)
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self[field].nbytes for field in METADATA_FIELDS)
+
+
+class FaissVectorStore:
+    """Adaptador do FAISS do LangChain para a interface de busca usada pelo retriever."""
+
+    def __init__(self, store: FAISS):
+        self.store = store
+        self._table: DocumentTable | None = None
+        self._lexical: LexicalIndex | None = None
+        self._partitions: Dict[str, np.ndarray] | None = None
+        self._selectors: Dict[str, Any] = {}
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.store.index.ntotal)
+
+    @property
+    def table(self) -> DocumentTable:
+        # Lido do docstore uma vez; depois a materialização das fontes não passa pelos Documents
+        if self._table is None:
+            docs = [self.document(row) for row in range(self.ntotal)]
+            self._table = DocumentTable.from_columns(
+                {
+                    field: [str(doc.metadata.get(field, "")) for doc in docs]
+                    for field in METADATA_FIELDS
+                }
+            )
+        return self._table
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        # Índices do LangChain não trazem o invertido; monta uma vez, na primeira consulta híbrida
+        if self._lexical is None:
+            self._lexical = LexicalIndex.build(self.table.lexical_texts())
+        return self._lexical
+
+    def partition(self, categoria: str) -> np.ndarray:
+        if self._partitions is None:
+            self._partitions = build_partitions(self.table.categoria)
+        return self._partitions.get(normalize_category(categoria), _NO_ROWS)
+
+    def row_of(self, doc_id: str) -> int | None:
+        return self.table.row_of(doc_id)
+
+    def source(self, row: int, score: float | None) -> RetrievedSource:
+        return self.table.source(row, score)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimativa da memória ocupada: índice FAISS, docstore e estruturas já montadas."""
+        total = index_bytes(self.store.index) + self.ntotal * _DOCSTORE_ROW_BYTES
+        if self._table is not None:
+            total += self._table.nbytes
+        if self._lexical is not None:
+            total += self._lexical.nbytes
+        return total
+
+    def distances(self, vector: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+        stored = np.stack([self.store.index.reconstruct(int(row)) for row in rows])
+        query = vector.astype(np.float32).copy().reshape(1, -1)
+        if getattr(self.store, "_normalize_L2", False):
+            faiss.normalize_L2(query)
+        return ((stored - query) ** 2).sum(axis=1)
+
+    def search(
+        self, matrix: np.ndarray, k: int, categoria: str | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if getattr(self.store, "_normalize_L2", False):
+            matrix = matrix.copy()
+            faiss.normalize_L2(matrix)
+        if categoria is None:
+            return self.store.index.search(matrix, k)
+        rows = self.partition(categoria)
+        if not len(rows):
+            return _empty_result(matrix.shape[0], k)
+        key = normalize_category(categoria)
+        if key not in self._selectors:
+            self._selectors[key] = partition_search_params(self.store.index, rows)
+        return self.store.index.search(matrix, k, params=self._selectors[key][0])
+
+    def document(self, row: int) -> Document:
+        doc = self.store.docstore.search(self.store.index_to_docstore_id[row])
+        if not isinstance(doc, Document):
+            raise KeyError(f"Documento da posição {row} ausente no docstore.")
+        return doc
+
+
+class NativeVectorStore:
+    """Vector store em formato próprio, sem pickle.
+
+    - ``store.json``: cabeçalho (versão, modelo, dimensão, total e geração);
+    - ``vectors.npy``: matriz float32 aberta com ``mmap``, compartilhada entre workers pelo page
+      cache do sistema operacional em vez de uma cópia privada por processo;
+    - ``norms.npy``: normas ao quadrado de cada vetor, para a distância L2 sem reler a matriz;
+    - ``metadata.json``: metadados colunares (categoria/fonte codificadas por dicionário);
+    - ``ann.faiss`` (opcional): índice aproximado (IVF-Flat, HNSW ou IVF-PQ) treinado na ingestão.
+    - ``partitions.npz``: linhas de cada categoria, para buscar só na partição pedida.
+
+    As distâncias são L2 ao quadrado, as mesmas do ``IndexFlatL2`` usado pelo LangChain. Sem
+    índice aproximado a busca é exata (força bruta sobre a matriz mapeada) e a busca filtrada
+    junta as linhas da partição a cada consulta: nada é copiado para fora do mmap na carga. Com
+    índice aproximado, as partições pequenas (até ``partition_exact_max_rows``) têm matriz e normas
+    contíguas montadas na carga (fatia do mmap quando as linhas são consecutivas, cópia quando
+    não) e as demais usam o índice com seletor de ids.
+    """
+
+    def __init__(
+        self,
+        header: Dict[str, Any],
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        table: DocumentTable,
+        ann_index: faiss.Index | None = None,
+        lexical: LexicalIndex | None = None,
+        partitions: Dict[str, np.ndarray] | None = None,
+        partition_exact_max_rows: int = 10_000,
+    ):
+        self.header = header
+        self.vectors = vectors
+        self.norms = norms
+        self.table = table
+        self.ann_index = ann_index
+        self.lexical = lexical or LexicalIndex.build(table.lexical_texts())
+        self.partitions = (
+            partitions if partitions is not None else build_partitions(table.categoria)
+        )
+        # Partições pequenas usam busca exata; maiores usam o índice aproximado com seletor de ids
+        self.partition_exact_max_rows = partition_exact_max_rows
+        self._selectors: Dict[str, Any] = {}
+        # Sem índice aproximado nada é materializado: cópias privadas por worker somariam a matriz
+        # inteira e anulariam o compartilhamento pelo page cache
+        self._partition_matrices: Dict[str, Tuple[np.ndarray, np.ndarray]] = (
+            {
+                name: self._partition_matrix(rows)
+                for name, rows in self.partitions.items()
+                if len(rows) <= partition_exact_max_rows
+            }
+            if self.ann_index is not None
+            else {}
+        )
+
+    @classmethod
+    def load(
+        cls, path: Path, settings: Settings | None = None, generation: int | None = None
+    ) -> "NativeVectorStore":
+        """Carrega a geração ``generation`` (padrão: a atual) do vector store em ``path``.
+
+        Recusa com ``ValueError`` arquivos que não formam uma geração só: cabeçalho de outra
+        geração ou totais de linhas diferentes entre vetores, normas, metadados e índices.
+        """
+        if generation is None and (path / GENERATION_FILE).exists():
+            generation = read_generation(path)
+        directory = store_dir(path, generation)
+        header = json.loads((directory / NATIVE_HEADER).read_text(encoding="utf-8"))
+        if header.get("format_version") != NATIVE_FORMAT_VERSION:
+            raise ValueError(f"Formato de vector store não suportado em {directory}.")
+        if generation is not None and header.get("generation", generation) != generation:
+            raise ValueError(
+                f"Vector store em {directory} é da geração {header.get('generation')}, "
+                f"esperada {generation}."
+            )
+        vectors = np.load(directory / NATIVE_VECTORS, mmap_mode="r")
+        norms = np.load(directory / NATIVE_NORMS, mmap_mode="r")
+        raw_columns = json.loads((directory / NATIVE_METADATA).read_text(encoding="utf-8"))
+        ann_index = None
+        if header.get("index_type", "flat") != "flat" and (directory / NATIVE_ANN_INDEX).exists():
+            ann_index = _read_index_mmap(directory / NATIVE_ANN_INDEX)
+            configure_search_params(ann_index, settings or get_settings())
+        lexical = LexicalIndex.load(directory) if (directory / LEXICAL_TERMS).exists() else None
+        partitions = (
+            load_partitions(directory / NATIVE_PARTITIONS)
+            if (directory / NATIVE_PARTITIONS).exists()
+            else None
+        )
+        table = DocumentTable.from_encoded(raw_columns)
+        counts = {int(header.get("count", vectors.shape[0])), len(vectors), len(norms), len(table)}
+        if ann_index is not None:
+            counts.add(int(ann_index.ntotal))
+        if lexical is not None:
+            counts.add(len(lexical.doc_lengths))
+        if len(counts) != 1:
+            raise ValueError(f"Arquivos do vector store em {directory} têm totais divergentes.")
+        return cls(
+            header,
+            vectors,
+            norms,
+            table,
+            ann_index,
+            lexical,
+            partitions,
+            (settings or get_settings()).partition_exact_max_rows,
+        )
+
+    @property
+    def index_type(self) -> str:
+        return str(self.header.get("index_type", "flat")) if self.ann_index is not None else "flat"
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.vectors.shape[0])
+
+    @property
+    def generation(self) -> int:
+        return int(self.header.get("generation", 0))
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimativa da memória ocupada; vetores mapeados contam inteiros (residentes no page
+        cache enquanto a base recebe consultas)."""
+        partitions = sum(int(rows.nbytes) for rows in self.partitions.values())
+        # Só as cópias contam; fatias do mmap são as mesmas páginas de ``vectors`` (uma cópia por
+        # indexação avançada não é dona dos dados, então ``owndata`` não a distingue)
+        partitions += sum(
+            (0 if np.shares_memory(vectors, self.vectors) else int(vectors.nbytes))
+            + (0 if np.shares_memory(norms, self.norms) else int(norms.nbytes))
+            for vectors, norms in self._partition_matrices.values()
+        )
+        ann = index_bytes(self.ann_index) if self.ann_index is not None else 0
+        return (
+            int(self.vectors.nbytes)
+            + int(self.norms.nbytes)
+            + self.table.nbytes
+            + self.lexical.nbytes
+            + partitions
+            + ann
+        )
+
+    def partition(self, categoria: str) -> np.ndarray:
+        return self.partitions.get(normalize_category(categoria), _NO_ROWS)
+
+    def search(
+        self, matrix: np.ndarray, k: int, categoria: str | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if categoria is not None:
+            return self._search_partition(matrix, k, categoria)
+        if self.ann_index is not None:
+            return self.ann_index.search(np.ascontiguousarray(matrix, dtype=np.float32), k)
+        return self.exact_search(matrix, k)
+
+    def _search_partition(
+        self, matrix: np.ndarray, k: int, categoria: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        key = normalize_category(categoria)
+        rows = self.partitions.get(key, _NO_ROWS)
+        if key in self._partition_matrices:
+            vectors, norms = self._partition_matrices[key]
+            return _exact_search(matrix, k, vectors, norms, rows)
+        if not len(rows):
+            return _empty_result(matrix.shape[0], k)
+        if self.ann_index is None:
+            return self.exact_search(matrix, k, rows)
+        if key not in self._selectors:
+            self._selectors[key] = partition_search_params(self.ann_index, rows)
+        return self.ann_index.search(
+            np.ascontiguousarray(matrix, dtype=np.float32), k, params=self._selectors[key][0]
+        )
+
+    def exact_search(
+        self, matrix: np.ndarray, k: int, subset: np.ndarray | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Força bruta sobre todas as linhas ou só sobre ``subset`` (ids de linha crescentes)."""
+        if subset is None:
+            return _exact_search(matrix, k, self.vectors, self.norms)
+        vectors, norms = self._partition_matrix(subset)
+        return _exact_search(matrix, k, vectors, norms, subset)
+
+    def _partition_matrix(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if len(rows) and int(rows[-1]) - int(rows[0]) + 1 == len(rows):
+            start, stop = int(rows[0]), int(rows[-1]) + 1
+            return self.vectors[start:stop], self.norms[start:stop]
+        return np.ascontiguousarray(self.vectors[rows]), np.ascontiguousarray(self.norms[rows])
+
+    def row_of(self, doc_id: str) -> int | None:
+        return self.table.row_of(doc_id)
+
+    def distances(self, vector: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+        """Distância L2 ao quadrado da consulta para linhas específicas (ex.: vindas do BM25)."""
+        query = vector.astype(np.float32)
+        selected = np.asarray(rows, dtype=np.int64)
+        distances = self.norms[selected] - 2.0 * (self.vectors[selected] @ query)
+        return np.maximum(distances + float(query @ query), 0.0)
+
+    def metadata(self, row: int) -> Dict[str, str]:
+        return self.table.metadata(row)
+
+    def document(self, row: int) -> Document:
+        return self.table.document(row)
+
+    def source(self, row: int, score: float | None) -> RetrievedSource:
+        return self.table.source(row, score)
+
+
+SearchableStore = Union[FaissVectorStore, NativeVectorStore]
+
+
+def write_native_store(
+    store: FAISS,
+    target_dir: Path,
+    generation: int,
+    embedding_model: str | None = None,
+    settings: Settings | None = None,
+) -> None:
+    """Exporta o índice do LangChain para o formato nativo (vetores na ordem das linhas).
+
+    Quando ``settings.index_type`` não é ``flat``, treina e grava também o índice aproximado.
+    """
+    settings = settings or get_settings()
+    ntotal = int(store.index.ntotal)
+    dimension = int(store.index.d)
+    vectors = (
+        store.index.reconstruct_n(0, ntotal)
+        if ntotal
+        else np.zeros((0, dimension), dtype=np.float32)
+    )
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if getattr(store, "_normalize_L2", False):
+        faiss.normalize_L2(vectors)
+    rows = [store.docstore.search(store.index_to_docstore_id[row]) for row in range(ntotal)]
+    columns = {
+        field: [str(doc.metadata.get(field, "")) for doc in rows]  # type: ignore[union-attr]
+        for field in METADATA_FIELDS
+    }
+    np.save(target_dir / NATIVE_VECTORS, vectors)
+    np.save(target_dir / NATIVE_NORMS, np.einsum("ij,ij->i", vectors, vectors))
+    (target_dir / NATIVE_METADATA).write_text(
+        json.dumps(_encode_columns(columns), ensure_ascii=False), encoding="utf-8"
+    )
+    LexicalIndex.build(
+        lexical_text(*values)
+        for values in zip(
+            columns["pergunta"],
+            columns["resposta"],
+            columns["categoria"],
+            columns["fonte"],
+            strict=True,
+        )
+    ).save(target_dir)
+    save_partitions(build_partitions(columns["categoria"]), target_dir / NATIVE_PARTITIONS)
+    ann_index = build_ann_index(vectors, settings.index_type, settings)
+    if ann_index is not None:
+        faiss.write_index(ann_index, str(target_dir / NATIVE_ANN_INDEX))
+    header = {
+        "format_version": NATIVE_FORMAT_VERSION,
+        "embedding_model": embedding_model,
+        "dimension": dimension,
+        "count": ntotal,
+        "generation": generation,
+        "index_type": settings.index_type if ann_index is not None else "flat",
+    }
+    (target_dir / NATIVE_HEADER).write_text(json.dumps(header), encoding="utf-8")
+
+
+def ann_factory_string(index_type: str, ntotal: int, settings: Settings) -> str | None:
+    """Descrição ``index_factory`` do FAISS para o tipo pedido, ou None quando não há dados
+    suficientes para treinar (nesse caso a busca exata é usada)."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type inválido: {index_type!r}. Use um de {INDEX_TYPES}.")
+    if index_type == "flat" or ntotal == 0:
+        return None
+    if index_type == "hnsw":
+        return f"HNSW{settings.hnsw_m}"
+    # ~39 pontos por centróide é o mínimo recomendado pelo FAISS para o k-means do IVF
+    nlist = max(1, min(settings.ivf_nlist, ntotal // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if ntotal < 2**settings.pq_nbits:
+        return None
+    return f"IVF{nlist},PQ{settings.pq_m}x{settings.pq_nbits}"
+
+
+def build_ann_index(
+    vectors: np.ndarray, index_type: str, settings: Settings | None = None
+) -> faiss.Index | None:
+    settings = settings or get_settings()
+    factory = ann_factory_string(index_type, int(vectors.shape[0]), settings)
+    if factory is None:
+        return None
+    dimension = int(vectors.shape[1])
+    if index_type == "ivf_pq" and dimension % settings.pq_m:
+        raise ValueError(f"pq_m={settings.pq_m} precisa dividir a dimensão {dimension}.")
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_L2)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = settings.hnsw_ef_construction
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if not index.is_trained:
+        index.train(matrix)
+    index.add(matrix)
+    configure_search_params(index, settings)
+    return index
+
+
+def configure_search_params(
+    index: faiss.Index, settings: Settings, nprobe: int | None = None, ef_search: int | None = None
+) -> None:
+    """Aplica os parâmetros de busca (``nprobe`` do IVF, ``efSearch`` do HNSW)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or settings.ivf_nprobe, ivf.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search or settings.hnsw_ef_search
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Bytes dos códigos armazenados no índice (sem as estruturas auxiliares, como o grafo HNSW)."""
+    try:
+        code_size = int(index.sa_code_size())
+    except RuntimeError:
+        code_size = int(index.d) * 4
+    return int(index.ntotal) * code_size
+
+
+def normalize_category(categoria: str) -> str:
+    return " ".join(fold_accents(categoria).split())
+
+
+def build_partitions(categories: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Linhas de cada categoria (normalizada), em ordem crescente."""
+    grouped: Dict[str, List[int]] = {}
+    for row, categoria in enumerate(categories):
+        grouped.setdefault(normalize_category(categoria), []).append(row)
+    return {name: np.asarray(rows, dtype=np.int64) for name, rows in grouped.items()}
+
+
+def save_partitions(partitions: Dict[str, np.ndarray], path: Path) -> None:
+    names = sorted(partitions)
+    sizes = [len(partitions[name]) for name in names]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    rows = np.concatenate([partitions[name] for name in names]) if names else _NO_ROWS
+    with path.open("wb") as f:
+        np.savez(f, names=np.asarray(names, dtype=str), offsets=offsets, rows=rows)
+
+
+def load_partitions(path: Path) -> Dict[str, np.ndarray]:
+    with np.load(path, allow_pickle=False) as arrays:
+        names, offsets, rows = arrays["names"], arrays["offsets"], arrays["rows"]
+        return {str(name): rows[offsets[idx] : offsets[idx + 1]] for idx, name in enumerate(names)}
+
+
+def partition_search_params(index: faiss.Index, rows: np.ndarray) -> Tuple[Any, Any]:
+    """Parâmetros de busca restritos às ``rows`` (o seletor é devolvido junto para continuar vivo
+    enquanto os parâmetros forem usados)."""
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(rows, dtype=np.int64))
+    params: faiss.SearchParameters
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf_params = faiss.SearchParametersIVF()
+        ivf_params.nprobe = ivf.nprobe
+        params = ivf_params
+    elif hasattr(index, "hnsw"):
+        # Os stubs do faiss não declaram SearchParametersHNSW, embora o módulo exporte
+        hnsw_params = faiss.SearchParametersHNSW()  # type: ignore[attr-defined]
+        hnsw_params.efSearch = index.hnsw.efSearch
+        params = hnsw_params
+    else:
+        params = faiss.SearchParameters()
+    params.sel = selector
+    return params, selector
+
+
+def _exact_search(
+    matrix: np.ndarray,
+    k: int,
+    vectors: np.ndarray,
+    norms: np.ndarray,
+    subset: np.ndarray | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    scores, rows = _empty_result(matrix.shape[0], k)
+    top_k = min(k, int(vectors.shape[0]))
+    if top_k == 0:
+        return scores, rows
+    # ||v - q||^2 = ||v||^2 - 2 v.q + ||q||^2
+    distances = norms[None, :] - 2.0 * (matrix @ vectors.T)
+    distances += np.einsum("ij,ij->i", matrix, matrix)[:, None]
+    np.maximum(distances, 0.0, out=distances)
+    candidates = np.argpartition(distances, top_k - 1, axis=1)[:, :top_k]
+    candidate_scores = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(candidate_scores, axis=1, kind="stable")
+    ranked = np.take_along_axis(candidates, order, axis=1)
+    rows[:, :top_k] = ranked if subset is None else subset[ranked]
+    scores[:, :top_k] = np.take_along_axis(candidate_scores, order, axis=1)
+    return scores, rows
+
+
+def _empty_result(n_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    return (
+        np.full((n_queries, k), np.inf, dtype=np.float32),
+        np.full((n_queries, k), -1, dtype=np.int64),
+    )
+
+
+def _read_index_mmap(path: Path) -> faiss.Index:
+    # Listas invertidas/códigos mapeados em memória quando o tipo de índice suporta
+    try:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(str(path))
+
+
+def _encode_columns(columns: Dict[str, List[str]]) -> Dict[str, Any]:
+    encoded: Dict[str, Any] = {}
+    for field, values in columns.items():
+        if field in DICTIONARY_FIELDS:
+            dictionary = sorted(set(values))
+            positions = {value: code for code, value in enumerate(dictionary)}
+            encoded[field] = {"values": dictionary, "codes": [positions[v] for v in values]}
+        else:
+            encoded[field] = values
+    return encoded
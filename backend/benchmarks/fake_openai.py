@@ -0,0 +1,223 @@
+"""Servidor local compatível com a API da OpenAI (embeddings e chat) para benchmarks.
+
+Responde ``POST /v1/embeddings`` com vetores determinísticos (mesmo texto, mesmo vetor) e
+``POST /v1/chat/completions`` (com e sem ``stream``) com uma resposta fixa, simulando a latência
+do provedor com ``asyncio.sleep``. Assim a carga mede o nosso pipeline, não a rede nem a cota.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Literal
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_ANSWER = (
+    "De acordo com [FONTE: Base simulada] – siga a política de reembolso e registre o atendimento."
+)
+
+
+@dataclass
+class FakeOpenAIConfig:
+    dimension: int = 1536
+    # Latência simulada por requisição (ms), com jitter uniforme de até ``jitter_ms``
+    embedding_latency_ms: float = 0.0
+    chat_latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Intervalo entre tokens no modo stream (ms)
+    token_interval_ms: float = 0.0
+    # Injeta 429 a cada N requisições (0 desativa), com Retry-After de ``retry_after_ms``
+    rate_limit_every: int = 0
+    retry_after_ms: float = 50.0
+    # Limite anunciado nos headers x-ratelimit-* das respostas de sucesso (0 não envia)
+    advertised_rpm: int = 0
+
+
+def fake_embedding(item: Any, dimension: int) -> np.ndarray:
+    """Vetor unitário determinístico derivado do hash do texto (ou da lista de tokens)."""
+    digest = hashlib.sha1(json.dumps(item, ensure_ascii=False).encode("utf-8")).digest()
+    rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+    vector = rng.standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_app(config: FakeOpenAIConfig) -> FastAPI:
+    app = FastAPI(title="fake-openai")
+    app.state.requests = {"embeddings": 0, "chat": 0}
+    app.state.rate_limited = 0
+    calls = {"total": 0}
+
+    @app.middleware("http")
+    async def rate_limit(request: Request, call_next):
+        calls["total"] += 1
+        if config.rate_limit_every and calls["total"] % config.rate_limit_every == 0:
+            app.state.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests"}},
+                headers={
+                    "retry-after-ms": str(int(config.retry_after_ms)),
+                    "retry-after": str(max(1, int(config.retry_after_ms / 1000))),
+                },
+            )
+        response = await call_next(request)
+        if config.advertised_rpm:
+            response.headers["x-ratelimit-limit-requests"] = str(config.advertised_rpm)
+            response.headers["x-ratelimit-remaining-requests"] = str(
+                max(config.advertised_rpm - calls["total"], 0)
+            )
+            response.headers["x-ratelimit-reset-requests"] = "1m0s"
+        return response
+
+    async def _sleep(latency_ms: float) -> None:
+        delay = latency_ms + random.uniform(0.0, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        app.state.requests["embeddings"] += 1
+        raw = body["input"]
+        # Aceita texto, lista de textos, lista de tokens e lista de listas de tokens
+        if isinstance(raw, str) or (raw and isinstance(raw[0], int)):
+            raw = [raw]
+        await _sleep(config.embedding_latency_ms)
+        dimension = int(body.get("dimensions") or config.dimension)
+        data: List[Dict[str, Any]] = []
+        for index, item in enumerate(raw):
+            vector = fake_embedding(item, dimension)
+            encoded: Any = (
+                base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+                if body.get("encoding_format") == "base64"
+                else vector.tolist()
+            )
+            data.append({"object": "embedding", "index": index, "embedding": encoded})
+        tokens = sum(len(str(item).split()) for item in raw)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests["chat"] += 1
+        model = body.get("model", "fake-chat")
+        prompt_tokens = sum(len(str(msg.get("content", "")).split()) for msg in body["messages"])
+        await _sleep(config.chat_latency_ms)
+        completion_tokens = len(FAKE_ANSWER.split())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                _stream(model, usage if include_usage else None), media_type="text/event-stream"
+            )
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": FAKE_ANSWER},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    async def _stream(model: str, usage: Dict[str, int] | None) -> AsyncIterator[str]:
+        for token in FAKE_ANSWER.split(" "):
+            if config.token_interval_ms > 0:
+                await asyncio.sleep(config.token_interval_ms / 1000.0)
+            yield _chunk(model, {"content": token + " "}, None)
+        yield _chunk(model, {}, "stop")
+        if usage is not None:
+            # Com stream_options.include_usage a OpenAI envia um último pedaço só com o uso
+            yield _chunk(model, None, None, usage)
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def _chunk(
+    model: str,
+    delta: Dict[str, str] | None,
+    finish_reason: str | None,
+    usage: Dict[str, int] | None = None,
+) -> str:
+    payload: Dict[str, Any] = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": (
+            [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        ),
+    }
+    if usage is not None:
+        payload["usage"] = usage
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+class ServerThread:
+    """Roda um app ASGI com uvicorn numa thread daemon (``with ServerThread(app) as url: ...``)."""
+
+    def __init__(
+        self, app: Any, port: int | None = None, lifespan: Literal["auto", "on", "off"] = "off"
+    ):
+        self.port = port or free_port()
+        self.server = uvicorn.Server(
+            uvicorn.Config(
+                app, host="127.0.0.1", port=self.port, log_level="warning", lifespan=lifespan
+            )
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> str:
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Servidor não subiu na porta {self.port}.")
+            time.sleep(0.01)
+        return self.url
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10.0)
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -0,0 +1,342 @@
+"""Suíte de benchmark: ingestão, carga do índice, busca e ``/api/chat`` sob concorrência.
+
+Tudo roda contra o servidor fake compatível com OpenAI (latência configurável), com bases
+sintéticas no esquema do CSV real. O resultado é um JSON para comparar commits::
+
+    python -m backend.benchmarks.run --rows 1000,100000 --output bench.json
+    python -m backend.benchmarks.run --rows 1000 --baseline bench.json --output novo.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import httpx
+import numpy as np
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.rag.agent import AgentService
+from backend.app.rag.ingestion import plan_near_duplicates, run_ingestion
+from backend.app.rag.llm_client import LLMClient
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.benchmarks.fake_openai import FakeOpenAIConfig, ServerThread, create_app
+from backend.benchmarks.synthetic import CATEGORIAS, sample_questions, write_synthetic_csv
+
+# Métricas em que um valor maior é melhor (as demais são tempos: menor é melhor)
+HIGHER_IS_BETTER = ("rows_per_second", "qps", "batch_qps", "filtered_qps", "rps")
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, float]:
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if not len(values):
+        return {}
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def bench_ingestion(csv_path: Path, vector_dir: Path, embeddings, batch_size: int, workers: int):
+    start = time.perf_counter()
+    # Sem dedup (o padrão): o custo da passada de quase-duplicatas é medido em bench_dedup
+    _, stats = run_ingestion(
+        csv_path,
+        vector_dir,
+        embeddings=embeddings,
+        batch_size=batch_size,
+        workers=workers,
+        dedup=False,
+    )
+    seconds = time.perf_counter() - start
+    return {
+        "rows": stats.added,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(stats.added / seconds, 1) if seconds else None,
+    }
+
+
+def bench_dedup(csv_path: Path, similarity: float = 0.85) -> Dict[str, Any]:
+    """Custo da passada de quase-duplicatas (opt-in na ingestão): tempo e pico de memória.
+
+    O pico vem de uma segunda passada sob ``tracemalloc``, para não distorcer o tempo medido.
+    """
+    start = time.perf_counter()
+    plan = plan_near_duplicates(csv_path, similarity)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        plan_near_duplicates(csv_path, similarity)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rows = sum(1 for _ in csv_path.open(encoding="utf-8")) - 1
+    return {
+        "rows": rows,
+        "merged": plan.merged,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def bench_load(vector_dir: Path, embeddings) -> tuple[VectorStoreRetriever, Dict[str, Any]]:
+    start = time.perf_counter()
+    retriever = VectorStoreRetriever(embeddings=embeddings, vector_store_path=vector_dir)
+    return retriever, {"seconds": round(time.perf_counter() - start, 4)}
+
+
+def bench_search(
+    retriever: VectorStoreRetriever,
+    questions: Sequence[str],
+    k: int,
+    categoria: str | None = None,
+) -> Dict[str, Any]:
+    """Busca unitária, em lote e (com ``categoria``) filtrada pela partição da categoria."""
+    vectors = retriever.embed_queries(list(questions))
+
+    def _timed(filter_by: str | None) -> List[float]:
+        latencies: List[float] = []
+        for question, vector in zip(questions, vectors, strict=True):
+            start = time.perf_counter()
+            retriever.search_by_vector(vector, k=k, query=question, categoria=filter_by)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    latencies = _timed(None)
+    start = time.perf_counter()
+    retriever.search_batch_by_vectors(vectors, k=k, queries=questions)
+    batch_seconds = time.perf_counter() - start
+    total = sum(latencies)
+    result: Dict[str, Any] = {
+        "queries": len(questions),
+        "qps": round(len(questions) / total, 1) if total else None,
+        "batch_qps": round(len(questions) / batch_seconds, 1) if batch_seconds else None,
+        **latency_summary(latencies),
+    }
+    if categoria is not None:
+        filtered = sum(_timed(categoria))
+        result["filtered_qps"] = round(len(questions) / filtered, 1) if filtered else None
+    return result
+
+
+async def _drive(url: str, questions: Sequence[str], concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120.0, limits=limits) as client:
+
+        async def _one(question: str) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/chat", json={"question": question})
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_one(question) for question in questions))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(questions),
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        **latency_summary(latencies),
+    }
+
+
+def bench_api(agent: AgentService, questions: Sequence[str], concurrency: int) -> Dict[str, Any]:
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    try:
+        with ServerThread(main.app) as url:
+            return asyncio.run(_drive(url, questions, concurrency))
+    finally:
+        main.app.dependency_overrides.pop(get_agent, None)
+
+
+def run_suite(
+    rows: Sequence[int],
+    workdir: Path,
+    fake: FakeOpenAIConfig,
+    queries: int = 200,
+    requests: int = 200,
+    concurrency: int = 16,
+    k: int = 4,
+    batch_size: int = 256,
+    workers: int = 4,
+    response_cache: bool = False,
+) -> Dict[str, Any]:
+    fake_server = ServerThread(create_app(fake))
+    base_url = f"{fake_server.start()}/v1"
+    try:
+        embeddings = OpenAIEmbeddings(
+            model="fake-embedding",
+            api_key="benchmark",  # type: ignore[arg-type]
+            base_url=base_url,
+            check_embedding_ctx_length=False,
+        )
+        llm = ChatOpenAI(model="fake-chat", api_key="benchmark", base_url=base_url)  # type: ignore[arg-type]
+        results: List[Dict[str, Any]] = []
+        for count in rows:
+            size_dir = workdir / f"kb-{count}"
+            csv_path = write_synthetic_csv(size_dir / "kb.csv", count)
+            ingestion = bench_ingestion(
+                csv_path, size_dir / "vector_store", embeddings, batch_size, workers
+            )
+            dedup = bench_dedup(csv_path)
+            retriever, load = bench_load(size_dir / "vector_store", embeddings)
+            search = bench_search(
+                retriever, sample_questions(queries, count), k, categoria=CATEGORIAS[0]
+            )
+            agent = AgentService(
+                retriever=retriever, llm_client=LLMClient(llm=llm), use_fake_override=False
+            )
+            if not response_cache:
+                agent.response_cache = None
+            api = bench_api(agent, sample_questions(requests, count, seed=2), concurrency)
+            results.append(
+                {
+                    "rows": count,
+                    "ingestion": ingestion,
+                    "dedup": dedup,
+                    "load": load,
+                    "search": search,
+                    "api": api,
+                }
+            )
+    finally:
+        fake_server.stop()
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "dimension": fake.dimension,
+            "embedding_latency_ms": fake.embedding_latency_ms,
+            "chat_latency_ms": fake.chat_latency_ms,
+            "jitter_ms": fake.jitter_ms,
+            "queries": queries,
+            "requests": requests,
+            "concurrency": concurrency,
+            "k": k,
+            "batch_size": batch_size,
+            "workers": workers,
+            "response_cache": response_cache,
+        },
+        "results": results,
+    }
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Variação percentual de cada métrica entre relatórios; ``regression`` indica piora."""
+    previous = {item["rows"]: item for item in baseline.get("results", [])}
+    changes: List[Dict[str, Any]] = []
+    for item in current.get("results", []):
+        old = previous.get(item["rows"])
+        if old is None:
+            continue
+        for stage in ("ingestion", "dedup", "load", "search", "api"):
+            for metric, value in item.get(stage, {}).items():
+                before = old.get(stage, {}).get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+                    continue
+                if not before or metric in ("rows", "queries", "requests", "concurrency"):
+                    continue
+                change = (value - before) / before * 100.0
+                worse = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+                changes.append(
+                    {
+                        "rows": item["rows"],
+                        "metric": f"{stage}.{metric}",
+                        "baseline": before,
+                        "current": value,
+                        "change_pct": round(change, 2),
+                        "regression": worse,
+                    }
+                )
+    return changes
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(raw: str) -> List[int]:
+    return [int(value) for value in raw.split(",") if value]
+
+
+def main_cli(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=_int_list, default=[1000], help="ex.: 1000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--response-cache", action="store_true", help="mantém o cache semântico")
+    parser.add_argument("--workdir", type=Path, help="onde gravar bases e índices (padrão: tmp)")
+    parser.add_argument("--baseline", type=Path, help="relatório anterior para comparar")
+    parser.add_argument("--output", type=Path, help="grava o relatório JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    fake = FakeOpenAIConfig(
+        dimension=args.dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        chat_latency_ms=args.chat_latency_ms,
+        jitter_ms=args.jitter_ms,
+    )
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        report = run_suite(
+            args.rows,
+            args.workdir or Path(tmp),
+            fake,
+            queries=args.queries,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            k=args.k,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            response_cache=args.response_cache,
+        )
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        report["comparison"] = compare_reports(baseline, report)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text, file=sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
@@ -0,0 +1,86 @@
+"""Benchmark de startup: tempo de import dos pontos de entrada com orçamento por módulo.
+
+Cada medição roda num processo Python novo (import a frio, como no boot de um pod) e registra
+também quais dependências pesadas foram carregadas. Sai com código 1 se algum módulo estourar
+o orçamento ou carregar uma dependência proibida::
+
+    python -m backend.benchmarks.startup
+    python -m backend.benchmarks.startup --budget backend.app.main=600 --runs 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Orçamento (ms) do import a frio; folga para máquinas de CI mais lentas
+DEFAULT_BUDGETS_MS: Dict[str, float] = {
+    "backend.app.main": 1000.0,
+    "backend.app.rag.ingestion": 750.0,
+}
+# Só devem carregar quando há chamada real ao provedor ou índice no formato LangChain
+FORBIDDEN_MODULES: Tuple[str, ...] = ("openai", "langchain_openai", "langchain_community")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000.0
+heavy = [name for name in {watch!r} if name in sys.modules]
+print(json.dumps({{"ms": elapsed, "loaded": heavy}}))
+"""
+
+
+def measure_import(module: str, runs: int = 3, watch: Sequence[str] = FORBIDDEN_MODULES):
+    """Menor tempo de import (ms) entre ``runs`` processos novos e os módulos vigiados carregados."""
+    timings: List[float] = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, watch=tuple(watch))],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(probe["ms"])
+        loaded = probe["loaded"]
+    return {"module": module, "ms": round(min(timings), 1), "runs": runs, "loaded": loaded}
+
+
+def check_budgets(results: Sequence[Dict[str, Any]], budgets: Dict[str, float]) -> List[str]:
+    violations: List[str] = []
+    for result in results:
+        budget = budgets.get(result["module"])
+        if budget is not None and result["ms"] > budget:
+            violations.append(f"{result['module']}: {result['ms']}ms > orçamento de {budget}ms")
+        if result["loaded"]:
+            violations.append(f"{result['module']}: carregou {', '.join(result['loaded'])}")
+    return violations
+
+
+def _budget(raw: str) -> Tuple[str, float]:
+    module, _, value = raw.partition("=")
+    return module, float(value)
+
+
+def main_cli(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget", type=_budget, action="append", default=[], help="módulo=ms (repetível)"
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    budgets = {**DEFAULT_BUDGETS_MS, **dict(args.budget)}
+    results = [measure_import(module, args.runs) for module in budgets]
+    violations = check_budgets(results, budgets)
+    print(json.dumps({"results": results, "violations": violations}, indent=2, ensure_ascii=False))
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
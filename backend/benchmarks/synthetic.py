@@ -0,0 +1,75 @@
+"""Bases de conhecimento sintéticas no mesmo esquema do CSV real (categoria,pergunta,resposta,fonte)."""
+
+from __future__ import annotations
+
+import csv
+import random
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+CATEGORIAS = ["reembolso", "cancelamento", "financeiro", "fraude", "entrega", "cupom"]
+
+_SITUACOES = [
+    "pedido saiu para entrega",
+    "restaurante cancelou o pedido",
+    "item veio faltando",
+    "pedido chegou frio",
+    "cobrança duplicada no cartão",
+    "estorno não apareceu na fatura",
+    "cupom não foi aplicado",
+    "entregador não encontrou o endereço",
+    "cliente desistiu da compra",
+    "pagamento recusado após confirmação",
+]
+_PEDIDOS = [
+    "Cliente pede reembolso.",
+    "Cliente quer cancelar.",
+    "Cliente pergunta se o estorno é automático.",
+    "Cliente quer saber o prazo de devolução.",
+    "Cliente pede crédito na carteira.",
+]
+_ACOES = [
+    "Reembolsar integralmente se a falha for do restaurante ou do entregador.",
+    "Validar o estorno e abrir ticket financeiro se não constar devolução.",
+    "Oferecer crédito na carteira e registrar o motivo no atendimento.",
+    "Sinalizar antifraude e bloquear até validação.",
+    "Orientar o cliente sobre o prazo de até 2 faturas para o estorno.",
+]
+
+
+def synthetic_rows(count: int, seed: int = 0) -> Iterator[Tuple[str, str, str, str]]:
+    """Gera ``count`` linhas únicas (o número do caso evita ids repetidos; o benchmark de
+    ingestão desliga a deduplicação por similaridade, que agruparia essas linhas)."""
+    rng = random.Random(seed)
+    for row in range(count):
+        categoria = CATEGORIAS[row % len(CATEGORIAS)]
+        situacao = rng.choice(_SITUACOES)
+        pergunta = f"{situacao.capitalize()}. {rng.choice(_PEDIDOS)} Caso {row}."
+        resposta = rng.choice(_ACOES)
+        fonte = f"Política {categoria.capitalize()} {row % 97}"
+        yield categoria, pergunta, resposta, fonte
+
+
+def write_synthetic_csv(path: Path, count: int, seed: int = 0) -> Path:
+    """Grava a base em streaming, sem montar todas as linhas em memória."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["categoria", "pergunta", "resposta", "fonte"])
+        writer.writerows(synthetic_rows(count, seed))
+    return path
+
+
+def sample_questions(count: int, kb_rows: int, seed: int = 1) -> List[str]:
+    """Perguntas de carga: cenários da base reescritos, mais algumas fora do escopo."""
+    rng = random.Random(seed)
+    questions: List[str] = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            questions.append("Como está a previsão do tempo amanhã?")
+            continue
+        case = rng.randrange(max(kb_rows, 1))
+        questions.append(
+            f"{rng.choice(_SITUACOES).capitalize()}, {rng.choice(_PEDIDOS).lower()} (caso {case})"
+        )
+    return questions
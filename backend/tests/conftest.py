@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterator
+
+import pytest
+
+from backend.app.core.config import Settings, get_settings
+
+# Variáveis lidas pelas Settings (BaseSettings) e pelo SDK da OpenAI
+_SETTINGS_ENV_PREFIXES = ("AGENT_", "OPENAI_")
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """Cada teste começa só com os padrões das Settings: sem ``.env`` e sem ``OPENAI_*``/``AGENT_*``
+    do shell, que levariam os testes a usar o cliente da OpenAI e fazer chamadas de rede."""
+    for key in list(os.environ):
+        if key.startswith(_SETTINGS_ENV_PREFIXES):
+            monkeypatch.delenv(key)
+    monkeypatch.setitem(Settings.model_config, "env_file", None)
+    get_settings.cache_clear()
+    yield
+    # Remove o que o teste definiu direto em os.environ; o monkeypatch devolve os valores do shell
+    for key in list(os.environ):
+        if key.startswith(_SETTINGS_ENV_PREFIXES):
+            del os.environ[key]
+    get_settings.cache_clear()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from backend.app.core.config import Settings
+from backend.app.rag.index_benchmark import run_benchmark, sample_queries, synthetic_vectors
+from backend.app.rag.vector_store import (
+    NativeVectorStore,
+    ann_factory_string,
+    write_native_store,
+)
+
+
+def _faiss_store(vectors: np.ndarray) -> FAISS:
+    texts = [f"doc {idx}" for idx in range(len(vectors))]
+    metadatas = [
+        {"id": f"doc-{idx}", "categoria": "reembolso", "fonte": "F", "pergunta": t, "resposta": t}
+        for idx, t in enumerate(texts)
+    ]
+    return FAISS.from_embeddings(
+        list(zip(texts, vectors.tolist(), strict=True)),
+        FakeEmbeddings(size=vectors.shape[1]),
+        metadatas,
+    )
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw", "ivf_pq"])
+def test_native_store_builds_and_loads_ann_index(tmp_path: Path, index_type: str):
+    settings = Settings(index_type=index_type, ivf_nlist=8, ivf_nprobe=8, pq_m=8, pq_nbits=4)
+    vectors = synthetic_vectors(600, 32, clusters=8)
+    write_native_store(_faiss_store(vectors), tmp_path, generation=1, settings=settings)
+
+    store = NativeVectorStore.load(tmp_path, settings)
+    assert store.index_type == index_type
+    queries = sample_queries(vectors, 20)
+    _, exact_rows = store.exact_search(queries, 1)
+    _, ann_rows = store.search(queries, 1)
+    agreement = float(np.mean(exact_rows[:, 0] == ann_rows[:, 0]))
+    assert agreement >= (0.6 if index_type == "ivf_pq" else 0.9)
+
+
+def test_ann_falls_back_to_flat_without_enough_training_data():
+    settings = Settings(pq_nbits=8)
+    assert ann_factory_string("ivf_pq", 100, settings) is None
+    assert ann_factory_string("ivf_flat", 100, settings) == "IVF2,Flat"
+    with pytest.raises(ValueError):
+        ann_factory_string("lsh", 100, settings)
+
+
+def test_benchmark_reports_recall_qps_and_memory():
+    settings = Settings(ivf_nlist=16, hnsw_m=8)
+    vectors = synthetic_vectors(1000, 16, clusters=16)
+    results = run_benchmark(
+        vectors,
+        sample_queries(vectors, 50),
+        k=4,
+        index_types=["flat", "ivf_flat", "hnsw"],
+        settings=settings,
+        nprobes=[1, 16],
+    )
+    by_type = {(r["index_type"], r.get("nprobe")): r for r in results}
+    assert by_type[("flat", None)]["recall_at_k"] == 1.0
+    assert by_type[("ivf_flat", 16)]["recall_at_k"] >= by_type[("ivf_flat", 1)]["recall_at_k"]
+    assert all(r["memory_bytes"] > 0 and r["qps"] for r in results)
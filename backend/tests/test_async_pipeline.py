@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.rag.agent import AgentService
+from backend.app.rag.llm_client import FALLBACK_MESSAGE, LLMClient
+from backend.tests.test_ingestion_and_retrieval import (
+    EchoLLM,
+    make_retriever,
+    prepare_vector_store,
+)
+
+
+class AsyncEchoLLM(EchoLLM):
+    async def agenerate(self, question: str, sources):
+        return "async:" + self.generate(question, sources)
+
+
+def test_aanswer_matches_sync_answer(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    question = "Restaurante cancelou por falta de ingrediente. Reembolso é automático?"
+    # Mesmo retriever: o cache de embeddings garante o mesmo vetor (FakeEmbeddings é aleatório)
+    retriever = make_retriever(vector_dir)
+    sync_agent = AgentService(retriever=retriever, llm_client=EchoLLM(), use_fake_override=True)
+    async_agent = AgentService(retriever=retriever, llm_client=EchoLLM(), use_fake_override=True)
+    expected = sync_agent.answer(question)
+    response = asyncio.run(async_agent.aanswer(question))
+    assert response.answer == expected.answer
+    assert [s.id for s in response.sources] == [s.id for s in expected.sources]
+
+
+def test_chat_route_uses_async_generation(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    agent = AgentService(
+        retriever=make_retriever(vector_dir), llm_client=AsyncEchoLLM(), use_fake_override=True
+    )
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    try:
+        response = TestClient(main.app).post(
+            "/api/chat", json={"question": "Cliente foi cobrado após cancelamento"}
+        )
+    finally:
+        main.app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.json()["answer"].startswith("async:")
+
+
+def test_llm_client_agenerate_offline_matches_generate():
+    client = LLMClient()
+    assert client.offline_mode is True
+    assert asyncio.run(client.agenerate("pergunta", [])) == client.generate("pergunta", [])
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_emits_sources_tokens_and_done(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    agent = AgentService(
+        retriever=make_retriever(vector_dir), llm_client=LLMClient(), use_fake_override=True
+    )
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    try:
+        response = TestClient(main.app).post(
+            "/api/chat/stream",
+            json={"question": "Pedido saiu para entrega, cliente quer reembolso"},
+        )
+    finally:
+        main.app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert events[0][0] == "sources"
+    assert events[0][1]["sources"]
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens).startswith("Resposta baseada na base simulada")
+    assert events[-1] == ("done", {"is_fallback": False})
+
+
+def test_chat_stream_reports_midstream_failure_with_error_and_done():
+    class FailingAgent:
+        async def astream(self, question, categoria=None, session_id=None):
+            yield "sources", {"sources": [], "similarity_scores": []}
+            raise RuntimeError("LLM caiu")
+
+    main.app.dependency_overrides[get_agent] = lambda: FailingAgent()
+    try:
+        response = TestClient(main.app).post("/api/chat/stream", json={"question": "Pedido?"})
+    finally:
+        main.app.dependency_overrides.clear()
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["sources", "error", "done"]
+    assert events[1][1]["detail"] == "RuntimeError: LLM caiu"
+    assert events[2][1] == {"is_fallback": True, "error": True}
+
+
+def test_stream_out_of_scope_yields_fallback():
+    class NoRetriever:
+        def search(self, query: str, k: int | None = None):
+            raise AssertionError("não deveria buscar")
+
+    agent = AgentService(retriever=NoRetriever(), llm_client=EchoLLM(), use_fake_override=True)
+
+    async def collect():
+        return [event async for event in agent.astream("Como está a previsão do tempo amanhã?")]
+
+    events = asyncio.run(collect())
+    assert [name for name, _ in events] == ["sources", "token", "done"]
+    assert events[1][1]["text"] == FALLBACK_MESSAGE
+    assert events[2][1]["is_fallback"] is True
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.rag.agent import AgentService
+from backend.tests.test_ingestion_and_retrieval import (
+    EchoLLM,
+    make_retriever,
+    prepare_vector_store,
+)
+
+
+def test_search_batch_matches_single_searches(tmp_path: Path):
+    retriever = make_retriever(prepare_vector_store(tmp_path))
+    queries = ["reembolso após saída", "falta de ingrediente", "cobrança indevida"]
+    batched = retriever.search_batch(queries, k=2)
+    for query, results in zip(queries, batched, strict=True):
+        single = retriever.search(query, k=2)
+        assert [doc.metadata["id"] for doc, _ in results] == [
+            doc.metadata["id"] for doc, _ in single
+        ]
+
+
+def test_search_batch_embeds_all_questions_in_one_call(tmp_path: Path):
+    retriever = make_retriever(prepare_vector_store(tmp_path))
+    calls = []
+    embed_documents = retriever.embeddings.embed_documents
+
+    def counting_embed_documents(texts):
+        calls.append(list(texts))
+        return embed_documents(texts)
+
+    object.__setattr__(retriever.embeddings, "embed_documents", counting_embed_documents)
+    retriever.search_batch(["reembolso", "cancelamento", "reembolso"], k=1)
+    assert calls == [["reembolso", "cancelamento", "reembolso"]]
+    retriever.search_batch(["reembolso", "estorno"], k=1)
+    assert calls[-1] == ["estorno"]
+
+
+def test_batch_returns_ordered_results_with_item_errors(tmp_path: Path):
+    class FlakyLLM(EchoLLM):
+        async def agenerate(self, question: str, sources):
+            if "fraude" in question:
+                raise RuntimeError("upstream indisponível")
+            await asyncio.sleep(0)
+            return self.generate(question, sources)
+
+    retriever = make_retriever(prepare_vector_store(tmp_path))
+    agent = AgentService(retriever=retriever, llm_client=FlakyLLM(), use_fake_override=True)
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    questions = [
+        "Pedido saiu para entrega, cliente quer reembolso",
+        "Como está a previsão do tempo amanhã?",
+        "ok",
+        "Tentativa de fraude com múltiplos reembolsos",
+        "Cliente foi cobrado após cancelamento",
+    ]
+    try:
+        response = TestClient(main.app).post("/api/chat/batch", json={"questions": questions})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["index"] for item in results] == list(range(len(questions)))
+    assert questions[0] in results[0]["response"]["answer"]
+    assert results[1]["response"]["is_fallback"] is True
+    assert results[2]["error"]
+    assert "upstream indisponível" in results[3]["error"]
+    assert questions[4] in results[4]["response"]["answer"]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+
+import numpy as np
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.llm_client import LLMClient
+from backend.benchmarks.fake_openai import (
+    FAKE_ANSWER,
+    FakeOpenAIConfig,
+    ServerThread,
+    create_app,
+)
+from backend.benchmarks.run import compare_reports, run_suite
+from backend.benchmarks.synthetic import write_synthetic_csv
+
+
+def test_fake_server_speaks_the_openai_protocol():
+    app = create_app(FakeOpenAIConfig(dimension=32))
+    with ServerThread(app) as url:
+        embeddings = OpenAIEmbeddings(
+            model="fake", api_key="x", base_url=f"{url}/v1", check_embedding_ctx_length=False
+        )
+        first, second = embeddings.embed_documents(["reembolso", "cancelamento"])
+        assert len(first) == 32
+        assert np.allclose(embeddings.embed_query("reembolso"), first, atol=1e-6)
+        assert not np.allclose(first, second)
+
+        client = LLMClient(llm=ChatOpenAI(model="fake", api_key="x", base_url=f"{url}/v1"))
+        source = RetrievedSource(
+            id="1", fonte="F", categoria="reembolso", pergunta="p", resposta="r", score=0.0
+        )
+        assert client.generate("Cliente quer reembolso", [source]) == FAKE_ANSWER
+    assert app.state.requests == {"embeddings": 2, "chat": 1}
+
+
+def test_synthetic_kb_uses_the_business_schema(tmp_path: Path):
+    path = write_synthetic_csv(tmp_path / "kb.csv", 25)
+    with path.open(encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["categoria", "pergunta", "resposta", "fonte"]
+    assert len(rows) == 25
+    assert len({row["pergunta"] for row in rows}) == 25
+
+
+def test_run_suite_reports_every_stage(tmp_path: Path):
+    report = run_suite(
+        [120],
+        tmp_path,
+        FakeOpenAIConfig(dimension=16),
+        queries=10,
+        requests=12,
+        concurrency=3,
+        batch_size=50,
+        workers=2,
+    )
+    result = report["results"][0]
+    assert result["ingestion"]["rows"] == 120
+    assert result["dedup"]["rows"] == 120 and result["dedup"]["peak_mb"] > 0
+    assert result["search"]["queries"] == 10
+    assert result["api"]["errors"] == 0
+    assert result["api"]["requests"] == 12
+    assert {"p50_ms", "p99_ms"} <= set(result["api"])
+
+    slower = {
+        "results": [{**result, "search": {**result["search"], "qps": result["search"]["qps"] / 2}}]
+    }
+    changes = {item["metric"]: item for item in compare_reports(report, slower)}
+    assert changes["search.qps"]["regression"] is True
+    assert changes["search.qps"]["change_pct"] == -50.0
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from backend.app.models.schemas import ChatResponse
+from backend.app.rag.agent import AgentService
+from backend.app.rag.cache import EmbeddingCache, ResponseCache
+from backend.tests.test_ingestion_and_retrieval import (
+    EchoLLM,
+    make_retriever,
+    prepare_vector_store,
+)
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    calls: int = 0
+
+    def embed_query(self, text: str):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+def test_embedding_cache_lru_eviction_and_counters():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("m", "Reembolso pedido", [0.1, 0.2])
+    cache.put("m", "cancelamento", [0.3, 0.4])
+    assert cache.get("m", "  reembolso   PEDIDO ") is not None
+    cache.put("m", "estorno", [0.5, 0.6])
+    assert cache.get("m", "cancelamento") is None
+    assert cache.get("outro-modelo", "reembolso pedido") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert len(cache) == 2
+
+
+def test_embedding_cache_persists_between_instances(tmp_path: Path):
+    db_path = tmp_path / "cache" / "embeddings.sqlite"
+    cache = EmbeddingCache(persist_path=db_path, write_batch=8)
+    for idx in range(20):
+        cache.put("m", f"pergunta {idx}", [float(idx)])
+    cache.put("m", "estorno", [0.25, 0.5])
+    # put só enfileira; a thread de gravação faz um commit por lote
+    cache.flush()
+    restored = EmbeddingCache(persist_path=db_path)
+    assert restored.get("m", "Estorno") == [0.25, 0.5]
+    assert restored.get("m", "pergunta 19") == [19.0]
+    assert restored.disk_hits == 2
+    cache.close()
+    restored.close()
+
+
+def test_retriever_skips_embedding_call_for_repeated_question(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    retriever = make_retriever(vector_dir)
+    embeddings = CountingEmbeddings(size=1536)
+    retriever.embeddings = embeddings
+    retriever.search("Cliente quer reembolso", k=1)
+    retriever.search("cliente quer  reembolso", k=1)
+    assert embeddings.calls == 1
+    assert retriever.embedding_cache.stats()["hits"] == 1
+
+
+def _response(answer: str) -> ChatResponse:
+    return ChatResponse(answer=answer, is_fallback=False, sources=[])
+
+
+def test_response_cache_matches_similar_vectors_only():
+    cache = ResponseCache(similarity=0.9)
+    cache.store([1.0, 0.0, 0.0], _response("estorno"), generation=1)
+    assert cache.lookup([0.98, 0.05, 0.0], generation=1).answer == "estorno"
+    assert cache.lookup([0.0, 1.0, 0.0], generation=1) is None
+
+
+def test_response_cache_invalidates_on_generation_and_ttl():
+    cache = ResponseCache(similarity=0.9)
+    cache.store([1.0, 0.0], _response("estorno"), generation=1)
+    assert cache.lookup([1.0, 0.0], generation=2) is None
+    assert len(cache) == 0
+
+    expiring = ResponseCache(ttl=0.0)
+    expiring.store([1.0, 0.0], _response("estorno"), generation=1)
+    assert expiring.lookup([1.0, 0.0], generation=1) is None
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_size=2, similarity=0.99)
+    cache.store([1.0, 0.0, 0.0], _response("a"), generation=1)
+    cache.store([0.0, 1.0, 0.0], _response("b"), generation=1)
+    cache.lookup([1.0, 0.0, 0.0], generation=1)
+    cache.store([0.0, 0.0, 1.0], _response("c"), generation=1)
+    assert cache.lookup([0.0, 1.0, 0.0], generation=1) is None
+    assert cache.lookup([1.0, 0.0, 0.0], generation=1).answer == "a"
+
+
+def test_agent_serves_repeated_question_from_response_cache(tmp_path: Path):
+    class CountingLLM(EchoLLM):
+        calls = 0
+
+        def generate(self, question: str, sources):
+            self.calls += 1
+            return super().generate(question, sources)
+
+    vector_dir = prepare_vector_store(tmp_path)
+    llm = CountingLLM()
+    agent = AgentService(
+        retriever=make_retriever(vector_dir), llm_client=llm, use_fake_override=True
+    )
+    first = agent.answer("Cliente quer reembolso do pedido")
+    second = agent.answer("cliente quer reembolso do pedido")
+    assert second == first
+    assert llm.calls == 1
+    assert agent.response_cache is not None
+    assert agent.response_cache.stats()["hits"] == 1
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.core.config import Settings
+from backend.app.rag.agent import AgentService
+from backend.app.rag.index_benchmark import sample_queries, synthetic_vectors
+from backend.app.rag.vector_store import (
+    NATIVE_PARTITIONS,
+    NativeVectorStore,
+    index_bytes,
+    store_dir,
+    write_native_store,
+)
+from backend.tests.test_ingestion_and_retrieval import (
+    EchoLLM,
+    make_retriever,
+    prepare_vector_store,
+)
+
+
+def _faiss_store(vectors: np.ndarray, categories) -> FAISS:
+    texts = [f"doc {idx}" for idx in range(len(vectors))]
+    metadatas = [
+        {"id": f"doc-{idx}", "categoria": categoria, "fonte": "F", "pergunta": t, "resposta": t}
+        for idx, (t, categoria) in enumerate(zip(texts, categories, strict=True))
+    ]
+    return FAISS.from_embeddings(
+        list(zip(texts, vectors.tolist(), strict=True)),
+        FakeEmbeddings(size=vectors.shape[1]),
+        metadatas,
+    )
+
+
+def test_ingestion_writes_partitions_and_filtered_search_stays_in_category(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    assert (store_dir(vector_dir) / NATIVE_PARTITIONS).exists()
+    store = NativeVectorStore.load(vector_dir)
+    assert sorted(store.partitions) == ["cancelamento", "financeiro", "fraude", "reembolso"]
+
+    query = np.asarray(store.vectors[:1])
+    _, rows = store.search(query, 4, categoria="Financeiro")
+    found = [int(row) for row in rows[0] if row != -1]
+    assert len(found) == 1
+    assert store.metadata(found[0])["categoria"] == "financeiro"
+    _, rows = store.search(query, 4, categoria="inexistente")
+    assert (rows == -1).all()
+
+
+def test_partition_search_matches_exact_search_over_the_category(tmp_path: Path):
+    vectors = synthetic_vectors(400, 16, clusters=4)
+    categories = ["reembolso" if idx % 3 else "fraude" for idx in range(len(vectors))]
+    settings = Settings(index_type="ivf_flat", ivf_nlist=4, ivf_nprobe=4)
+    write_native_store(_faiss_store(vectors, categories), tmp_path, generation=1, settings=settings)
+    queries = sample_queries(vectors, 10)
+
+    exact = NativeVectorStore.load(tmp_path, settings)
+    approximate = NativeVectorStore.load(
+        tmp_path, Settings(**{**settings.model_dump(), "partition_exact_max_rows": 0})
+    )
+    _, exact_rows = exact.search(queries, 5, categoria="fraude")
+    _, ann_rows = approximate.search(queries, 5, categoria="fraude")
+    assert all(categories[row] == "fraude" for row in ann_rows.ravel() if row != -1)
+    np.testing.assert_array_equal(exact_rows, ann_rows)
+
+
+def test_chat_request_category_filters_sources(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    agent = AgentService(
+        retriever=make_retriever(vector_dir), llm_client=EchoLLM(), use_fake_override=True
+    )
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    try:
+        client = TestClient(main.app)
+        question = "Cliente quer reembolso do pedido"
+        unfiltered = client.post("/api/chat", json={"question": question}).json()
+        filtered = client.post(
+            "/api/chat", json={"question": question, "categoria": "fraude"}
+        ).json()
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert {src["categoria"] for src in filtered["sources"]} == {"fraude"}
+    # A resposta sem filtro em cache não é reaproveitada para a busca filtrada
+    assert len(unfiltered["sources"]) > len(filtered["sources"])
+
+
+def test_filtered_exact_search_is_no_slower_than_unfiltered(tmp_path: Path):
+    vectors = synthetic_vectors(20_000, 64, clusters=16)
+    # Categorias intercaladas: linhas da partição não são consecutivas no arquivo
+    categories = [
+        ("reembolso", "fraude", "cancelamento", "financeiro")[idx % 4]
+        for idx in range(len(vectors))
+    ]
+    write_native_store(_faiss_store(vectors, categories), tmp_path, generation=1)
+    store = NativeVectorStore.load(tmp_path)
+    queries = sample_queries(vectors, 50)
+
+    def best_of(categoria: str | None) -> float:
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for query in queries:
+                store.search(query[None, :], 4, categoria=categoria)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    best_of("fraude")
+    assert best_of("fraude") <= best_of(None)
+
+
+def test_partitions_are_materialized_only_with_ann_index_and_counted(tmp_path: Path):
+    vectors = synthetic_vectors(400, 16, clusters=4)
+    # Intercaladas: a partição não é uma fatia do mmap, então materializar é copiar
+    categories = ["reembolso" if idx % 3 else "fraude" for idx in range(len(vectors))]
+    settings = Settings(index_type="ivf_flat", ivf_nlist=4, ivf_nprobe=4)
+    write_native_store(_faiss_store(vectors, categories), tmp_path, generation=1, settings=settings)
+
+    store = NativeVectorStore.load(tmp_path, settings)
+    copies = sum(
+        int(matrix.nbytes) + int(norms.nbytes)
+        for matrix, norms in store._partition_matrices.values()
+    )
+    assert copies > 0
+    assert store.ann_index is not None
+
+    # Sem índice aproximado nada sai do mmap; a busca filtrada junta as linhas por consulta
+    flat = NativeVectorStore(
+        store.header, store.vectors, store.norms, store.table, None, store.lexical, store.partitions
+    )
+    assert flat._partition_matrices == {}
+    _, rows = flat.search(sample_queries(vectors, 3), 5, categoria="fraude")
+    assert all(categories[row] == "fraude" for row in rows.ravel() if row != -1)
+
+    assert store.memory_bytes == flat.memory_bytes + index_bytes(store.ann_index) + copies
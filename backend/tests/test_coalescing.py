@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_core.messages import AIMessage
+
+from backend.app.core import metrics
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.coalesce import SingleFlight
+from backend.app.rag.llm_client import LLMClient
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.app.rag.vector_store import store_dir
+from backend.tests.test_ingestion_and_retrieval import prepare_vector_store
+
+
+class SlowEmbeddings(FakeEmbeddings):
+    calls: int = 0
+
+    async def aembed_query(self, text: str):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return self.embed_query(text)
+
+
+class SlowLLM:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return AIMessage(content=f"resposta {self.calls}")
+
+
+def test_sync_waiters_share_the_leader_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return "ok"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do("k", upstream))) for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flights.coalesced < 5 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["ok"] * 6
+    assert len(calls) == 1
+    assert len(flights) == 0
+
+
+def test_async_errors_reach_every_waiter_and_are_not_cached():
+    flights = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise TimeoutError("upstream caiu")
+
+    async def scenario():
+        outcomes = await asyncio.gather(
+            *(flights.ado("k", failing) for _ in range(4)), return_exceptions=True
+        )
+        assert all(isinstance(outcome, TimeoutError) for outcome in outcomes)
+        with pytest.raises(TimeoutError):
+            await flights.ado("k", failing)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_identical_concurrent_questions_share_embedding_and_generation(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    embeddings = SlowEmbeddings(size=1536)
+    retriever = VectorStoreRetriever(
+        vector_store=FAISS.load_local(
+            str(store_dir(vector_dir)), embeddings, allow_dangerous_deserialization=True
+        ),
+        embeddings=embeddings,
+    )
+    llm = SlowLLM()
+    client = LLMClient(llm=llm)  # type: ignore[arg-type]
+    source = RetrievedSource(
+        id="1", fonte="F", categoria="reembolso", pergunta="p", resposta="r", score=0.0
+    )
+    coalesced = metrics.COALESCED.value(kind="generation")
+
+    async def scenario():
+        questions = ["Pedido cancelado, cliente quer estorno"] * 4
+        questions += ["  pedido CANCELADO, cliente quer estorno "] * 4
+        vectors = await asyncio.gather(*(retriever.aembed_query(q) for q in questions))
+        answers = await asyncio.gather(*(client.agenerate(q, [source]) for q in questions))
+        return vectors, answers
+
+    vectors, answers = asyncio.run(scenario())
+    assert embeddings.calls == 1
+    assert all(vector == vectors[0] for vector in vectors)
+    assert llm.calls == 1
+    assert answers == ["resposta 1"] * 8
+    assert metrics.COALESCED.value(kind="generation") == coalesced + 7
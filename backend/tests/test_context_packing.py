@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from backend.app.core import metrics
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.context import TRUNCATION_MARK, ContextPacker, TokenCounter
+from backend.app.rag.llm_client import LLMClient
+
+
+def make_source(idx: int, resposta: str, pergunta: str | None = None) -> RetrievedSource:
+    return RetrievedSource(
+        id=str(idx),
+        fonte=f"Política {idx}",
+        categoria="reembolso",
+        pergunta=pergunta or f"Cenário número {idx} de reembolso.",
+        resposta=resposta,
+        score=float(idx),
+    )
+
+
+def test_packer_drops_redundant_sources_and_keeps_retrieval_order():
+    sources = [
+        make_source(1, "Reembolsar integralmente se a falha for do restaurante."),
+        make_source(2, "Abrir ticket financeiro quando o estorno não constar na fatura."),
+        # Mesma passagem da fonte 1 com outra fonte/caixa: redundante
+        make_source(
+            3,
+            "Reembolsar integralmente se a falha for do RESTAURANTE.",
+            pergunta="Cenário número 1 de reembolso.",
+        ),
+    ]
+    packed = ContextPacker(TokenCounter()).pack(sources)
+    assert [src.id for src in packed.sources] == ["1", "2"]
+    assert packed.duplicates == 1
+    assert packed.text.index("Política 1") < packed.text.index("Política 2")
+    assert packed.tokens == TokenCounter().count(packed.text)
+
+
+def test_packer_respects_total_and_per_source_budgets():
+    long_answer = " ".join(f"passo{i} validar estorno" for i in range(200))
+    sources = [make_source(idx, f"{long_answer} variante {idx}") for idx in range(6)]
+    counter = TokenCounter()
+    # Limiar > 1 desativa a deduplicação: só o orçamento decide o que entra
+    packed = ContextPacker(
+        counter, max_tokens=300, source_max_tokens=120, dedup_similarity=1.01
+    ).pack(sources)
+    assert packed.tokens <= 300
+    assert counter.count(packed.text) <= 300
+    assert packed.truncated == len(packed.sources)
+    assert all(block.endswith(TRUNCATION_MARK.strip()) for block in packed.text.split("\n\n"))
+    assert packed.dropped and len(packed.sources) + len(packed.dropped) == len(sources)
+
+
+def test_llm_client_reports_context_tokens():
+    client = LLMClient(
+        llm=object(),  # type: ignore[arg-type]
+        packer=ContextPacker(TokenCounter(), max_tokens=50, source_max_tokens=50),
+    )
+    observed = metrics.CONTEXT_TOKENS.count()
+    dropped = metrics.CONTEXT_SOURCES.value(outcome="dropped")
+    sources = [
+        make_source(1, "Validar estorno e abrir ticket financeiro " * 3),
+        make_source(2, "Reembolsar integralmente quando a falha for do entregador " * 3),
+        make_source(3, "Sinalizar antifraude e bloquear até validação " * 3),
+    ]
+    messages = client.build_messages("Cliente quer estorno", sources)
+    assert "Política 1" in messages[1].content and "Política 3" not in messages[1].content
+    assert metrics.CONTEXT_TOKENS.count() == observed + 1
+    assert metrics.CONTEXT_SOURCES.value(outcome="dropped") > dropped
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from backend.app.rag.dedup import NearDuplicateDetector
+from backend.app.rag.ingestion import read_manifest, run_ingestion
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.tests.test_ingestion_and_retrieval import BUSINESS_CSV, prepare_vector_store
+
+REFUND = (
+    "Cliente recebeu o pedido frio e incompleto e pede reembolso integral pelo aplicativo "
+    "depois de reclamar com o restaurante parceiro"
+)
+RESPOSTA = "Reembolsar integralmente se a falha for do restaurante."
+PARAPHRASES = [
+    f"reembolso,{REFUND}.,Reembolsar integralmente se a falha for do restaurante.,Export A\n",
+    f"reembolso,{REFUND}!,Reembolsar integralmente se a falha for do restaurante.,Export B\n",
+    f"reembolso,{REFUND} hoje.,Reembolsar integralmente se a falha for do restaurante.,Export C\n",
+]
+
+
+def test_detector_groups_paraphrases_within_the_same_category():
+    detector = NearDuplicateDetector(threshold=0.85)
+    assert detector.add(0, "reembolso", "A", REFUND, RESPOSTA) is None
+    assert detector.add(1, "reembolso", "B", REFUND + " hoje", RESPOSTA) == 0
+    assert detector.add(2, "reembolso", "A", REFUND.upper(), RESPOSTA.upper()) == 0
+    # Mesmo texto em outra categoria e texto sem relação não são agrupados
+    assert detector.add(3, "cancelamento", "C", REFUND, RESPOSTA) is None
+    assert detector.add(4, "reembolso", "D", "Entregador não encontrou o endereço", "") is None
+
+    assert detector.plan.merged == 2
+    assert detector.plan.duplicates == {1: 0, 2: 0}
+    assert detector.plan.fonte(0, "A") == "A; B"
+    assert detector.plan.fonte(4, "D") == "D"
+
+
+def test_rows_that_differ_only_by_a_number_are_not_merged():
+    detector = NearDuplicateDetector(threshold=0.85)
+    pergunta = "Cliente pergunta em quanto tempo recebe o reembolso do pedido cancelado"
+    assert (
+        detector.add(0, "reembolso", "Política A", pergunta, "Reembolso em até 7 dias úteis.")
+        is None
+    )
+    assert (
+        detector.add(1, "reembolso", "Política B", pergunta, "Reembolso em até 30 dias úteis.")
+        is None
+    )
+    # Na pergunta o número também conta: shingles guardam dígitos e palavras curtas
+    assert set(detector.shingles("prazo de 7 dias").tolist()) != set(
+        detector.shingles("prazo de 30 dias").tolist()
+    )
+    assert detector.plan.duplicates == {}
+
+
+def test_ingestion_collapses_near_duplicates_keeping_all_sources(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("AGENT_INGESTION_DEDUP", "true")
+    vector_dir = prepare_vector_store(tmp_path, BUSINESS_CSV + "".join(PARAPHRASES))
+    manifest = read_manifest(vector_dir)
+    assert manifest is not None and len(manifest["ids"]) == 5
+
+    retriever = VectorStoreRetriever(vector_store_path=vector_dir)
+    docs = retriever.search(REFUND, k=5)
+    top = docs[0][0].metadata
+    assert top["fonte"] == "Export A; Export B; Export C"
+    assert sum(REFUND in doc.metadata["pergunta"] for doc, _ in docs) == 1
+
+    _, stats = run_ingestion(tmp_path / "sample.csv", tmp_path / "sem_dedup", dedup=False)
+    assert (stats.added, stats.merged) == (7, 0)
+
+
+def test_dedup_is_opt_in(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path, BUSINESS_CSV + "".join(PARAPHRASES))
+    manifest = read_manifest(vector_dir)
+    assert manifest is not None and len(manifest["ids"]) == 7
+
+
+def test_incremental_ingestion_reports_merged_rows_and_updates_canonical(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("AGENT_INGESTION_DEDUP", "true")
+    vector_dir = prepare_vector_store(tmp_path, BUSINESS_CSV + "".join(PARAPHRASES[:2]))
+    _, stats = run_ingestion(tmp_path / "sample.csv", vector_dir, incremental=True)
+    assert (stats.added, stats.removed, stats.unchanged, stats.merged) == (0, 0, 5, 1)
+
+    # Uma nova paráfrase muda as fontes da canônica: o id dela é trocado, o resto fica
+    csv_path = tmp_path / "sample.csv"
+    csv_path.write_text(BUSINESS_CSV + "".join(PARAPHRASES), encoding="utf-8")
+    vector_store, stats = run_ingestion(csv_path, vector_dir, incremental=True)
+    assert (stats.added, stats.removed, stats.unchanged, stats.merged) == (1, 1, 4, 2)
+    assert vector_store.index.ntotal == 5
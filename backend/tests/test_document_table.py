@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import tracemalloc
+from pathlib import Path
+
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_core.documents import Document
+
+from backend.app.rag.agent import AgentService
+from backend.app.rag.retriever import RankedRows, VectorStoreRetriever
+from backend.app.rag.vector_store import DocumentTable, NativeVectorStore, format_content
+from backend.tests.test_ingestion_and_retrieval import EchoLLM, prepare_vector_store
+
+
+def _columns(n: int):
+    return {
+        "id": [f"doc-{row:016x}" for row in range(n)],
+        "categoria": [("reembolso", "cancelamento", "financeiro")[row % 3] for row in range(n)],
+        "fonte": [f"Política {row % 5}" for row in range(n)],
+        "pergunta": [f"Cliente relata problema número {row} com o pedido." for row in range(n)],
+        "resposta": [
+            f"Verificar o status do pedido {row} e orientar o estorno." for row in range(n)
+        ],
+    }
+
+
+def test_table_is_compact_and_matches_documents():
+    columns = _columns(3000)
+
+    tracemalloc.start()
+    docs = [
+        Document(
+            id=values[0],
+            page_content=format_content(values[2], values[1], values[3], values[4]),
+            metadata=dict(zip(columns, values, strict=True)),
+        )
+        for values in zip(*columns.values(), strict=True)
+    ]
+    docs_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    table = DocumentTable.from_columns(columns)
+    table_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert table_bytes * 4 < docs_bytes
+    assert len(table) == 3000
+    assert table.document(1234) == docs[1234]
+    assert table.row_of("doc-00000000000004d2") == 1234
+    assert table.row_of("doc-inexistente") is None
+    # Strings internadas: a mesma categoria é o mesmo objeto em todas as linhas
+    assert table.categoria[0] is table.categoria[3]
+
+
+def test_search_returns_rows_materialized_from_table(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    retriever = VectorStoreRetriever(
+        embeddings=FakeEmbeddings(size=1536), vector_store_path=vector_dir
+    )
+    assert isinstance(retriever.vector_store, NativeVectorStore)
+
+    found = retriever.search_rows_by_vectors(
+        [retriever.embed_query("estorno")], k=2, queries=["estorno"]
+    )[0]
+    assert isinstance(found, RankedRows)
+    docs = retriever.search("estorno", k=2)
+    assert [doc.metadata["id"] for doc, _ in docs] == [src.id for src in found.sources()]
+    assert found.sources()[0].categoria == "financeiro"
+    assert found.sources()[0].model_dump()["score"] == docs[0][1]
+
+
+def test_agent_answers_without_building_documents(tmp_path: Path, monkeypatch):
+    vector_dir = prepare_vector_store(tmp_path)
+    retriever = VectorStoreRetriever(
+        embeddings=FakeEmbeddings(size=1536), vector_store_path=vector_dir
+    )
+
+    def no_documents(row: int):
+        raise AssertionError("Document montado no caminho da requisição")
+
+    monkeypatch.setattr(retriever.vector_store, "document", no_documents)
+    agent = AgentService(retriever=retriever, llm_client=EchoLLM(), use_fake_override=True)
+    agent.response_cache = None
+    response = agent.answer("Pedido saiu para entrega, cliente quer reembolso")
+    assert response.sources
+    assert response.similarity_scores[0].source_id == response.sources[0].id
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.rag.agent import AgentService
+from backend.app.rag.hashed_embeddings import HASHED_IDF_FILE, HashedNgramEmbeddings, _hash
+from backend.app.rag.ingestion import read_manifest, run_ingestion
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.app.rag.vector_store import store_dir
+from backend.tests.test_ingestion_and_retrieval import BUSINESS_CSV, EchoLLM, prepare_vector_store
+
+_PROBE = (
+    "import json; from backend.app.rag.hashed_embeddings import HashedNgramEmbeddings; "
+    "print(json.dumps(HashedNgramEmbeddings(64).embed_query('Cliente quer estorno da cobrança')))"
+)
+
+
+def test_vectors_are_deterministic_across_processes_and_normalized():
+    embeddings = HashedNgramEmbeddings(64)
+    vector = embeddings.embed_query("Cliente quer estorno da cobrança")
+    env = {**os.environ, "PYTHONHASHSEED": "123"}
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True, env=env
+    )
+    assert json.loads(completed.stdout) == vector
+    assert abs(np.linalg.norm(vector) - 1.0) < 1e-6
+    # Acentos e caixa não mudam as features
+    assert embeddings.embed_query("CLIENTE QUER ESTORNO DA COBRANCA") == vector
+    assert embeddings.embed_documents([]) == []
+
+
+def test_idf_downweights_common_terms_and_changes_model_id(tmp_path: Path):
+    texts = BUSINESS_CSV.splitlines()[1:]
+    embeddings = HashedNgramEmbeddings(256)
+    unfitted_model = embeddings.model
+    embeddings.fit(texts)
+    assert embeddings.model != unfitted_model
+
+    # "cliente" aparece em quase toda linha; "antifraude", em uma só
+    common, rare = (_hash(f"w:{term}") % 256 for term in ("cliente", "antifraude"))
+    assert embeddings.idf is not None
+    assert embeddings.idf[common] < embeddings.idf[rare]
+
+    embeddings.save(tmp_path / HASHED_IDF_FILE)
+    loaded = HashedNgramEmbeddings.load_or_create(tmp_path / HASHED_IDF_FILE, 256)
+    assert loaded.model == embeddings.model
+    assert loaded.embed_query("estorno") == embeddings.embed_query("estorno")
+
+
+def test_offline_pipeline_returns_real_similarity_scores(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    # O IDF é publicado com a geração, não gravado solto no diretório servido
+    assert (store_dir(vector_dir) / HASHED_IDF_FILE).exists()
+    assert not (vector_dir / HASHED_IDF_FILE).exists()
+    retriever = VectorStoreRetriever(vector_store_path=vector_dir)
+    assert isinstance(retriever.embeddings, HashedNgramEmbeddings)
+
+    docs = retriever.search("Cliente foi cobrado depois do cancelamento, como estornar?", k=4)
+    assert docs[0][0].metadata["categoria"] == "financeiro"
+    assert 0.0 < docs[0][1] < docs[-1][1]
+
+    agent = AgentService(retriever=retriever, llm_client=EchoLLM())
+    assert agent.use_fake is False
+    agent.settings = agent.settings.model_copy(update={"similarity_threshold": 0.3})
+    agent.response_cache = None
+    assert (
+        agent.answer("Cliente foi cobrado depois do cancelamento, como estornar?").is_fallback
+        is False
+    )
+    assert agent.answer("Restaurante atrasou a entrega do motoboy").is_fallback is True
+
+
+def test_offline_default_threshold_answers_known_scenarios(tmp_path: Path):
+    retriever = VectorStoreRetriever(vector_store_path=prepare_vector_store(tmp_path))
+    agent = AgentService(retriever=retriever, llm_client=EchoLLM())
+    # Sem limiar explícito vale o padrão do embedder hashed (0.3), não o da OpenAI (0.6)
+    agent.settings = agent.settings.model_copy(update={"similarity_threshold": None})
+    agent.response_cache = None
+    assert agent.similarity_threshold == agent.settings.hashed_similarity_threshold
+
+    # Cenário da base com cosseno ~0.38: respondido offline
+    answered = agent.answer("Cliente foi cobrado após cancelamento, o que fazer?")
+    assert answered.is_fallback is False
+    assert answered.sources[0].categoria == "financeiro"
+    assert agent.answer("Restaurante atrasou a entrega do motoboy").is_fallback is True
+
+
+def test_reload_switches_to_the_idf_of_the_new_generation(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    retriever = VectorStoreRetriever(vector_store_path=vector_dir)
+    question = "Cliente foi cobrado depois do cancelamento, como estornar?"
+    retriever.embed_query(question)
+    old_model = retriever.embedding_model
+
+    # Rebuild com a base maior e um IDF reajustado sobre ela
+    csv_path = tmp_path / "sample.csv"
+    extra = "entrega,Entregador não encontrou o endereço.,Contatar o cliente.,Política Entrega\n"
+    csv_path.write_text(BUSINESS_CSV + extra, encoding="utf-8")
+    assert isinstance(retriever.embeddings, HashedNgramEmbeddings)
+    dimension = retriever.embeddings.dimension
+    run_ingestion(csv_path, vector_dir, embeddings=HashedNgramEmbeddings(dimension))
+
+    assert retriever.reload_if_stale() is True
+    published = HashedNgramEmbeddings.load_or_create(
+        store_dir(vector_dir) / HASHED_IDF_FILE, dimension
+    )
+    assert retriever.embedding_model == published.model != old_model
+    manifest = read_manifest(vector_dir)
+    assert manifest is not None and manifest["embedding_model"] == published.model
+    # O vetor em cache do IDF antigo não é reaproveitado
+    assert retriever.embed_query(question) == published.embed_query(question)
+
+
+def test_reload_between_embedding_and_search_keeps_the_pinned_snapshot(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    retriever = VectorStoreRetriever(vector_store_path=vector_dir)
+    agent = AgentService(retriever=retriever, llm_client=EchoLLM())
+    before = retriever.snapshot
+    assert isinstance(before.embeddings, HashedNgramEmbeddings)
+    csv_path = tmp_path / "sample.csv"
+    extra = "entrega,Entregador não encontrou o endereço.,Contatar o cliente.,Política Entrega\n"
+    csv_path.write_text(BUSINESS_CSV + extra, encoding="utf-8")
+    run_ingestion(
+        csv_path, vector_dir, embeddings=HashedNgramEmbeddings(before.embeddings.dimension)
+    )
+
+    # A nova geração entra logo depois do embedding, antes da busca
+    embed_query = retriever.embed_query
+    searched = []
+
+    def embed_then_reload(query, snapshot=None):
+        vector = embed_query(query, snapshot)
+        assert retriever.reload_if_stale() is True
+        return vector
+
+    search = retriever.search_rows_by_vectors
+
+    def spy(*args, **kwargs):
+        found = search(*args, **kwargs)
+        searched.extend(ranked.store for ranked in found)
+        return found
+
+    retriever.embed_query = embed_then_reload  # type: ignore[method-assign]
+    retriever.search_rows_by_vectors = spy  # type: ignore[method-assign]
+    agent.answer("Cliente foi cobrado após cancelamento, o que fazer?")
+
+    after = retriever.snapshot
+    assert after is not before and after.generation == before.generation + 1
+    assert after.embedding_model != before.embedding_model
+    # Busca no índice da geração com que a pergunta foi embedada; o snapshot antigo não muda
+    assert searched == [before.vector_store]
+    assert before.embeddings.model == before.embedding_model
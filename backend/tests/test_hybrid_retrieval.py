@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.agent import AgentService
+from backend.app.rag.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.app.rag.vector_store import NativeVectorStore, store_dir
+from backend.tests.test_ingestion_and_retrieval import (
+    EchoLLM,
+    make_retriever,
+    prepare_vector_store,
+)
+
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    assert tokenize("Cobrança após o CANCELAMENTO, sem estorno!") == [
+        "cobranca",
+        "cancelamento",
+        "estorno",
+    ]
+
+
+def test_bm25_ranks_exact_terms_and_checks_overlap():
+    index = LexicalIndex.build(
+        [
+            "cliente pediu reembolso do pedido",
+            "validar estorno no financeiro",
+            "pedido atrasado reembolso reembolso",
+        ]
+    )
+    assert [row for row, _ in index.search("estorno", 3)] == [1]
+    assert [row for row, _ in index.search("reembolso", 3)] == [2, 0]
+    assert index.search("meteorologia", 3) == []
+    assert index.overlapping_rows("Qual o estorno?", [0, 1, 2]) == {1}
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    assert reciprocal_rank_fusion([[1, 2, 3], [2, 4]], k=60) == [2, 1, 4, 3]
+
+
+def test_hybrid_search_promotes_exact_term_match(tmp_path: Path):
+    retriever = make_retriever(prepare_vector_store(tmp_path))
+    docs = retriever.search("estorno", k=1)
+    assert docs[0][0].metadata["categoria"] == "financeiro"
+
+
+def test_native_store_persists_lexical_index(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    assert (store_dir(vector_dir) / "lexical.npz").exists()
+    store = NativeVectorStore.load(vector_dir)
+    row = store.row_of(store.table.id[3])
+    assert row is not None
+    assert store.lexical.overlapping_rows("antifraude", [row]) == {row}
+
+    retriever = VectorStoreRetriever(
+        embeddings=FakeEmbeddings(size=1536), vector_store_path=vector_dir
+    )
+    fraude_id = store.table.id[3]
+    assert retriever.has_lexical_overlap("bloquear antifraude", [fraude_id]) is True
+    assert retriever.has_lexical_overlap("previsão meteorológica", [fraude_id]) is False
+
+
+def test_fallback_gate_uses_best_vector_score_not_fused_rank(tmp_path: Path):
+    agent = AgentService(
+        retriever=make_retriever(prepare_vector_store(tmp_path)),
+        llm_client=EchoLLM(),
+        use_fake_override=False,
+    )
+    agent.settings = agent.settings.model_copy(update={"similarity_threshold": 0.6})
+
+    def source(idx: int, score: float) -> RetrievedSource:
+        return RetrievedSource(
+            id=f"doc-{idx}", fonte="F", categoria="c", pergunta="p", resposta="r", score=score
+        )
+
+    # Primeira do RRF veio do BM25 (cosseno 0.25); a segunda é a vizinha vetorial (cosseno 0.9)
+    response, _, _ = agent._evaluate("pergunta", [source(0, 1.5), source(1, 0.2)])
+    assert response is None
+    response, _, _ = agent._evaluate("pergunta", [source(0, 1.5), source(1, 1.2)])
+    assert response is not None and response.is_fallback
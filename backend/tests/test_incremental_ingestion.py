@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from backend.app.rag.ingestion import (
+    csv_to_documents,
+    read_generation,
+    read_manifest,
+    run_ingestion,
+)
+from backend.tests.test_ingestion_and_retrieval import BUSINESS_CSV, prepare_vector_store
+
+EXTRA_ROW = (
+    "reembolso,Cliente recebeu pedido errado.,Reembolsar itens errados.,Política Pedido Errado\n"
+)
+
+
+def test_document_ids_are_stable_when_rows_are_inserted(tmp_path: Path):
+    header, *rows = BUSINESS_CSV.strip().splitlines()
+    original = tmp_path / "original.csv"
+    original.write_text(BUSINESS_CSV, encoding="utf-8")
+    shifted = tmp_path / "shifted.csv"
+    shifted.write_text("\n".join([header, EXTRA_ROW.strip(), *rows]) + "\n", encoding="utf-8")
+
+    original_ids = [doc.id for doc in csv_to_documents(original)]
+    shifted_ids = [doc.id for doc in csv_to_documents(shifted)]
+    assert shifted_ids[1:] == original_ids
+
+
+def test_incremental_ingestion_embeds_only_changed_rows(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    csv_path = tmp_path / "sample.csv"
+    manifest = read_manifest(vector_dir)
+    assert manifest is not None and len(manifest["ids"]) == 4
+
+    header, reembolso, _cancelamento, financeiro, fraude = BUSINESS_CSV.strip().splitlines()
+    # Remove cancelamento, edita financeiro e adiciona uma linha nova
+    edited = financeiro.replace("abrir ticket financeiro", "abrir chamado")
+    csv_path.write_text(
+        "\n".join([header, reembolso, edited, fraude]) + "\n" + EXTRA_ROW, encoding="utf-8"
+    )
+
+    vector_store, stats = run_ingestion(csv_path, vector_dir, incremental=True)
+    assert stats.full_rebuild is False
+    assert (stats.added, stats.removed, stats.unchanged) == (2, 2, 2)
+    assert stats.generation == read_generation(vector_dir) == 2
+    assert vector_store.index.ntotal == 4
+    manifest = read_manifest(vector_dir)
+    assert manifest is not None
+    assert sorted(vector_store.index_to_docstore_id.values()) == manifest["ids"]
+
+
+def test_incremental_ingestion_without_changes_keeps_generation(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    _, stats = run_ingestion(tmp_path / "sample.csv", vector_dir, incremental=True)
+    assert (stats.added, stats.removed, stats.unchanged) == (0, 0, 4)
+    assert read_generation(vector_dir) == 1
@@ -14,7 +14,7 @@ from backend.app.rag.agent import AgentService
 from backend.app.rag.ingestion import ingest_csv_to_vector_store
 from backend.app.rag.llm_client import FALLBACK_MESSAGE
 from backend.app.rag.retriever import VectorStoreRetriever
-
+from backend.app.rag.vector_store import store_dir
 
 BUSINESS_CSV = """categoria,pergunta,resposta,fonte
 reembolso,Pedido saiu para entrega. Cliente pede reembolso.,Reembolsar apenas se falha do restaurante/entregador. Caso desistência, avaliar exceções.,Política Reembolso Saída
@@ -48,7 +48,9 @@ def prepare_vector_store(tmp_path: Path, csv_content: str = BUSINESS_CSV) -> Pat
 def make_retriever(vector_dir: Path) -> VectorStoreRetriever:
     return VectorStoreRetriever(
         vector_store=FAISS.load_local(
-            str(vector_dir), FakeEmbeddings(size=1536), allow_dangerous_deserialization=True
+            str(store_dir(vector_dir)),
+            FakeEmbeddings(size=1536),
+            allow_dangerous_deserialization=True,
         ),
         embeddings=FakeEmbeddings(size=1536),
     )
@@ -56,7 +58,7 @@ def make_retriever(vector_dir: Path) -> VectorStoreRetriever:
 
 def test_ingestion_builds_documents(tmp_path: Path):
     vector_dir = prepare_vector_store(tmp_path)
-    assert (vector_dir / "index.faiss").exists()
+    assert (store_dir(vector_dir) / "index.faiss").exists()
 
 
 def test_retrieval_returns_best_match(tmp_path: Path):
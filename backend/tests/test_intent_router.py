@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import asyncio
+
+from backend.app.core.config import Settings
+from backend.app.rag.agent import AgentService
+from backend.app.rag.intent import (
+    FORA_DO_ESCOPO,
+    OPERACIONAL,
+    SMALL_TALK,
+    IntentRouter,
+    build_intent_router,
+)
+from backend.app.rag.llm_client import FALLBACK_MESSAGE, SMALL_TALK_MESSAGE
+
+
+class ExplodingRetriever:
+    """Falha se o agente tentar embedding ou busca: o roteador deve responder antes."""
+
+    generation = 0
+
+    def embed_query(self, query: str):
+        raise AssertionError("embedding não deveria ser chamado")
+
+    def search(self, query: str, k: int = 4):
+        raise AssertionError("busca não deveria ser chamada")
+
+
+class ExplodingLLM:
+    def generate(self, question: str, sources):
+        raise AssertionError("LLM não deveria ser chamado")
+
+
+def test_router_separates_small_talk_out_of_scope_and_operational():
+    router = IntentRouter()
+    assert router.route("Oi, bom dia!") == SMALL_TALK
+    assert router.route("obrigado") == SMALL_TALK
+    assert router.route("Como está a previsão do tempo amanhã?") == FORA_DO_ESCOPO
+    assert router.route("Me conta uma piada") == FORA_DO_ESCOPO
+    assert router.route("Cliente quer reembolso do pedido") == OPERACIONAL
+    assert router.route("Cobrança após o CANCELAMENTO, sem estorno!") == OPERACIONAL
+    # Agradecimento no meio de um caso real não desvia a pergunta
+    assert router.route("Obrigado, mas o cliente quer reembolso") == OPERACIONAL
+
+
+def test_router_keywords_come_from_settings():
+    router = build_intent_router(Settings(intent_out_of_scope_keywords=["bitcoin"]))
+    assert router.route("Qual o preço do Bitcoin hoje?") == FORA_DO_ESCOPO
+    assert router.route("Cliente pagou com bitcoins?") != FORA_DO_ESCOPO
+
+
+def test_agent_short_circuits_without_embedding_or_llm():
+    agent = AgentService(
+        retriever=ExplodingRetriever(), llm_client=ExplodingLLM(), use_fake_override=True
+    )
+    greeting = agent.answer("Olá, tudo bem?")
+    assert greeting.answer == SMALL_TALK_MESSAGE
+    assert greeting.sources == []
+    assert agent.answer("Qual a cotação do dólar?").answer == FALLBACK_MESSAGE
+    assert asyncio.run(agent.aanswer("valeu!")).answer == SMALL_TALK_MESSAGE
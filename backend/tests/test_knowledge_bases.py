@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.rag.agent import AgentService
+from backend.app.rag.knowledge_bases import IndexPool, UnknownKnowledgeBaseError, agent_memory_bytes
+from backend.app.rag.retriever import RetrievalError, VectorStoreRetriever
+from backend.tests.test_ingestion_and_retrieval import EchoLLM, prepare_vector_store
+
+PARTNER_CSV = """categoria,pergunta,resposta,fonte
+repasse,Restaurante parceiro questiona repasse descontado após reembolso ao cliente.,Conferir o extrato de repasse e contestar o desconto se a falha não foi do restaurante.,Manual Parceiro Repasse
+"""
+
+
+def _fake_agent(size: int):
+    return SimpleNamespace(
+        retriever=SimpleNamespace(vector_store=SimpleNamespace(memory_bytes=size))
+    )
+
+
+def test_pool_evicts_least_recently_used_within_budget():
+    created = []
+
+    def factory(kb_id: str, path: Path):
+        created.append(kb_id)
+        return _fake_agent(40)
+
+    pool = IndexPool({kb: Path(kb) for kb in "abc"}, memory_budget_bytes=100, factory=factory)
+    first = pool.get("a")
+    pool.get("b")
+    assert pool.get("a") is first
+    pool.get("c")
+    # "b" foi a menos usada recentemente: sai para caber "c"
+    assert pool.loaded() == ["a", "c"]
+    assert pool.memory_bytes == 80
+    pool.get("b")
+    assert pool.loaded() == ["c", "b"]
+    assert created == ["a", "b", "c", "b"]
+    assert pool.evictions == 2
+
+    with pytest.raises(UnknownKnowledgeBaseError):
+        pool.get("z")
+
+
+def test_pool_loads_each_base_once_under_concurrency_and_preloads():
+    calls = []
+
+    def factory(kb_id: str, path: Path):
+        if kb_id == "nova":
+            raise RetrievalError("não ingerida")
+        calls.append(kb_id)
+        time.sleep(0.05)
+        return _fake_agent(1)
+
+    pool = IndexPool({"a": Path("a"), "nova": Path("n")}, memory_budget_bytes=10, factory=factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get("a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ["a"]
+    assert all(agent is results[0] for agent in results)
+    assert pool.preload(["a", "nova", "inexistente"]) == ["a"]
+
+
+def test_chat_routes_to_requested_knowledge_base(tmp_path: Path):
+    (tmp_path / "parceiros").mkdir()
+    partner_dir = prepare_vector_store(tmp_path / "parceiros", PARTNER_CSV)
+    main.app.state.index_pool = IndexPool(
+        {"parceiros": partner_dir, "vazia": tmp_path / "vazia"}, memory_budget_bytes=10**9
+    )
+    # Outro teste pode ter deixado o agente padrão sobrescrito; aqui o get_agent real é o testado
+    main.app.dependency_overrides.pop(get_agent, None)
+    try:
+        client = TestClient(main.app)
+        question = {"question": "Restaurante parceiro questiona repasse descontado após reembolso"}
+        body = client.post("/api/chat?kb=parceiros", json=question).json()
+        assert [src["categoria"] for src in body["sources"]] == ["repasse"]
+        assert main.app.state.index_pool.loaded() == ["parceiros"]
+
+        assert client.post("/api/chat?kb=outra", json=question).status_code == 404
+        assert client.post("/api/chat?kb=vazia", json=question).status_code == 503
+    finally:
+        del main.app.state.index_pool
+
+
+def test_reload_keeps_other_bases_when_one_fails_and_refreshes_sizes():
+    def failing_reload():
+        raise RetrievalError("geração inconsistente")
+
+    broken = SimpleNamespace(
+        retriever=SimpleNamespace(
+            vector_store=SimpleNamespace(memory_bytes=10), reload_if_stale=failing_reload
+        )
+    )
+    growing = SimpleNamespace(
+        retriever=SimpleNamespace(
+            vector_store=SimpleNamespace(memory_bytes=10), reload_if_stale=lambda: False
+        ),
+        response_cache=SimpleNamespace(memory_bytes=0),
+    )
+    agents = {"a": broken, "b": growing}
+    pool = IndexPool(
+        {"a": Path("a"), "b": Path("b")},
+        memory_budget_bytes=100,
+        factory=lambda kb_id, path: agents[kb_id],
+    )
+    pool.get("a")
+    pool.get("b")
+    # O cache de respostas cresce com o uso e passa a contar no orçamento
+    growing.response_cache.memory_bytes = 85
+    pool.reload_stale()
+    assert pool.loaded() == ["b"]
+    assert pool.memory_bytes == 95
+
+
+def test_base_with_first_publication_still_in_staging_is_not_ingested(tmp_path: Path):
+    staging = tmp_path / "kb" / "generations" / ".staging-1"
+    staging.mkdir(parents=True)
+    (staging / "index.faiss").write_bytes(b"")
+    with pytest.raises(RetrievalError, match="não encontrado"):
+        VectorStoreRetriever(vector_store_path=tmp_path / "kb")
+
+
+def test_agent_memory_includes_response_cache_but_not_shared_sessions(tmp_path: Path):
+    agent = AgentService(
+        retriever=VectorStoreRetriever(vector_store_path=prepare_vector_store(tmp_path)),
+        llm_client=EchoLLM(),
+    )
+    index_bytes = agent_memory_bytes(agent)
+    asyncio.run(agent.aanswer("Cliente foi cobrado após cancelamento", session_id="s1"))
+    assert agent.response_cache is not None and agent.response_cache.memory_bytes > 0
+    assert agent.sessions.memory_bytes > 0
+    assert agent_memory_bytes(agent) == index_bytes + agent.response_cache.memory_bytes
+
+
+def test_pool_bases_share_one_session_store(tmp_path: Path):
+    (tmp_path / "parceiros").mkdir()
+    pool = IndexPool(
+        {
+            "padrao": prepare_vector_store(tmp_path),
+            "parceiros": prepare_vector_store(tmp_path / "parceiros", PARTNER_CSV),
+        },
+        memory_budget_bytes=10**9,
+    )
+    assert pool.get("padrao").sessions is pool.get("parceiros").sessions
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from langchain_openai import ChatOpenAI
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.core import metrics
+from backend.app.core.config import Settings
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.agent import AgentService
+from backend.app.rag.llm_client import LLMClient
+from backend.benchmarks.fake_openai import FakeOpenAIConfig, ServerThread, create_app
+from backend.tests.test_ingestion_and_retrieval import (
+    EchoLLM,
+    make_retriever,
+    prepare_vector_store,
+)
+
+
+def test_settings_read_agent_environment_variables(monkeypatch):
+    monkeypatch.setenv("AGENT_METRICS_ENABLED", "false")
+    monkeypatch.setenv("AGENT_RETRIEVAL_K", "7")
+    monkeypatch.delenv("AGENT_OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-teste")
+    settings = Settings()
+    assert settings.metrics_enabled is False
+    assert settings.retrieval_k == 7
+    assert settings.openai_api_key == "sk-teste"
+
+
+def test_tests_ignore_dotenv_and_shell_openai_key(tmp_path: Path, monkeypatch):
+    (tmp_path / ".env").write_text(
+        "OPENAI_API_KEY=sk-do-dotenv\nAGENT_RETRIEVAL_K=9\n", encoding="utf-8"
+    )
+    monkeypatch.chdir(tmp_path)
+    settings = Settings()
+    assert settings.openai_api_key is None
+    assert settings.retrieval_k == 4
+
+
+def test_agent_records_stage_latencies_and_fallback_reasons(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    agent = AgentService(retriever=make_retriever(vector_dir), llm_client=EchoLLM())
+    agent.response_cache = None
+    before = {name: metrics.STAGE_SECONDS.count(stage=name) for name in ("embed", "search")}
+    out_of_scope = metrics.FALLBACKS.value(reason="out_of_scope")
+
+    agent.answer("Pedido saiu para entrega. Cliente pede reembolso.")
+    agent.answer("Como está a previsão do tempo amanhã?")
+
+    for name, count in before.items():
+        assert metrics.STAGE_SECONDS.count(stage=name) == count + 1
+    assert metrics.FALLBACKS.value(reason="out_of_scope") == out_of_scope + 1
+    text = metrics.render_metrics()
+    assert 'agent_stage_seconds_bucket{stage="embed",le="+Inf"}' in text
+    assert 'agent_fallbacks_total{reason="out_of_scope"}' in text
+
+
+def test_metrics_endpoint_and_server_timing_header(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    agent = AgentService(retriever=make_retriever(vector_dir), llm_client=EchoLLM())
+    agent.response_cache = None
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    try:
+        client = TestClient(main.app)
+        question = {"question": "Cliente foi cobrado após cancelamento."}
+        plain = client.post("/api/chat", json=question)
+        assert "server-timing" not in plain.headers
+        timed = client.post("/api/chat", json=question, headers={"X-Debug-Timings": "1"})
+        assert timed.status_code == 200
+        timing = timed.headers["server-timing"]
+        assert "embed;dur=" in timing and "search;dur=" in timing and "total;dur=" in timing
+
+        response = client.get("/api/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE agent_stage_seconds histogram" in response.text
+    finally:
+        main.app.dependency_overrides.pop(get_agent, None)
+
+
+def test_token_usage_is_counted_for_invoke_and_stream():
+    source = RetrievedSource(
+        id="1", fonte="F", categoria="reembolso", pergunta="p", resposta="r", score=0.0
+    )
+    with ServerThread(create_app(FakeOpenAIConfig(dimension=8))) as url:
+        llm = ChatOpenAI(model="fake", api_key="x", base_url=f"{url}/v1", stream_usage=True)
+        client = LLMClient(llm=llm)
+        output = metrics.LLM_TOKENS.value(kind="output")
+        client.generate("Cliente quer reembolso", [source])
+        after_invoke = metrics.LLM_TOKENS.value(kind="output")
+        assert after_invoke > output
+
+        async def consume() -> None:
+            async for _ in client.astream("Cliente quer reembolso", [source]):
+                pass
+
+        asyncio.run(consume())
+        assert metrics.LLM_TOKENS.value(kind="output") > after_invoke
+    assert metrics.LLM_TOKENS.value(kind="input") > 0
+
+
+def test_disabled_metrics_make_stage_a_noop():
+    metrics.configure_metrics(False)
+    try:
+        count = metrics.STAGE_SECONDS.count(stage="noop-check")
+        with metrics.stage("noop-check"):
+            pass
+        assert metrics.STAGE_SECONDS.count(stage="noop-check") == count
+    finally:
+        metrics.configure_metrics(True)
+    with metrics.stage("noop-check"):
+        pass
+    assert metrics.STAGE_SECONDS.count(stage="noop-check") == count + 1
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+from langchain_community.embeddings import FakeEmbeddings
+
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.app.rag.vector_store import FaissVectorStore, NativeVectorStore, store_dir
+from backend.tests.test_ingestion_and_retrieval import make_retriever, prepare_vector_store
+
+
+def test_native_store_matches_faiss_search(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    faiss_store = make_retriever(vector_dir).vector_store
+    native_store = NativeVectorStore.load(vector_dir)
+
+    assert isinstance(native_store.vectors, np.memmap)
+    assert native_store.ntotal == faiss_store.ntotal == 4
+    assert native_store.generation == 1
+    queries = np.random.default_rng(0).normal(size=(3, 1536)).astype(np.float32)
+    native_scores, native_rows = native_store.search(queries, 3)
+    faiss_scores, faiss_rows = faiss_store.search(queries, 3)
+    np.testing.assert_array_equal(native_rows, faiss_rows)
+    np.testing.assert_allclose(native_scores, faiss_scores, rtol=1e-4)
+    for row in range(4):
+        assert native_store.document(row) == faiss_store.document(row)
+
+
+def test_retriever_loads_native_store_without_pickle(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    (store_dir(vector_dir) / "index.pkl").unlink()
+    retriever = VectorStoreRetriever(
+        embeddings=FakeEmbeddings(size=1536), vector_store_path=vector_dir
+    )
+    assert isinstance(retriever.vector_store, NativeVectorStore)
+    docs = retriever.search("reembolso", k=2)
+    assert len(docs) == 2
+    assert docs[0][0].page_content.startswith("[FONTE:")
+
+
+def test_native_store_pads_when_k_exceeds_total(tmp_path: Path):
+    native_store = NativeVectorStore.load(prepare_vector_store(tmp_path))
+    scores, rows = native_store.search(np.zeros((1, 1536), dtype=np.float32), 6)
+    assert list(rows[0][4:]) == [-1, -1]
+    assert not isinstance(native_store, FaissVectorStore)
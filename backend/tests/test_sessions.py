@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.agent import AgentService
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.app.rag.sessions import SessionStore
+from backend.tests.test_ingestion_and_retrieval import EchoLLM, prepare_vector_store
+
+ANCHOR = "Cliente foi cobrado depois do cancelamento, como estornar?"
+FOLLOWUP = "E se o cliente foi cobrado em dobro depois do cancelamento?"
+# Parecida com a âncora, mas longe das fontes dela: precisa de busca nova
+DRIFT = "E depois do cancelamento, como estornar o cupom?"
+NEW_TOPIC = "Tentativa de múltiplos reembolsos seguidos na mesma conta"
+
+SOURCE = RetrievedSource(
+    id="doc-1", fonte="F", categoria="financeiro", pergunta="p", resposta="r", score=0.1
+)
+
+
+def test_store_reuses_similar_followups_within_scope_ttl_and_capacity():
+    store = SessionStore(max_sessions=2, ttl=60.0, similarity=0.5)
+    store.remember("a", "anterior", [1.0, 0.0], [SOURCE], scope=None, generation=1)
+    # Quem chama pode recusar a continuação (fontes longe da pergunta nova)
+    assert store.followup("a", "x", [1.0, 0.0], None, 1, rescore=lambda sources: None) is None
+    assert store.reused == 0
+    turn = store.followup("a", "continuação", [0.8, 0.6], scope=None, generation=1)
+    assert turn is not None and turn.sources == [SOURCE] and turn.question == "anterior"
+    # A continuação aceita vira a âncora da sessão
+    turn = store.followup("a", "outra", [0.6, 0.8], scope=None, generation=1)
+    assert turn is not None and turn.question == "continuação" and store.reused == 2
+    assert store.followup("a", "x", [0.0, -1.0], scope=None, generation=1) is None
+    assert store.followup("a", "x", [0.6, 0.8], scope="financeiro", generation=1) is None
+    # Nova geração do índice: as fontes guardadas podem não existir mais
+    assert store.followup("a", "x", [0.6, 0.8], scope=None, generation=2) is None
+
+    store.remember("b", "b", [1.0, 0.0], [SOURCE], scope=None, generation=1)
+    store.remember("c", "c", [1.0, 0.0], [SOURCE], scope=None, generation=1)
+    assert len(store) == 2 and store.evictions == 1
+    assert store.followup("a", "x", [1.0, 0.0], scope=None, generation=1) is None
+
+    expiring = SessionStore(ttl=0.0)
+    expiring.remember("a", "anterior", [1.0, 0.0], [SOURCE], scope=None, generation=1)
+    assert expiring.followup("a", "x", [1.0, 0.0], scope=None, generation=1) is None
+    assert len(expiring) == 0
+
+
+def _agent(tmp_path: Path) -> tuple[AgentService, list[str]]:
+    retriever = VectorStoreRetriever(vector_store_path=prepare_vector_store(tmp_path))
+    searches: list[str] = []
+    search = retriever.asearch_rows_by_vector
+
+    async def counting_search(vector, k, query=None, **filters):
+        searches.append(query)
+        return await search(vector, k, query=query, **filters)
+
+    retriever.asearch_rows_by_vector = counting_search  # type: ignore[method-assign, assignment]
+    agent = AgentService(retriever=retriever, llm_client=EchoLLM())
+    agent.settings = agent.settings.model_copy(update={"similarity_threshold": 0.3})
+    return agent, searches
+
+
+def test_followup_reuses_previous_sources_without_searching(tmp_path: Path):
+    agent, searches = _agent(tmp_path)
+    first = asyncio.run(agent.aanswer(ANCHOR, session_id="s1"))
+    assert first.is_fallback is False and searches == [ANCHOR]
+
+    followup = asyncio.run(agent.aanswer(FOLLOWUP, session_id="s1"))
+    assert searches == [ANCHOR]
+    # Mesmas fontes, com o score recalculado para a pergunta nova
+    assert [src.id for src in followup.sources] == [src.id for src in first.sources]
+    assert followup.sources[0].score != first.sources[0].score
+    assert f"continuação de: {ANCHOR}" in followup.answer
+    assert agent.sessions.reused == 1
+
+    # Continuação do mesmo assunto cujas fontes já não atendem, assunto novo na mesma sessão e a
+    # mesma pergunta sem sessão fazem busca normal
+    asyncio.run(agent.aanswer(DRIFT, session_id="s1"))
+    asyncio.run(agent.aanswer(NEW_TOPIC, session_id="s1"))
+    asyncio.run(agent.aanswer(FOLLOWUP))
+    assert searches == [ANCHOR, DRIFT, NEW_TOPIC, FOLLOWUP]
+    assert agent.sessions.reused == 1
+
+
+def test_streamed_followup_reuses_sources_and_skips_response_cache(tmp_path: Path):
+    agent, searches = _agent(tmp_path)
+
+    async def collect(question: str):
+        return [event async for event in agent.astream(question, session_id="s2")]
+
+    first = asyncio.run(collect(ANCHOR))
+    assert agent.response_cache is not None
+    cached_answers = len(agent.response_cache)
+    followup = asyncio.run(collect(FOLLOWUP))
+    assert searches == [ANCHOR]
+    assert [src["id"] for src in followup[0][1]["sources"]] == [
+        src["id"] for src in first[0][1]["sources"]
+    ]
+    assert followup[-1] == ("done", {"is_fallback": False})
+    # A resposta da continuação depende da conversa: não vai para o cache semântico
+    assert len(agent.response_cache) == cached_answers
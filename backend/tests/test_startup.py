@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from backend.benchmarks.startup import check_budgets, measure_import
+
+
+def test_api_import_does_not_load_provider_sdks():
+    result = measure_import("backend.app.main", runs=1)
+    assert result["loaded"] == []
+    assert result["ms"] > 0
+
+
+def test_ingestion_cli_import_stays_offline():
+    assert measure_import("backend.app.rag.ingestion", runs=1)["loaded"] == []
+
+
+def test_check_budgets_reports_slow_and_heavy_imports():
+    results = [
+        {"module": "a", "ms": 120.0, "loaded": []},
+        {"module": "b", "ms": 50.0, "loaded": ["openai"]},
+        {"module": "c", "ms": 900.0, "loaded": []},
+    ]
+    violations = check_budgets(results, {"a": 100.0, "b": 100.0})
+    assert violations == ["a: 120.0ms > orçamento de 100.0ms", "b: carregou openai"]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+
+from backend.app.rag.ingestion import (
+    CHECKPOINT_DIR,
+    CHECKPOINT_FILE,
+    CHECKPOINT_VECTORS,
+    SeenIds,
+    csv_to_documents,
+    embed_with_retry,
+    iter_embedded_batches,
+    read_manifest,
+    run_ingestion,
+)
+from backend.tests.test_ingestion_and_retrieval import BUSINESS_CSV
+
+
+class RecordingEmbeddings(FakeEmbeddings):
+    batches: list = []
+    fail_after: int | None = None
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            raise ConnectionError("conexão perdida")
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def _write_csv(tmp_path: Path) -> Path:
+    csv_path = tmp_path / "sample.csv"
+    csv_path.write_text(BUSINESS_CSV, encoding="utf-8")
+    return csv_path
+
+
+def test_embedded_batches_keep_csv_order(tmp_path: Path):
+    docs = csv_to_documents(_write_csv(tmp_path))
+    embeddings = RecordingEmbeddings(size=8, batches=[])
+    batches = list(iter_embedded_batches(embeddings, docs, batch_size=3, workers=2))
+    assert [[doc.id for doc in batch] for batch, _ in batches] == [
+        [doc.id for doc in docs[:3]],
+        [docs[3].id],
+    ]
+    assert all(len(vectors) == len(batch) for batch, vectors in batches)
+
+
+def test_embed_with_retry_backs_off_on_rate_limit():
+    attempts = []
+
+    class FlakyEmbeddings(FakeEmbeddings):
+        def embed_documents(self, texts):
+            attempts.append(texts)
+            if len(attempts) < 3:
+                raise RateLimitError("429")
+            return super().embed_documents(texts)
+
+    vectors = embed_with_retry(FlakyEmbeddings(size=4), ["a"], max_retries=3, backoff_seconds=0)
+    assert len(vectors) == 1
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(RateLimitError):
+        embed_with_retry(FlakyEmbeddings(size=4), ["a"], max_retries=1, backoff_seconds=0)
+    assert len(attempts) == 2
+
+
+def test_crashed_ingestion_resumes_from_checkpoint(tmp_path: Path):
+    csv_path = _write_csv(tmp_path)
+    vector_dir = tmp_path / "vector_store"
+    crashing = RecordingEmbeddings(size=8, batches=[], fail_after=2)
+    with pytest.raises(ConnectionError):
+        run_ingestion(
+            csv_path, vector_dir, embeddings=crashing, batch_size=1, workers=1, checkpoint_every=1
+        )
+    checkpoint_dir = vector_dir / CHECKPOINT_DIR
+    state = json.loads((checkpoint_dir / CHECKPOINT_FILE).read_text(encoding="utf-8"))
+    # Cada checkpoint só anexa o lote novo: 2 linhas x 8 dimensões em float32
+    assert state["rows_done"] == 2 and state["vectors_bytes"] == 2 * 8 * 4
+    # Sobra de uma gravação interrompida além do estado salvo é descartada na retomada
+    with (checkpoint_dir / CHECKPOINT_VECTORS).open("ab") as fh:
+        fh.write(b"\0" * 12)
+
+    resumed = RecordingEmbeddings(size=8, batches=[])
+    vector_store, stats = run_ingestion(
+        csv_path, vector_dir, embeddings=resumed, batch_size=1, workers=1, checkpoint_every=1
+    )
+    docs = csv_to_documents(csv_path)
+    assert resumed.batches == [[doc.content] for doc in docs[2:]]
+    assert stats.added == 2
+    assert vector_store.index.ntotal == 4
+    manifest = read_manifest(vector_dir)
+    assert manifest is not None and manifest["ids"] == sorted(doc.id for doc in docs)
+    assert not (vector_dir / CHECKPOINT_DIR).exists()
+
+
+def test_repeated_rows_get_suffixed_ids_with_fixed_memory(tmp_path: Path):
+    header, first, *_ = BUSINESS_CSV.strip().splitlines()
+    csv_path = tmp_path / "repetido.csv"
+    csv_path.write_text("\n".join([header, first, first, first]) + "\n", encoding="utf-8")
+    ids = [doc.id for doc in csv_to_documents(csv_path)]
+    assert ids[1:] == [f"{ids[0]}-2", f"{ids[0]}-3"]
+
+    seen = SeenIds(bits=1 << 16)
+    assert not seen.add("doc-a") and seen.add("doc-a")
+    for idx in range(5_000):
+        seen.add(f"doc-{idx}")
+    assert seen.nbytes == (1 << 16) // 8
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+
+from backend.app import main
+from backend.app.api.routes import get_agent
+from backend.app.models.schemas import RetrievedSource
+from backend.app.rag.agent import AgentService
+from backend.app.rag.llm_client import LLMClient
+from backend.app.rag.upstream import (
+    AdaptiveRateLimiter,
+    UpstreamOverloadedError,
+    get_limiter,
+    shared_chat_model,
+)
+from backend.benchmarks.fake_openai import FAKE_ANSWER, FakeOpenAIConfig, ServerThread, create_app
+from backend.tests.test_ingestion_and_retrieval import make_retriever, prepare_vector_store
+
+
+class StubLLM:
+    def invoke(self, messages):
+        return AIMessage(content="resposta")
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+    async def astream(self, messages):
+        yield self.invoke(messages)
+
+
+def test_limiter_fails_fast_and_adapts_to_rate_limit_headers():
+    limiter = AdaptiveRateLimiter("m", rate=1.0, burst=2, max_in_flight=8, max_wait=0.2)
+    limiter.acquire()
+    limiter.acquire()
+    start = time.monotonic()
+    with pytest.raises(UpstreamOverloadedError) as info:
+        limiter.acquire()
+    # O próximo token leva ~1s, mais que max_wait: rejeita sem esperar
+    assert time.monotonic() - start < 0.1
+    assert info.value.retry_after >= 1.0
+    assert limiter.in_flight == 2
+
+    limiter.observe(429, {"retry-after-ms": "300"})
+    assert limiter.rate == 0.5
+    with pytest.raises(UpstreamOverloadedError):
+        limiter.acquire()
+
+    limiter = AdaptiveRateLimiter("m", rate=100.0, burst=10, max_in_flight=1, max_wait=0.05)
+    limiter.observe(
+        200, {"x-ratelimit-remaining-requests": "30", "x-ratelimit-reset-requests": "1m0s"}
+    )
+    assert limiter.rate == pytest.approx(0.5)
+    with limiter.slot():
+        # Teto de chamadas simultâneas: a segunda espera até max_wait e desiste
+        with pytest.raises(UpstreamOverloadedError):
+            limiter.acquire()
+    assert limiter.in_flight == 0
+
+
+def test_shared_client_recovers_from_injected_429s():
+    config = FakeOpenAIConfig(dimension=8, rate_limit_every=2, retry_after_ms=20)
+    app = create_app(config)
+    with ServerThread(app) as url:
+        llm = shared_chat_model("stub-429", "x", f"{url}/v1")
+        assert shared_chat_model("stub-429", "x", f"{url}/v1") is llm
+        limiter = get_limiter("stub-429")
+        client = LLMClient(llm=llm, limiter=limiter)
+        for _ in range(3):
+            assert _answer(client) == FAKE_ANSWER
+    assert app.state.rate_limited >= 1
+    assert limiter.rate < limiter.max_rate
+    assert limiter.in_flight == 0
+
+
+def test_api_returns_503_with_retry_after_when_upstream_is_saturated(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    limiter = AdaptiveRateLimiter("stub", rate=0.01, burst=1, max_in_flight=4, max_wait=0.05)
+    agent = AgentService(
+        retriever=make_retriever(vector_dir), llm_client=LLMClient(llm=StubLLM(), limiter=limiter)
+    )
+    agent.response_cache = None
+    main.app.dependency_overrides[get_agent] = lambda: agent
+    try:
+        client = TestClient(main.app)
+        first = client.post(
+            "/api/chat", json={"question": "Cliente foi cobrado após cancelamento."}
+        )
+        assert first.status_code == 200
+        start = time.monotonic()
+        second = client.post("/api/chat", json={"question": "Pedido saiu para entrega, reembolso?"})
+        assert second.status_code == 503
+        assert int(second.headers["retry-after"]) >= 1
+        assert time.monotonic() - start < 1.0
+    finally:
+        main.app.dependency_overrides.pop(get_agent, None)
+
+
+def _answer(client: LLMClient) -> str:
+    source = RetrievedSource(
+        id="1", fonte="F", categoria="reembolso", pergunta="p", resposta="r", score=0.0
+    )
+    return client.generate("Cliente quer reembolso", [source])
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_community.embeddings import FakeEmbeddings
+
+from backend.app import main
+from backend.app.rag.ingestion import ingest_csv_to_vector_store, read_generation
+from backend.app.rag.retriever import VectorStoreRetriever
+from backend.app.rag.vector_store import NativeVectorStore, generation_dir
+from backend.tests.test_ingestion_and_retrieval import BUSINESS_CSV, prepare_vector_store
+
+
+def test_ingestion_publishes_increasing_generations(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    assert read_generation(vector_dir) == 1
+    ingest_csv_to_vector_store(csv_path=tmp_path / "sample.csv", persist_dir=vector_dir)
+    assert read_generation(vector_dir) == 2
+    assert not list(vector_dir.glob("generations/.staging-*"))
+    # Cada geração fica no seu diretório; a anterior continua disponível para quem a carrega
+    assert sorted(path.name for path in (vector_dir / "generations").iterdir()) == ["1", "2"]
+    ingest_csv_to_vector_store(csv_path=tmp_path / "sample.csv", persist_dir=vector_dir)
+    assert sorted(path.name for path in (vector_dir / "generations").iterdir()) == ["2", "3"]
+
+
+def test_retriever_hot_swaps_new_generation(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    retriever = VectorStoreRetriever(
+        embeddings=FakeEmbeddings(size=1536), vector_store_path=vector_dir
+    )
+    assert retriever.generation == 1
+    assert retriever.reload_if_stale() is False
+
+    csv_path = tmp_path / "sample.csv"
+    extra_row = "reembolso,Cliente recebeu pedido errado.,Reembolsar itens errados.,Política Pedido Errado\n"
+    csv_path.write_text(BUSINESS_CSV + extra_row, encoding="utf-8")
+    old_store = retriever.vector_store
+    ingest_csv_to_vector_store(csv_path=csv_path, persist_dir=vector_dir)
+
+    assert retriever.reload_if_stale() is True
+    assert retriever.generation == 2
+    assert retriever.vector_store is not old_store
+    assert retriever.vector_store.ntotal == 5
+
+
+def test_native_load_rejects_files_mixed_across_generations(tmp_path: Path):
+    vector_dir = prepare_vector_store(tmp_path)
+    csv_path = tmp_path / "sample.csv"
+    extra_row = "reembolso,Cliente recebeu pedido errado.,Reembolsar itens errados.,Política Pedido Errado\n"
+    csv_path.write_text(BUSINESS_CSV + extra_row, encoding="utf-8")
+    ingest_csv_to_vector_store(csv_path=csv_path, persist_dir=vector_dir)
+    first, second = generation_dir(vector_dir, 1), generation_dir(vector_dir, 2)
+    assert NativeVectorStore.load(vector_dir).ntotal == 5
+
+    shutil.copy(second / "vectors.npy", first / "vectors.npy")
+    with pytest.raises(ValueError, match="totais divergentes"):
+        NativeVectorStore.load(vector_dir, generation=1)
+    shutil.copy(second / "store.json", first / "store.json")
+    with pytest.raises(ValueError, match="geração 2"):
+        NativeVectorStore.load(vector_dir, generation=1)
+
+
+def test_agent_is_created_once_per_process(monkeypatch):
+    created = []
+
+    class DummyAgent:
+        def __init__(self):
+            created.append(self)
+
+    monkeypatch.setattr(main, "build_agent", lambda: DummyAgent())
+    with TestClient(main.app) as client:
+        assert client.get("/api/health").status_code == 200
+        assert main.app.state.agent is created[0]
+    assert len(created) == 1